@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import LlamaResponse, WingmanUsers, LlamaChatWindow
+from .models import LlamaResponse, WingmanUsers, LlamaChatWindow, LoveMessageTemplate
 
 
 @admin.register(WingmanUsers)
@@ -12,10 +12,18 @@ class WingmanUsersAdmin(admin.ModelAdmin):
 
 @admin.register(LlamaResponse)
 class LlamaResponseAdmin(admin.ModelAdmin):
-    list_display = ("id", "prompt_short", "response_short", "created_at")
+    list_display = (
+        "id",
+        "chat_window_id",
+        "seq",
+        "prompt_short",
+        "response_short",
+        "created_at",
+    )
     search_fields = ("prompt", "response")
     list_filter = ("created_at",)
     readonly_fields = ("created_at",)
+    raw_id_fields = ("user", "chat_window")
 
     def prompt_short(self, obj):
         return obj.prompt[:50] + "..." if len(obj.prompt) > 50 else obj.prompt
@@ -29,7 +37,15 @@ class LlamaResponseAdmin(admin.ModelAdmin):
 
 @admin.register(LlamaChatWindow)
 class LlamaChatWindowAdmin(admin.ModelAdmin):
-    list_display = ("id", "user", "created_at")
+    list_display = ("id", "user", "message_count", "last_activity_at", "created_at")
     search_fields = ("user",)
     list_filter = ("created_at",)
     readonly_fields = ("created_at",)
+
+
+@admin.register(LoveMessageTemplate)
+class LoveMessageTemplateAdmin(admin.ModelAdmin):
+    list_display = ("id", "score", "created_at")
+    list_filter = ("score",)
+    search_fields = ("template",)
+    readonly_fields = ("created_at",)
@@ -0,0 +1,302 @@
+import asyncio
+import math
+import time
+import weakref
+from collections import OrderedDict, deque
+
+from django.conf import settings
+
+from . import metrics
+
+
+class QueueFull(Exception):
+    """Raised when a generation can't be admitted; carries a Retry-After hint."""
+
+    def __init__(self, message, retry_after, status=503):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.status = status
+
+
+def priority_for(endpoint):
+    """Priority class an endpoint's generations are scheduled in."""
+    return settings.OLLAMA_ENDPOINT_PRIORITY.get(
+        endpoint, settings.OLLAMA_DEFAULT_PRIORITY
+    )
+
+
+class Ticket:
+    def __init__(self, controller, endpoint, priority, user):
+        self.controller = controller
+        self.endpoint = endpoint
+        self.priority = priority
+        self.user = user
+        self.admitted = False
+        self.released = False
+        self.admitted_at = None
+        self.enqueued_at = time.monotonic()
+        self.changed = asyncio.Event()
+
+    @property
+    def position(self):
+        """Estimated 1-based place in the queue, 0 once admitted."""
+        if self.admitted:
+            return 0
+        return self.controller.position_of(self)
+
+    async def wait(self):
+        """Wait until admitted or until the queue position changes."""
+        remaining = self.controller.queue_timeout - (
+            time.monotonic() - self.enqueued_at
+        )
+        try:
+            await asyncio.wait_for(self.changed.wait(), max(remaining, 0))
+        except asyncio.TimeoutError:
+            raise QueueFull(
+                "Timed out waiting for a free generation slot",
+                self.controller.retry_after(),
+            )
+        self.changed.clear()
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.controller.release(self)
+
+    def transfer(self):
+        """A new ticket that takes over this one's slot or place in the queue
+        and is released by its new holder; this one counts as released."""
+        return self.controller.transfer(self)
+
+
+class PriorityClass:
+    """Waiting tickets of one priority class, round-robin across users."""
+
+    def __init__(self, name, weight, max_share):
+        self.name = name
+        self.weight = weight
+        self.max_share = max_share
+        self.active = 0
+        self.virtual_time = 0.0
+        self.users = OrderedDict()  # user -> deque of tickets
+
+    def __len__(self):
+        return sum(len(tickets) for tickets in self.users.values())
+
+    def push(self, ticket):
+        self.users.setdefault(ticket.user, deque()).append(ticket)
+
+    def pop(self):
+        user, tickets = next(iter(self.users.items()))
+        ticket = tickets.popleft()
+        # The user goes to the back of the line for this class
+        del self.users[user]
+        if tickets:
+            self.users[user] = tickets
+        return ticket
+
+    def remove(self, ticket):
+        tickets = self.users.get(ticket.user)
+        if not tickets or ticket not in tickets:
+            return False
+        tickets.remove(ticket)
+        if not tickets:
+            del self.users[ticket.user]
+        return True
+
+    def rank(self, ticket):
+        # Round-robin order: every user's first ticket, then every second...
+        tickets = self.users[ticket.user]
+        depth = tickets.index(ticket)
+        users = list(self.users)
+        ahead = sum(min(len(self.users[u]), depth) for u in users)
+        ahead += sum(
+            1 for u in users[: users.index(ticket.user)] if len(self.users[u]) > depth
+        )
+        return ahead
+
+
+class AdmissionController:
+    """Bounded, priority-aware admission in front of Ollama.
+
+    At most ``max_concurrency`` generations run at once and up to
+    ``max_queue`` more wait; anything that would have to wait beyond that is
+    rejected right away with a Retry-After estimate instead of piling up
+    until it times out. That holds while slots are free, too: a class at
+    its ``max_share`` queues even though other slots are idle.
+
+    Free slots go to the priority class with the lowest virtual time, which
+    advances by ``1 / weight`` per admission, so classes share capacity in
+    proportion to their weights. A class never holds more than its
+    ``max_share`` of the slots, which keeps room for interactive chat when
+    batch work is saturated. Within a class, users take turns, and no user
+    may have more than ``max_queue_per_user`` generations waiting.
+    """
+
+    def __init__(
+        self, max_concurrency, max_queue, queue_timeout, classes, max_queue_per_user
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_queue_per_user = max_queue_per_user
+        self.classes = {
+            name: PriorityClass(name, spec["weight"], spec.get("max_share", 1.0))
+            for name, spec in classes.items()
+        }
+        self.active = 0
+        self.virtual_time = 0.0
+        # Moving average of how long a generation holds its slot, in seconds
+        self.avg_service_time = 5.0
+
+    @property
+    def waiting(self):
+        return sum(len(c) for c in self.classes.values())
+
+    def retry_after(self):
+        waves = (self.waiting + 1) / self.max_concurrency
+        return max(1, math.ceil(waves * self.avg_service_time))
+
+    def _class_limit(self, priority_class):
+        return max(1, math.floor(self.max_concurrency * priority_class.max_share))
+
+    def _can_start(self, priority_class):
+        # Slots are handed out as soon as they free up, so a class below its
+        # limit has nobody waiting and a new ticket would start right away
+        return self.active < self.max_concurrency and priority_class.active < (
+            self._class_limit(priority_class)
+        )
+
+    def check(self, user=None, priority=None):
+        """Raise QueueFull if a new ticket (in class ``priority``) would be
+        rejected right now."""
+        priority_class = self.classes.get(priority)
+        starts = priority_class is not None and self._can_start(priority_class)
+        if self.waiting >= self.max_queue and not starts:
+            raise QueueFull(
+                "Server is busy, too many generations queued", self.retry_after()
+            )
+        if user is not None:
+            queued = sum(len(c.users.get(user, ())) for c in self.classes.values())
+            if queued >= self.max_queue_per_user:
+                raise QueueFull(
+                    "Too many of your generations are already queued",
+                    self.retry_after(),
+                    status=429,
+                )
+
+    def enter(self, endpoint=None, user=None):
+        """Queue a generation for ``endpoint`` on behalf of ``user``."""
+        priority = priority_for(endpoint)
+        if priority not in self.classes:
+            priority = next(iter(self.classes))
+        self.check(user, priority)
+        ticket = Ticket(self, endpoint, priority, user)
+        priority_class = self.classes[priority]
+        if not len(priority_class):
+            # A class coming back from idle must not cash in time it wasn't using
+            priority_class.virtual_time = max(
+                priority_class.virtual_time, self.virtual_time
+            )
+        priority_class.push(ticket)
+        self._dispatch()
+        return ticket
+
+    def release(self, ticket):
+        priority_class = self.classes[ticket.priority]
+        if ticket.admitted:
+            self.active -= 1
+            priority_class.active -= 1
+            held = time.monotonic() - ticket.admitted_at
+            self.avg_service_time = 0.8 * self.avg_service_time + 0.2 * held
+        elif not priority_class.remove(ticket):
+            return
+        self._dispatch()
+
+    def transfer(self, ticket):
+        if ticket.released:
+            # Given back already, so the new holder has to queue again
+            return self.enter(ticket.endpoint, ticket.user)
+        new = Ticket(self, ticket.endpoint, ticket.priority, ticket.user)
+        new.enqueued_at = ticket.enqueued_at
+        if ticket.admitted:
+            new.admitted = True
+            new.admitted_at = ticket.admitted_at
+        else:
+            tickets = self.classes[ticket.priority].users[ticket.user]
+            tickets[tickets.index(ticket)] = new
+        ticket.released = True
+        return new
+
+    def _dispatch(self):
+        while self.active < self.max_concurrency:
+            eligible = [
+                c
+                for c in self.classes.values()
+                if len(c) and c.active < self._class_limit(c)
+            ]
+            if not eligible:
+                break
+            priority_class = min(eligible, key=lambda c: c.virtual_time)
+            priority_class.virtual_time += 1 / priority_class.weight
+            self.virtual_time = priority_class.virtual_time
+            self._admit(priority_class, priority_class.pop())
+        # Everyone still waiting may have moved up
+        for priority_class in self.classes.values():
+            for tickets in priority_class.users.values():
+                for waiting in tickets:
+                    waiting.changed.set()
+
+    def _admit(self, priority_class, ticket):
+        self.active += 1
+        priority_class.active += 1
+        ticket.admitted = True
+        ticket.admitted_at = time.monotonic()
+        ticket.changed.set()
+        metrics.QUEUE_WAIT.labels(ticket.endpoint or "unknown").observe(
+            ticket.admitted_at - ticket.enqueued_at
+        )
+
+    def position_of(self, ticket):
+        """Estimate how many admissions happen before ``ticket``'s.
+
+        Tickets ahead in its own class count fully; other classes count in
+        proportion to their weight relative to this one.
+        """
+        own = self.classes[ticket.priority]
+        ahead = own.rank(ticket)
+        for other in self.classes.values():
+            if other is not own and len(other):
+                share = other.weight / own.weight
+                ahead += min(len(other), math.ceil((ahead + 1) * share))
+        return ahead + 1
+
+    async def acquire(self, endpoint=None, user=None):
+        """Enter and wait for admission; the caller must ``release()`` the ticket."""
+        ticket = self.enter(endpoint, user)
+        try:
+            while not ticket.admitted:
+                await ticket.wait()
+        except BaseException:
+            ticket.release()
+            raise
+        return ticket
+
+
+# One controller per event loop, like the pooled Ollama clients
+_controllers = weakref.WeakKeyDictionary()
+
+
+def get_admission_controller():
+    loop = asyncio.get_running_loop()
+    controller = _controllers.get(loop)
+    if controller is None:
+        controller = AdmissionController(
+            max_concurrency=settings.OLLAMA_MAX_CONCURRENCY,
+            max_queue=settings.OLLAMA_MAX_QUEUE,
+            queue_timeout=settings.OLLAMA_QUEUE_TIMEOUT,
+            classes=settings.OLLAMA_PRIORITY_CLASSES,
+            max_queue_per_user=settings.OLLAMA_MAX_QUEUE_PER_USER,
+        )
+        _controllers[loop] = controller
+    return controller
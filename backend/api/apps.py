@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "api"
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from .metrics import install_db_timer
+
+        # Time every query so /api/metrics/ can report DB time per request
+        connection_created.connect(install_db_timer)
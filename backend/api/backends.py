@@ -0,0 +1,203 @@
+import asyncio
+import contextlib
+import hashlib
+import threading
+import time
+
+import httpx
+from django.conf import settings
+
+
+class Backend:
+    """One Ollama server in the pool, with its load and health."""
+
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+        self.outstanding = 0
+        self.healthy = True
+        self.failures = 0
+        self.last_failure_at = 0.0
+
+    def __repr__(self):
+        state = "up" if self.healthy else "down"
+        return f"<Backend {self.url} {state} outstanding={self.outstanding}>"
+
+
+class BackendPool:
+    """Route generations across several Ollama servers.
+
+    Each call goes to the healthy backend with the fewest outstanding
+    requests. A backend is ejected after ``max_failures`` consecutive
+    connection failures, timeouts or gateway errors, whether seen by a real
+    request or by the active health probe, and readmitted as soon as a probe
+    succeeds again. If every backend is down, the least recently failed one is
+    still tried rather than failing outright.
+
+    A call with an affinity ``key`` (a chat, say) instead goes to the
+    backend that ranks highest for that key under rendezvous hashing, so
+    the turns of a conversation land on the node that already holds its
+    state. If that node is down or fails, the key's next-ranked node takes
+    over, and only keys that ranked the failed node first move at all.
+    """
+
+    # Statuses that mean the server itself is in trouble; a 4xx or a plain 500
+    # from a bad prompt says nothing about the node's health
+    FAILURE_STATUSES = (502, 503, 504)
+
+    def __init__(self, urls, health_interval, health_timeout, max_failures):
+        self.backends = [Backend(url) for url in urls]
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.max_failures = max_failures
+        self._last_probe = 0.0
+        self._probing = False
+
+    @staticmethod
+    def _score(key, backend):
+        # Stable across processes, unlike hash()
+        digest = hashlib.blake2b(f"{key}|{backend.url}".encode(), digest_size=8)
+        return int.from_bytes(digest.digest(), "big")
+
+    def pick(self, exclude=(), key=None):
+        candidates = [b for b in self.backends if b not in exclude]
+        if not candidates:
+            return None
+        healthy = [b for b in candidates if b.healthy]
+        if not healthy:
+            return min(candidates, key=lambda b: b.last_failure_at)
+        if key is not None:
+            return max(healthy, key=lambda b: self._score(key, b))
+        return min(healthy, key=lambda b: b.outstanding)
+
+    def record_success(self, backend):
+        backend.failures = 0
+        if not backend.healthy:
+            print(f"Ollama backend {backend.url} is back up")
+            backend.healthy = True
+
+    def record_failure(self, backend, reason):
+        backend.failures += 1
+        backend.last_failure_at = time.monotonic()
+        if backend.healthy and backend.failures >= self.max_failures:
+            print(f"Ejecting Ollama backend {backend.url}: {reason}")
+            backend.healthy = False
+
+    @contextlib.asynccontextmanager
+    async def use(self, exclude=(), key=None):
+        """Pick a backend (for affinity ``key``, if given) and count the
+        request against it while it runs.
+
+        Transport errors and gateway statuses (raised through
+        ``raise_for_status``) count as failures of the backend; anything else
+        is the request's own problem.
+        """
+        self.maybe_probe()
+        backend = self.pick(exclude, key)
+        backend.outstanding += 1
+        try:
+            yield backend
+        except httpx.TransportError as e:
+            self.record_failure(backend, repr(e))
+            raise
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code in self.FAILURE_STATUSES:
+                self.record_failure(backend, f"status {e.response.status_code}")
+            raise
+        else:
+            self.record_success(backend)
+        finally:
+            backend.outstanding -= 1
+
+    def maybe_probe(self):
+        """Start a round of health probes if one is due.
+
+        Traffic triggers a round on the request's own loop; the
+        ``HealthMonitor`` thread covers the time without traffic.
+        """
+        if self._probing:
+            return
+        if time.monotonic() - self._last_probe < self.health_interval:
+            return
+        self._probing = True
+        self._last_probe = time.monotonic()
+        asyncio.ensure_future(self.probe())
+
+    async def probe(self):
+        try:
+            async with httpx.AsyncClient(timeout=self.health_timeout) as client:
+                await asyncio.gather(
+                    *(self._probe_one(client, backend) for backend in self.backends)
+                )
+        finally:
+            self._probing = False
+
+    async def _probe_one(self, client, backend):
+        try:
+            response = await client.get(f"{backend.url}/api/version")
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            self.record_failure(backend, f"health probe failed: {e!r}")
+        else:
+            self.record_success(backend)
+
+
+class HealthMonitor:
+    """Probe every backend of ``pool`` each ``interval`` seconds.
+
+    Runs on its own thread and event loop, so an ejected server is
+    readmitted, and readiness sees it, even when no request comes in.
+    """
+
+    def __init__(self, pool, interval):
+        self.pool = pool
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run, name="ollama-health", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            if not self.pool._probing:
+                self.pool._probing = True
+                self.pool._last_probe = time.monotonic()
+                try:
+                    asyncio.run(self.pool.probe())
+                except Exception as e:
+                    self.pool._probing = False
+                    print(f"Health probe round failed: {str(e)}")
+            self._stop.wait(self.interval)
+
+
+_default_pool = None
+_health_monitor = None
+
+
+def get_backend_pool():
+    """Return the process-wide BackendPool built from settings."""
+    global _default_pool
+    if _default_pool is None:
+        _default_pool = BackendPool(
+            settings.OLLAMA_BACKENDS,
+            health_interval=settings.OLLAMA_HEALTH_INTERVAL,
+            health_timeout=settings.OLLAMA_HEALTH_TIMEOUT,
+            max_failures=settings.OLLAMA_MAX_FAILURES,
+        )
+    return _default_pool
+
+
+def start_health_checks():
+    """Start the process-wide HealthMonitor for the default pool."""
+    global _health_monitor
+    if _health_monitor is None:
+        pool = get_backend_pool()
+        _health_monitor = HealthMonitor(pool, pool.health_interval).start()
+    return _health_monitor
@@ -0,0 +1,70 @@
+# JSON encoding and decoding for the hot paths: Ollama's NDJSON stream, SSE
+# frames and API responses. Uses orjson when it is installed and the stdlib
+# otherwise; both raise json.JSONDecodeError on bad input.
+import json
+
+from django.conf import settings
+
+try:
+    import orjson
+except ImportError:  # optional; the stdlib codec is used without it
+    orjson = None
+
+
+def _backend():
+    choice = settings.JSON_CODEC
+    if choice == "orjson" and orjson is None:
+        raise ImportError("JSON_CODEC is 'orjson' but orjson is not installed")
+    if choice == "auto":
+        return "orjson" if orjson is not None else "stdlib"
+    return choice
+
+
+BACKEND = _backend()
+
+if BACKEND == "orjson":
+
+    def loads(data):
+        """Parse JSON from ``bytes`` or ``str``."""
+        return orjson.loads(data)
+
+    def dumps_bytes(obj, default=None):
+        """Serialize to compact UTF-8 JSON bytes.
+
+        As with the stdlib, ``default`` handles everything that isn't plain
+        JSON, datetimes included.
+        """
+        if default is None:
+            return orjson.dumps(obj)
+        return orjson.dumps(
+            obj, default=default, option=orjson.OPT_PASSTHROUGH_DATETIME
+        )
+
+else:
+
+    def loads(data):
+        """Parse JSON from ``bytes`` or ``str``."""
+        return json.loads(data)
+
+    def dumps_bytes(obj, default=None):
+        """Serialize to compact UTF-8 JSON bytes."""
+        return json.dumps(
+            obj, default=default, ensure_ascii=False, separators=(",", ":")
+        ).encode()
+
+
+def dumps(obj, default=None):
+    return dumps_bytes(obj, default).decode()
+
+
+async def iter_lines(byte_chunks):
+    """Split a byte stream into lines without decoding it, so each NDJSON
+    line can go to ``loads`` as bytes."""
+    buffer = b""
+    async for data in byte_chunks:
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
@@ -0,0 +1,41 @@
+"""Compact storage format for Ollama context token arrays.
+
+A context is a list of token ids. It is stored as little-endian uint32s,
+zlib-compressed, instead of a JSON list of integers. Consecutive turns of a
+chat share a long prefix, so each stored row only carries the tokens that
+follow the prefix it shares with the previous turn.
+"""
+
+import sys
+import zlib
+from array import array
+
+_TOKEN_TYPECODE = "I"  # unsigned int, 4 bytes on every platform we deploy to
+
+
+def pack_tokens(tokens):
+    arr = array(_TOKEN_TYPECODE, tokens)
+    if sys.byteorder != "little":
+        arr.byteswap()
+    return zlib.compress(arr.tobytes())
+
+
+def unpack_tokens(blob):
+    arr = array(_TOKEN_TYPECODE)
+    arr.frombytes(zlib.decompress(bytes(blob)))
+    if sys.byteorder != "little":
+        arr.byteswap()
+    return arr.tolist()
+
+
+def common_prefix_length(previous, current):
+    # Ollama usually returns the previous context extended with the new turn,
+    # so try the whole-prefix comparison first; it runs at C speed.
+    if len(current) >= len(previous) and current[: len(previous)] == previous:
+        return len(previous)
+    length = 0
+    for a, b in zip(previous, current):
+        if a != b:
+            break
+        length += 1
+    return length
@@ -0,0 +1,140 @@
+# Token-budgeted chat history for Ollama's /api/chat. A chat is sent as its
+# rolling summary plus the newest turns that fit in CHAT_TOKEN_BUDGET, so the
+# prompt Ollama has to evaluate stays the same size however long the chat
+# gets. Turns that fall out of the budget are folded into the summary in the
+# background, off the request path.
+import asyncio
+from dataclasses import dataclass
+
+from django.conf import settings
+
+from . import routing
+from .models import LlamaChatWindow
+from .ollama import get_ollama_client
+
+# Close enough for budgeting without a round trip to a tokenizer
+CHARS_PER_TOKEN = 4
+
+# Only summarize once this many turns have fallen out of the budget, so the
+# summary isn't rewritten on every turn of a long chat
+SUMMARY_MIN_TURNS = 4
+
+SUMMARY_SYSTEM = """
+You maintain a running summary of a conversation between a user and a dating coach.
+Merge the previous summary and the new turns into one updated summary.
+Keep facts about the user, their situation, the people involved, advice already given and open questions.
+Write plain, compact prose in the third person. Reply only with the summary.
+"""
+
+
+@dataclass
+class Turn:
+    prompt: str
+    response: str
+    # None for a turn that is not written yet
+    seq: int = None
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+async def load_turns(chat_window, pending=()):
+    """The chat's unsummarized turns, oldest first: the newest
+    CHAT_MAX_TURNS written ones followed by the ``pending`` generations."""
+    rows = [
+        Turn(prompt, response, seq)
+        async for seq, prompt, response in chat_window.messages.filter(
+            seq__gt=chat_window.summary_seq
+        )
+        .order_by("-seq")
+        .values_list("seq", "prompt", "response")[: settings.CHAT_MAX_TURNS]
+    ]
+    rows.reverse()
+    # A generation written since it was handed over can show up in both
+    written = {(t.prompt, t.response) for t in rows}
+    return rows + [
+        Turn(g.prompt, g.response)
+        for g in pending
+        if (g.prompt, g.response) not in written
+    ]
+
+
+def build_messages(system, summary, turns, prompt, budget=None):
+    """Messages for ``/api/chat``: the system prompt (with the summary),
+    the newest ``turns`` that fit in ``budget`` tokens, and ``prompt``.
+
+    Returns ``(messages, kept)``, ``kept`` being how many turns made it in.
+    """
+    budget = settings.CHAT_TOKEN_BUDGET if budget is None else budget
+    if summary:
+        system += f"\n\nSummary of the conversation so far:\n{summary}"
+    remaining = budget - estimate_tokens(system) - estimate_tokens(prompt)
+
+    kept = 0
+    for turn in reversed(turns):
+        cost = estimate_tokens(turn.prompt) + estimate_tokens(turn.response)
+        if cost > remaining:
+            break
+        remaining -= cost
+        kept += 1
+
+    messages = [{"role": "system", "content": system}]
+    for turn in turns[len(turns) - kept :]:
+        messages.append({"role": "user", "content": turn.prompt})
+        messages.append({"role": "assistant", "content": turn.response})
+    messages.append({"role": "user", "content": prompt})
+    return messages, kept
+
+
+_tasks = set()  # running summary updates, referenced until they finish
+_summarizing = set()  # window ids with a summary update running
+
+
+def schedule_summary(chat_window, turns, kept):
+    """Fold the written turns that didn't fit into the window's summary,
+    once enough have piled up. Runs as a task on the current loop."""
+    # Turns further back than CHAT_MAX_TURNS are never loaded, so a chat that
+    # predates this mode starts its summary from the turns it still sees
+    dropped = [t for t in turns[: len(turns) - kept] if t.seq is not None]
+    if len(dropped) < SUMMARY_MIN_TURNS or chat_window.id in _summarizing:
+        return
+    _summarizing.add(chat_window.id)
+    task = asyncio.ensure_future(summarize(chat_window, dropped))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+async def summarize(chat_window, turns):
+    try:
+        transcript = "\n\n".join(
+            f"User: {t.prompt}\nCoach: {t.response}" for t in turns
+        )
+        prompt = (
+            f"Previous summary:\n{chat_window.summary or '(none)'}\n\n"
+            f"New turns:\n{transcript}"
+        )
+        payload = {
+            "prompt": prompt,
+            "system": SUMMARY_SYSTEM,
+            "options": {
+                "temperature": 0.2,
+                "num_predict": settings.CHAT_SUMMARY_TOKENS,
+            },
+        }
+        data = await get_ollama_client().generate(
+            routing.apply(payload, "chat_summary"),
+            coalesce=False,
+            endpoint="chat_summary",
+            user=chat_window.user_id,
+        )
+        summary = data.get("response", "").strip()
+        if summary:
+            # Only moves forward, and never over a summary written meanwhile
+            await LlamaChatWindow.objects.filter(
+                id=chat_window.id, summary_seq=chat_window.summary_seq
+            ).aupdate(summary=summary, summary_seq=turns[-1].seq)
+    except Exception as e:
+        print(f"Error summarizing chat {chat_window.id}: {str(e)}")
+    finally:
+        _summarizing.discard(chat_window.id)
@@ -0,0 +1,215 @@
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# What the fake model "generates": numbered lines, so tinder_replies output
+# looks like the real thing
+DEFAULT_TEXT = (
+    "1. Hey, that sounds like a great plan to me\n"
+    "2. Only if you promise to pick the place\n"
+    "3. You had me at coffee, when are you free\n"
+    "4. I was hoping you would ask that\n"
+    "5. Sure, but I am warning you I am very competitive"
+)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, obj):
+        body = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        fake = self.server.fake
+        if self.path == "/api/version":
+            self._send_json(200, {"version": "0.0.0-fake"})
+        elif self.path == "/api/tags":
+            self._send_json(
+                200, {"models": [{"name": fake.model, "model": fake.model}]}
+            )
+        elif self.path == "/api/ps":
+            self._send_json(
+                200,
+                {"models": [{"name": m, "model": m} for m in sorted(fake.loaded)]},
+            )
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        fake = self.server.fake
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        fake.record(self.path, request)
+
+        if self.path not in ("/api/generate", "/api/chat"):
+            self._send_json(404, {"error": "not found"})
+            return
+        if fake.should_fail():
+            self._send_json(500, {"error": "fake ollama error"})
+            return
+
+        model = request.get("model", fake.model)
+        fake.load(model, request.get("keep_alive"))
+        if not request.get("prompt") and not request.get("messages"):
+            # Ollama's way of just loading (or, with keep_alive 0, unloading)
+            self._send_json(
+                200,
+                {"model": model, "response": "", "done": True, "done_reason": "load"},
+            )
+            return
+
+        time.sleep(fake.latency)
+        tokens = fake.tokens()
+        started = time.monotonic()
+        chat = self.path == "/api/chat"
+        if chat:
+            # /api/chat has no context; the prompt is the whole conversation
+            context = None
+            prompt_tokens = sum(
+                len(m.get("content", "").split()) for m in request.get("messages", [])
+            )
+        else:
+            context = list(request.get("context") or []) + fake.new_context()
+            prompt_tokens = None
+
+        def chunk(text, done, **stats):
+            if chat:
+                body = {"message": {"role": "assistant", "content": text}}
+            else:
+                body = {"response": text}
+            return {"model": model, **body, "done": done, **stats}
+
+        if not request.get("stream", True):
+            time.sleep(len(tokens) / fake.token_rate)
+            stats = fake.stats(tokens, started, context, prompt_tokens)
+            self._send_json(200, chunk("".join(tokens), True, **stats))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for token in tokens:
+            time.sleep(1 / fake.token_rate)
+            self._write_chunk(chunk(token, False))
+        stats = fake.stats(tokens, started, context, prompt_tokens)
+        self._write_chunk(chunk("", True, **stats))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, obj):
+        data = (json.dumps(obj) + "\n").encode()
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+
+class FakeOllama:
+    """A stand-in Ollama server for benchmarks and tests, served from a thread.
+
+    Speaks ``/api/generate`` and ``/api/chat`` in streaming and non-streaming
+    mode at ``token_rate`` tokens per second after ``latency`` seconds of
+    prompt processing, fails ``error_rate`` of generations with a 500, and
+    extends the request's ``context`` by ``context_length`` tokens per
+    ``/api/generate`` call. ``/api/ps`` lists the models used so far.
+    """
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        text=DEFAULT_TEXT,
+        token_rate=50.0,
+        latency=0.05,
+        error_rate=0.0,
+        context_length=64,
+        model="fake-model",
+        seed=None,
+    ):
+        self.text = text
+        self.token_rate = token_rate
+        self.latency = latency
+        self.error_rate = error_rate
+        self.context_length = context_length
+        self.model = model
+        self.requests = []
+        self.loaded = set()  # models /api/ps reports
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record(self, path, request):
+        with self._lock:
+            self.requests.append((path, request))
+
+    def load(self, model, keep_alive=None):
+        with self._lock:
+            if keep_alive in (0, "0"):
+                self.loaded.discard(model)
+            else:
+                self.loaded.add(model)
+
+    def should_fail(self):
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def tokens(self):
+        # Roughly one token per word, keeping the whitespace
+        words = self.text.split(" ")
+        return [w if i == 0 else " " + w for i, w in enumerate(words)]
+
+    def new_context(self):
+        with self._lock:
+            return [
+                self._random.randrange(1, 256000) for _ in range(self.context_length)
+            ]
+
+    def stats(self, tokens, started, context=None, prompt_tokens=None):
+        eval_duration = max(time.monotonic() - started, 1e-6)
+        stats = {
+            "prompt_eval_count": (
+                len(context) - self.context_length
+                if prompt_tokens is None
+                else prompt_tokens
+            ),
+            "eval_count": len(tokens),
+            "eval_duration": int(eval_duration * 1e9),
+            "total_duration": int((eval_duration + self.latency) * 1e9),
+        }
+        if context is not None:
+            stats["context"] = context
+        return stats
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
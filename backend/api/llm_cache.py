@@ -0,0 +1,54 @@
+import hashlib
+import json
+import re
+
+from django.conf import settings
+from django.core.cache import caches
+
+_WHITESPACE = re.compile(r"\s+")
+
+# Size of the pieces a cached response is replayed in over SSE
+REPLAY_CHUNK_WORDS = 3
+
+
+def _normalize_text(value):
+    return _WHITESPACE.sub(" ", value or "").strip()
+
+
+def payload_key(payload, model):
+    """Key a generation on what determines its output: model, prompts, options
+    and the conversation (context or messages) it continues from."""
+    normalized = {
+        "model": payload.get("model") or model,
+        "system": _normalize_text(payload.get("system")),
+        "prompt": _normalize_text(payload.get("prompt")),
+        "options": payload.get("options") or {},
+        "temperature": payload.get("temperature"),
+        "context": payload.get("context") or None,
+        "messages": [
+            {**m, "content": _normalize_text(m.get("content"))}
+            for m in payload.get("messages") or ()
+        ],
+    }
+    digest = hashlib.sha256(
+        json.dumps(normalized, sort_keys=True, ensure_ascii=False).encode()
+    ).hexdigest()
+    return f"generate:{digest}"
+
+
+async def get(key):
+    return await caches[settings.LLM_CACHE_ALIAS].aget(key)
+
+
+async def store(key, response_text):
+    if len(response_text.encode()) > settings.LLM_CACHE_MAX_ENTRY_BYTES:
+        return
+    await caches[settings.LLM_CACHE_ALIAS].aset(key, response_text)
+
+
+async def replay(response_text):
+    """Yield a cached response as Ollama-shaped stream chunks."""
+    words = re.split(r"(?<=\s)", response_text)
+    for i in range(0, len(words), REPLAY_CHUNK_WORDS):
+        yield {"response": "".join(words[i : i + REPLAY_CHUNK_WORDS]), "done": False}
+    yield {"response": "", "done": True, "cached": True}
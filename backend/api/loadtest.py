@@ -0,0 +1,155 @@
+import asyncio
+import json
+import math
+import time
+from dataclasses import dataclass, field
+
+import httpx
+
+
+def _chat_body(i, user_id):
+    return {"prompt": f"Load test message {i}", "user_id": user_id}
+
+
+def _tinder_replies_body(i, user_id):
+    return {"message": f"Hey, want to grab coffee? ({i})", "user_id": user_id}
+
+
+# endpoint -> (path, request body for the i-th request). Bodies differ per
+# request so the response cache and coalescing don't hide the real load.
+ENDPOINTS = {
+    "generate_response": ("/api/generate/", _chat_body),
+    "tinder_replies": ("/api/tinder_replies/", _tinder_replies_body),
+}
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of ``values`` (``pct`` between 0 and 100)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+@dataclass
+class StreamResult:
+    ttft: float = None  # seconds until the first token event
+    first_reply: float = None  # seconds until the first parsed reply event
+    duration: float = None  # seconds until the stream ended
+    chunks: int = 0
+    error: str = None
+    text: str = ""
+
+
+@dataclass
+class LoadReport:
+    results: list = field(default_factory=list)
+    elapsed: float = 0.0
+    memory_before: int = None
+    memory_after: int = None
+
+    @property
+    def ok(self):
+        return [r for r in self.results if r.error is None]
+
+    @property
+    def errors(self):
+        return [r for r in self.results if r.error is not None]
+
+    def summary(self):
+        ttfts = [r.ttft for r in self.ok if r.ttft is not None]
+        first_replies = [r.first_reply for r in self.ok if r.first_reply is not None]
+        return {
+            "requests": len(self.results),
+            "errors": len(self.errors),
+            "elapsed": self.elapsed,
+            "throughput": len(self.ok) / self.elapsed if self.elapsed else 0.0,
+            "chunks_per_second": (
+                sum(r.chunks for r in self.ok) / self.elapsed if self.elapsed else 0.0
+            ),
+            "ttft_p50": percentile(ttfts, 50),
+            "ttft_p95": percentile(ttfts, 95),
+            "ttft_p99": percentile(ttfts, 99),
+            "first_reply_p50": percentile(first_replies, 50),
+            "first_reply_p95": percentile(first_replies, 95),
+            "memory_before": self.memory_before,
+            "memory_after": self.memory_after,
+        }
+
+
+async def consume_sse(lines):
+    """Time an SSE stream given as an async iterator of text lines."""
+    result = StreamResult()
+    parts = []
+    started = time.perf_counter()
+    async for line in lines:
+        if not line.startswith("data: "):
+            continue
+        event = json.loads(line[len("data: ") :])
+        if event.get("queued"):
+            continue
+        if "reply" in event:
+            # tinder_replies sends each parsed reply as its own event
+            if result.first_reply is None:
+                result.first_reply = time.perf_counter() - started
+            continue
+        if event.get("error"):
+            result.error = event["error"]
+            break
+        result.chunks += 1
+        parts.append(event.get("chunk", ""))
+        if result.ttft is None:
+            result.ttft = time.perf_counter() - started
+    # Read to the end rather than stopping at "done", like the frontend does:
+    # the server still has work to do after sending it
+    result.duration = time.perf_counter() - started
+    result.text = "".join(parts)
+    return result
+
+
+def httpx_stream(client):
+    """Open SSE streams over an ``httpx.AsyncClient`` against a live server."""
+
+    async def open_stream(path, body):
+        async with client.stream("POST", path, json=body) as response:
+            if response.status_code != 200:
+                await response.aread()
+                return StreamResult(
+                    error=f"HTTP {response.status_code}: {response.text[:200]}"
+                )
+            return await consume_sse(response.aiter_lines())
+
+    return open_stream
+
+
+async def run_load(open_stream, path, bodies, concurrency):
+    """Send every body in ``bodies`` to ``path`` as an SSE stream, keeping
+    ``concurrency`` streams open at once."""
+    semaphore = asyncio.Semaphore(concurrency)
+    report = LoadReport()
+
+    async def one(body):
+        async with semaphore:
+            try:
+                report.results.append(await open_stream(path, body))
+            except Exception as e:
+                report.results.append(StreamResult(error=repr(e)))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(body) for body in bodies))
+    report.elapsed = time.perf_counter() - started
+    return report
+
+
+async def server_memory(client):
+    """Resident memory of the server process, scraped from ``/api/metrics/``."""
+    try:
+        response = await client.get("/api/metrics/")
+        response.raise_for_status()
+    except httpx.HTTPError:
+        return None
+    for line in response.text.splitlines():
+        if line.startswith("process_resident_memory_bytes "):
+            return int(float(line.split()[1]))
+    return None
@@ -0,0 +1,126 @@
+import random
+import re
+import time
+
+from django.conf import settings
+
+from . import routing, singleflight
+from .models import LoveMessageTemplate
+from .ollama import get_ollama_client
+
+# Stand-in names the model writes into pooled templates; swapped for the
+# real names when a template is served. Plain words, because the prompt asks
+# for no special characters.
+NAME1_MARKER = "NAMEONE"
+NAME2_MARKER = "NAMETWO"
+
+# Generations tried per template before giving up on a model that keeps
+# mangling the markers
+MAX_ATTEMPTS = 3
+
+# score -> (loaded_at, [templates])
+_pool = {}
+
+
+def build_payload(love_score, name1, name2):
+    """Ollama payload for a love calculator message."""
+    payload = {
+        "prompt": f"Generate a message about their relationship based on the love score {love_score}.",
+        "system": """
+                    You are a love calculator.
+                    Assume the score is between 0 and 100.
+                    The mesage should be based on the score.
+                    Don't use any boilerplate text, just the message.
+                    Don't use any emojis.
+                    Don't use any special characters.
+                    Use jock-like slang.
+                    Tell the user if he should go for it or not.
+                    If their score is low, tell them to move on and not waste their time.
+                    If their score is high, tell them to go for it.
+                    The message should be around 80 words.
+                 """
+        + f"The Name of the user is {name1} and the name of the love interest is {name2}."
+        + f"Use the score {love_score}% in the message.",
+        "temperature": 0.9,
+        "context": [],
+    }
+    return routing.apply(payload, "love_calculator")
+
+
+def render(template, name1, name2):
+    return template.replace(NAME1_MARKER, name1).replace(NAME2_MARKER, name2)
+
+
+def check_markers(text):
+    """``text`` with case variants of the markers ("Nameone") fixed, or None
+    if either marker is missing, since the template could never be rendered
+    with the real names."""
+    for marker in (NAME1_MARKER, NAME2_MARKER):
+        text = re.sub(rf"\b{marker}\b", marker, text, flags=re.IGNORECASE)
+    if NAME1_MARKER not in text or NAME2_MARKER not in text:
+        return None
+    return text
+
+
+async def generate_template(love_score, coalesce=True, attempts=MAX_ATTEMPTS):
+    """Generate one pooled template for ``love_score`` and store it.
+
+    A generation without both name markers is thrown away and retried, up to
+    ``attempts`` times; returns None if none of them had the markers.
+    Pass ``coalesce=False`` when filling the pool, so concurrent generations
+    for the same score produce distinct templates.
+    """
+    for attempt in range(attempts):
+        data = await get_ollama_client().generate(
+            build_payload(love_score, NAME1_MARKER, NAME2_MARKER),
+            coalesce=coalesce and attempt == 0,
+            endpoint="love_calculator",
+        )
+        text = check_markers(data.get("response", "").strip())
+        if text:
+            break
+        print(f"Love message for score {love_score} is missing the name markers")
+    else:
+        return None
+
+    template = await LoveMessageTemplate.objects.acreate(
+        score=love_score, template=text
+    )
+    _pool.pop(love_score, None)
+    return template
+
+
+async def _templates_for(love_score):
+    cached = _pool.get(love_score)
+    if cached and time.monotonic() - cached[0] < settings.LOVE_MESSAGE_POOL_TTL:
+        return cached[1]
+    templates = [
+        t
+        async for t in LoveMessageTemplate.objects.filter(score=love_score).values_list(
+            "template", flat=True
+        )
+    ]
+    _pool[love_score] = (time.monotonic(), templates)
+    return templates
+
+
+async def get_message(love_score, name1, name2):
+    """Serve a random pooled message, generating into the pool only if it is
+    empty, and generating the message itself if that fails too."""
+    templates = await _templates_for(love_score)
+    if templates:
+        return render(random.choice(templates), name1, name2)
+
+    # Concurrent requests for an empty bucket share one generation, which
+    # stores its template once. Someone is waiting, so it gets one try.
+    template = await singleflight.call(
+        ("love_template", love_score),
+        lambda: generate_template(love_score, attempts=1),
+    )
+    if template:
+        return render(template.template, name1, name2)
+
+    data = await get_ollama_client().generate(
+        build_payload(love_score, name1, name2), endpoint="love_calculator"
+    )
+    return data.get("response", "").strip()
@@ -0,0 +1,72 @@
+import json
+import timeit
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from api import codec, sse
+from api.renderers import CodecJSONRenderer
+
+# A token line as Ollama streams it, and the SSE frame it turns into
+TOKEN_LINE = (
+    b'{"model":"gemma3:4b-it-q4_K_M","created_at":"2025-04-01T12:00:00.000000Z",'
+    b'"response":" together","done":false}'
+)
+FRAME = {"chunk": " together", "done": False}
+
+
+def _history_page(size):
+    now = datetime.now(timezone.utc)
+    results = [
+        {
+            "id": i,
+            "prompt": "What should I reply to her message about hiking?",
+            "response": "Tell her you love the outdoors and ask which trail. " * 6,
+            "created_at": now,
+            "user_id": 1,
+        }
+        for i in range(size)
+    ]
+    return {"results": results, "next_cursor": "abc", "sync_cursor": "def"}
+
+
+class Command(BaseCommand):
+    help = "Micro-benchmark per-token JSON parsing/encoding and history rendering, stdlib vs api.codec"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--number", type=int, default=200000)
+
+    def handle(self, *args, **options):
+        number = options["number"]
+        page = _history_page(50)
+        stock, fast = JSONRenderer(), CodecJSONRenderer()
+
+        cases = [
+            (
+                "parse token line",
+                lambda: json.loads(TOKEN_LINE.decode()),
+                lambda: codec.loads(TOKEN_LINE),
+                number,
+            ),
+            (
+                "encode SSE frame",
+                lambda: f"data: {json.dumps(FRAME)}\n\n".encode(),
+                lambda: sse.frame(FRAME),
+                number,
+            ),
+            (
+                "render 50-message history page",
+                lambda: stock.render(page),
+                lambda: fast.render(page),
+                max(number // 200, 1),
+            ),
+        ]
+
+        self.stdout.write(f"api.codec backend: {codec.BACKEND}")
+        for name, baseline, candidate, n in cases:
+            base = min(timeit.repeat(baseline, number=n, repeat=3)) / n
+            new = min(timeit.repeat(candidate, number=n, repeat=3)) / n
+            self.stdout.write(
+                f"{name:32} stdlib {base * 1e6:8.2f} us   "
+                f"codec {new * 1e6:8.2f} us   {base / new:5.1f}x"
+            )
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from api.fake_ollama import FakeOllama
+
+
+class Command(BaseCommand):
+    help = "Run a stub Ollama server for load testing without a GPU"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=11434)
+        parser.add_argument(
+            "--token-rate",
+            type=float,
+            default=50.0,
+            help="Tokens streamed per second for each generation",
+        )
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=0.05,
+            help="Seconds before the first token (prompt processing)",
+        )
+        parser.add_argument(
+            "--error-rate",
+            type=float,
+            default=0.0,
+            help="Fraction of generations answered with a 500",
+        )
+        parser.add_argument(
+            "--context-length",
+            type=int,
+            default=64,
+            help="Tokens each call adds to the returned context array",
+        )
+
+    def handle(self, *args, **options):
+        fake = FakeOllama(
+            host=options["host"],
+            port=options["port"],
+            token_rate=options["token_rate"],
+            latency=options["latency"],
+            error_rate=options["error_rate"],
+            context_length=options["context_length"],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Fake Ollama listening on {fake.url} "
+                f"({options['token_rate']} tokens/s, {options['latency']}s latency)"
+            )
+        )
+        try:
+            fake.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            fake.stop()
@@ -0,0 +1,64 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from api import love_messages
+from api.models import LoveMessageTemplate
+
+
+class Command(BaseCommand):
+    help = "Pre-generate the love calculator message pool for every score"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--per-score",
+            type=int,
+            default=5,
+            help="Number of templates each score should have",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=2,
+            help="Generations sent to Ollama at the same time",
+        )
+
+    def handle(self, *args, **options):
+        per_score = options["per_score"]
+
+        existing = dict(
+            LoveMessageTemplate.objects.values_list("score")
+            .annotate(c=Count("id"))
+            .values_list("score", "c")
+        )
+        # Only top up buckets that are short, so the command can run on a schedule
+        jobs = [
+            score
+            for score in range(101)
+            for _ in range(max(per_score - existing.get(score, 0), 0))
+        ]
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Generating {len(jobs)} love message templates...")
+        )
+        created = asyncio.run(self._generate(jobs, options["concurrency"]))
+        self.stdout.write(
+            self.style.SUCCESS(f"Successfully generated {created} templates")
+        )
+
+    async def _generate(self, jobs, concurrency):
+        semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+        async def generate(score):
+            async with semaphore:
+                try:
+                    template = await love_messages.generate_template(
+                        score, coalesce=False
+                    )
+                    return template is not None
+                except Exception as e:
+                    self.stderr.write(f"Failed to generate for score {score}: {e}")
+                    return False
+
+        results = await asyncio.gather(*(generate(score) for score in jobs))
+        return sum(results)
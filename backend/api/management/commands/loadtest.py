@@ -0,0 +1,107 @@
+import asyncio
+
+import httpx
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from api import loadtest
+from api.models import WingmanUsers
+
+
+class Command(BaseCommand):
+    help = "Open many concurrent SSE streams against a running server and report TTFT, throughput and memory"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--url", default="http://localhost:8000", help="Server to load"
+        )
+        parser.add_argument(
+            "--endpoint",
+            choices=sorted(loadtest.ENDPOINTS),
+            default="generate_response",
+        )
+        parser.add_argument(
+            "--requests", type=int, default=200, help="Total streams to open"
+        )
+        parser.add_argument(
+            "--concurrency", type=int, default=50, help="Streams open at once"
+        )
+        parser.add_argument(
+            "--user-id",
+            type=int,
+            action="append",
+            dest="user_ids",
+            help="User to send requests as; repeat to spread them over several "
+            "users (default: create --users local load test users)",
+        )
+        parser.add_argument(
+            "--users",
+            type=int,
+            default=20,
+            help="Load test users to create when no --user-id is given",
+        )
+
+    def handle(self, *args, **options):
+        # Requests are spread over several users, since the admission queue
+        # caps how many generations a single user may have waiting
+        user_ids = options["user_ids"] or [
+            WingmanUsers.objects.update_or_create(
+                email=f"loadtest-{i}@example.com",
+                defaults={
+                    "name": f"loadtest-{i}",
+                    "sex": "male",
+                    "age": 30,
+                    "password": make_password(None),
+                },
+            )[0].id
+            for i in range(options["users"])
+        ]
+
+        report = asyncio.run(self._run(options, user_ids))
+        summary = report.summary()
+
+        def ms(seconds):
+            return "-" if seconds is None else f"{seconds * 1000:.0f} ms"
+
+        def mib(size):
+            return "-" if size is None else f"{size / 2**20:.1f} MiB"
+
+        self.stdout.write(
+            f"{summary['requests']} streams to {options['endpoint']} in "
+            f"{summary['elapsed']:.2f}s, {summary['errors']} errors"
+        )
+        self.stdout.write(
+            f"Throughput: {summary['throughput']:.2f} streams/s, "
+            f"{summary['chunks_per_second']:.1f} chunks/s"
+        )
+        self.stdout.write(
+            f"TTFT: p50 {ms(summary['ttft_p50'])}, p95 {ms(summary['ttft_p95'])}, "
+            f"p99 {ms(summary['ttft_p99'])}"
+        )
+        if summary["first_reply_p50"] is not None:
+            self.stdout.write(
+                f"First reply: p50 {ms(summary['first_reply_p50'])}, "
+                f"p95 {ms(summary['first_reply_p95'])}"
+            )
+        self.stdout.write(
+            f"Server memory: {mib(summary['memory_before'])} before, "
+            f"{mib(summary['memory_after'])} after"
+        )
+        for result in report.errors[:5]:
+            self.stderr.write(f"Error: {result.error}")
+
+    async def _run(self, options, user_ids):
+        path, body = loadtest.ENDPOINTS[options["endpoint"]]
+        bodies = [
+            body(i, user_ids[i % len(user_ids)]) for i in range(options["requests"])
+        ]
+        limits = httpx.Limits(max_connections=options["concurrency"])
+        async with httpx.AsyncClient(
+            base_url=options["url"], timeout=None, limits=limits
+        ) as client:
+            memory_before = await loadtest.server_memory(client)
+            report = await loadtest.run_load(
+                loadtest.httpx_stream(client), path, bodies, options["concurrency"]
+            )
+            report.memory_before = memory_before
+            report.memory_after = await loadtest.server_memory(client)
+        return report
@@ -0,0 +1,71 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from api.models import ChatContext
+
+
+class Command(BaseCommand):
+    help = "Delete stored chat contexts beyond the retention policy"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--keep",
+            type=int,
+            default=settings.CHAT_CONTEXT_RETENTION,
+            help="Number of latest contexts to keep per chat window",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Maximum rows deleted per statement",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0.0,
+            help="Seconds to pause between delete statements",
+        )
+
+    def handle(self, *args, **options):
+        keep = max(options["keep"], 1)
+        batch_size = options["batch_size"]
+        pause = options["sleep"]
+        deleted = 0
+        windows = 0
+        last_chat_id = 0
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Pruning chat contexts, keeping {keep} per window...")
+        )
+
+        while True:
+            # Walk chat windows in id order so no long-running query or
+            # transaction spans the whole table
+            chat_ids = list(
+                ChatContext.objects.filter(chat_window_id__gt=last_chat_id)
+                .order_by("chat_window_id")
+                .values_list("chat_window_id", flat=True)
+                .distinct()[:batch_size]
+            )
+            if not chat_ids:
+                break
+
+            for chat_id in chat_ids:
+                prunable = ChatContext.prunable([chat_id], keep)
+                while True:
+                    ids = list(prunable.values_list("id", flat=True)[:batch_size])
+                    if not ids:
+                        break
+                    deleted += ChatContext.objects.filter(id__in=ids).delete()[0]
+                    if pause:
+                        time.sleep(pause)
+                windows += 1
+            last_chat_id = chat_ids[-1]
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Deleted {deleted} contexts across {windows} chat windows"
+            )
+        )
@@ -0,0 +1,52 @@
+import asyncio
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from api import warmup
+
+
+class Command(BaseCommand):
+    help = "Preload the configured models on every Ollama backend and wait until they are resident"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--model",
+            action="append",
+            dest="models",
+            help="Model to preload (repeatable); defaults to OLLAMA_PRELOAD_MODELS",
+        )
+        parser.add_argument(
+            "--keep-alive",
+            default=settings.OLLAMA_KEEP_ALIVE,
+            help="How long Ollama should keep the models loaded",
+        )
+        parser.add_argument(
+            "--wait",
+            type=float,
+            default=120.0,
+            help="Seconds to wait for the models to show up as resident (0 to not wait)",
+        )
+
+    def handle(self, *args, **options):
+        models = options["models"] or settings.OLLAMA_PRELOAD_MODELS
+        self.stdout.write(f"Preloading {', '.join(models)}...")
+        failures = asyncio.run(
+            warmup.warm(models=models, keep_alive=options["keep_alive"])
+        )
+        for (url, model), error in failures.items():
+            self.stderr.write(f"{model} on {url}: {error!r}")
+
+        deadline = time.monotonic() + options["wait"]
+        while True:
+            report = asyncio.run(warmup.readiness(models=models))
+            if report["ready"] or time.monotonic() >= deadline:
+                break
+            time.sleep(1)
+
+        for backend in report["backends"]:
+            state = "ready" if backend["ready"] else f"missing {backend['missing']}"
+            self.stdout.write(f"  {backend['url']}: {state}")
+        if not report["ready"]:
+            raise CommandError("No backend has all models loaded")
+        self.stdout.write(self.style.SUCCESS("Models are loaded"))
@@ -0,0 +1,203 @@
+# Prometheus metrics for this process, exported by metrics_view. Like the
+# rest of the per-process state (admission queue, caches), each worker process
+# reports its own numbers; Prometheus sums them per instance.
+import asyncio
+import contextvars
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+
+# Default histogram buckets, in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+GENERATION_BUCKETS = (0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+DB_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+TOKEN_RATE_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 250)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format, including the
+    client's process metrics (resident memory etc.)."""
+    return generate_latest(REGISTRY)
+
+
+TIME_TO_FIRST_TOKEN = Histogram(
+    "wingman_llm_time_to_first_token_seconds",
+    "Time from a generation being requested to its first token, queueing included.",
+    ["endpoint"],
+    buckets=LATENCY_BUCKETS,
+)
+GENERATION_TIME = Histogram(
+    "wingman_llm_generation_seconds",
+    "Total time from a generation being requested to its last token.",
+    ["endpoint"],
+    buckets=GENERATION_BUCKETS,
+)
+TOKENS_PER_SECOND = Histogram(
+    "wingman_llm_tokens_per_second",
+    "Decode speed reported by Ollama (eval_count / eval_duration).",
+    ["endpoint"],
+    buckets=TOKEN_RATE_BUCKETS,
+)
+QUEUE_WAIT = Histogram(
+    "wingman_llm_queue_wait_seconds",
+    "Time a generation waited for an admission slot.",
+    ["endpoint"],
+    buckets=LATENCY_BUCKETS,
+)
+PROMPT_TOKENS = Counter(
+    "wingman_llm_prompt_tokens_total",
+    "Prompt tokens evaluated by Ollama (prompt_eval_count).",
+    ["endpoint"],
+)
+GENERATED_TOKENS = Counter(
+    "wingman_llm_generated_tokens_total",
+    "Tokens generated by Ollama (eval_count).",
+    ["endpoint"],
+)
+OLLAMA_ERRORS = Counter(
+    "wingman_ollama_errors_total",
+    "Failed Ollama calls by kind (an HTTP status, connect or other).",
+    ["endpoint", "kind"],
+)
+OLLAMA_TIMEOUTS = Counter(
+    "wingman_ollama_timeouts_total",
+    "Ollama calls that timed out.",
+    ["endpoint"],
+)
+STREAMS_IN_FLIGHT = Gauge(
+    "wingman_sse_streams_in_flight",
+    "Server-sent event streams currently open.",
+    ["endpoint"],
+)
+SSE_DISCONNECTS = Counter(
+    "wingman_sse_client_disconnects_total",
+    "Server-sent event streams the client closed before they finished.",
+    ["endpoint"],
+)
+DB_TIME = Histogram(
+    "wingman_db_seconds_per_request",
+    "Time spent in database queries while serving a request.",
+    ["view"],
+    buckets=DB_BUCKETS,
+)
+
+
+def observe_final_chunk(endpoint, chunk):
+    """Record the token counts Ollama reports on the final chunk."""
+    eval_count = chunk.get("eval_count")
+    eval_duration = chunk.get("eval_duration")
+    if eval_count:
+        GENERATED_TOKENS.labels(endpoint).inc(eval_count)
+        if eval_duration:
+            # Ollama reports durations in nanoseconds
+            TOKENS_PER_SECOND.labels(endpoint).observe(eval_count / eval_duration * 1e9)
+    if chunk.get("prompt_eval_count"):
+        PROMPT_TOKENS.labels(endpoint).inc(chunk["prompt_eval_count"])
+
+
+async def track_stream(endpoint, events, on_close=None):
+    """Wrap an SSE event generator to count it as in flight and notice
+    clients that go away before it finishes. ``on_close`` is called once the
+    stream is over, however it ended."""
+    gauge = STREAMS_IN_FLIGHT.labels(endpoint)
+    gauge.inc()
+    try:
+        async for event in events:
+            yield event
+    except (GeneratorExit, asyncio.CancelledError):
+        SSE_DISCONNECTS.labels(endpoint).inc()
+        raise
+    finally:
+        gauge.dec()
+        try:
+            await events.aclose()
+        finally:
+            if on_close is not None:
+                on_close()
+
+
+async def _aobserve_after(content, observe):
+    try:
+        async for part in content:
+            yield part
+    finally:
+        observe()
+
+
+def _observe_after(content, observe):
+    try:
+        yield from content
+    finally:
+        observe()
+
+
+# Seconds of DB time for the request being served. Holds a one-item list so
+# queries run in sync_to_async threads, which get a copy of the context,
+# still add to the request's total.
+_db_time = contextvars.ContextVar("db_time", default=None)
+
+
+def _timed_execute(execute, sql, params, many, context):
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        total = _db_time.get()
+        if total is not None:
+            total[0] += time.perf_counter() - start
+
+
+def install_db_timer(sender, connection, **kwargs):
+    """``connection_created`` receiver timing every query on the connection."""
+    if _timed_execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_timed_execute)
+
+
+class MetricsMiddleware:
+    """Record each request's database time once its response is closed,
+    which for a stream is after the last event."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        total = [0.0]
+        _db_time.set(total)
+        return self._observe(request, self.get_response(request), total)
+
+    async def __acall__(self, request):
+        total = [0.0]
+        _db_time.set(total)
+        return self._observe(request, await self.get_response(request), total)
+
+    def _observe(self, request, response, total):
+        match = request.resolver_match
+        view = "unmatched"
+        if match:
+            # DRF's @api_view wraps the function in a class named after it
+            view = getattr(match.func, "cls", match.func).__name__
+        histogram = DB_TIME.labels(view)
+        if not response.streaming:
+            histogram.observe(total[0])
+            return response
+        # A stream keeps querying until its last event
+        wrap = _aobserve_after if response.is_async else _observe_after
+        response.streaming_content = wrap(
+            response.streaming_content, lambda: histogram.observe(total[0])
+        )
+        return response
@@ -0,0 +1,23 @@
+# Generated by Django 5.1 on 2026-10-18 19:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="llamaresponse",
+            index=models.Index(
+                fields=["user", "created_at", "id"], name="resp_user_created_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="llamaresponse",
+            index=models.Index(fields=["created_at", "id"], name="resp_created_id_idx"),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.1 on 2026-10-18 19:48
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Substr
+
+
+def backfill_summaries(apps, schema_editor):
+    LlamaChatWindow = apps.get_model("api", "LlamaChatWindow")
+    Through = LlamaChatWindow.responses.through
+
+    window_messages = Through.objects.filter(llamachatwindow_id=OuterRef("pk"))
+    counts = (
+        window_messages.values("llamachatwindow_id").annotate(c=Count("*")).values("c")
+    )
+    latest = window_messages.order_by("-llamaresponse__created_at", "-llamaresponse_id")
+
+    # One UPDATE for the whole table instead of a query per window
+    LlamaChatWindow.objects.update(
+        message_count=Coalesce(Subquery(counts), Value(0)),
+        last_activity_at=Subquery(latest.values("llamaresponse__created_at")[:1]),
+        last_message_preview=Coalesce(
+            Subquery(
+                latest.annotate(preview=Substr("llamaresponse__prompt", 1, 100)).values(
+                    "preview"
+                )[:1]
+            ),
+            Value(""),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0002_response_keyset_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="llamachatwindow",
+            name="last_activity_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="llamachatwindow",
+            name="last_message_preview",
+            field=models.TextField(blank=True, default=""),
+        ),
+        migrations.AddField(
+            model_name="llamachatwindow",
+            name="message_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
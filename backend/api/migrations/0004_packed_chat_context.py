@@ -0,0 +1,62 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+from api.context_codec import pack_tokens
+
+
+def pack_json_contexts(apps, schema_editor):
+    ChatContext = apps.get_model("api", "ChatContext")
+    batch = []
+    rows = ChatContext.objects.only("id", "context_data").iterator(chunk_size=500)
+    for row in rows:
+        # Existing rows become keyframes; only new turns are delta-encoded
+        row.tokens = pack_tokens(row.context_data or [])
+        batch.append(row)
+        if len(batch) >= 500:
+            ChatContext.objects.bulk_update(batch, ["tokens"])
+            batch = []
+    if batch:
+        ChatContext.objects.bulk_update(batch, ["tokens"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0003_chat_window_summary"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="chatcontext",
+            name="tokens",
+            field=models.BinaryField(default=b""),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="chatcontext",
+            name="prefix_length",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="chatcontext",
+            name="base",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="api.chatcontext",
+            ),
+        ),
+        migrations.AddField(
+            model_name="chatcontext",
+            name="chain_depth",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.RunPython(pack_json_contexts, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name="chatcontext",
+            name="context_data",
+        ),
+    ]
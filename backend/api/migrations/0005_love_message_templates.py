@@ -0,0 +1,33 @@
+# Generated by Django 5.1 on 2026-10-18 19:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0004_packed_chat_context"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LoveMessageTemplate",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("score", models.PositiveSmallIntegerField(db_index=True)),
+                ("template", models.TextField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "ordering": ["score", "-created_at"],
+            },
+        ),
+    ]
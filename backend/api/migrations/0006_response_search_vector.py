@@ -0,0 +1,92 @@
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+# Postgres keeps search_vector current itself, so rows written by
+# bulk_create() or update() are searchable too. Prompts weigh more than
+# responses when ranking. The migration isn't atomic, so this has to be safe
+# to run again after a failure part way through.
+CREATE_TRIGGER = """
+CREATE OR REPLACE FUNCTION api_llamaresponse_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.prompt, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.response, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS api_llamaresponse_search_vector_trigger ON api_llamaresponse;
+CREATE TRIGGER api_llamaresponse_search_vector_trigger
+BEFORE INSERT OR UPDATE OF prompt, response ON api_llamaresponse
+FOR EACH ROW EXECUTE FUNCTION api_llamaresponse_search_vector_update();
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER IF EXISTS api_llamaresponse_search_vector_trigger ON api_llamaresponse;
+DROP FUNCTION IF EXISTS api_llamaresponse_search_vector_update();
+"""
+
+BACKFILL_BATCH = 10000
+
+
+def create_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(CREATE_TRIGGER)
+
+    # Touch existing rows in id ranges so the trigger fills them in without
+    # one giant UPDATE; each range commits on its own, so no transaction
+    # holds row locks for the whole backfill
+    LlamaResponse = apps.get_model("api", "LlamaResponse")
+    last = LlamaResponse.objects.order_by("-id").values_list("id", flat=True).first()
+    for start in range(0, (last or 0) + 1, BACKFILL_BATCH):
+        schema_editor.execute(
+            "UPDATE api_llamaresponse SET prompt = prompt WHERE id >= %s AND id < %s",
+            [start, start + BACKFILL_BATCH],
+        )
+
+
+def drop_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(DROP_TRIGGER)
+
+
+class AddSearchIndexConcurrently(AddIndexConcurrently):
+    """Build the GIN index without blocking writes. GIN only exists on
+    Postgres; elsewhere the index is left out."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+    # The backfill and CREATE INDEX CONCURRENTLY can't run in one transaction
+    atomic = False
+
+    dependencies = [
+        ("api", "0005_love_message_templates"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="llamaresponse",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(create_trigger, drop_trigger),
+        AddSearchIndexConcurrently(
+            model_name="llamaresponse",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="resp_search_vector_idx"
+            ),
+        ),
+    ]
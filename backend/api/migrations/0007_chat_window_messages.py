@@ -0,0 +1,125 @@
+# Generated by Django 5.1 on 2026-10-18 20:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def number_messages(apps, schema_editor):
+    """Move window membership from the M2M onto the responses themselves,
+    numbering each window's messages in (created_at, id) order."""
+    LlamaChatWindow = apps.get_model("api", "LlamaChatWindow")
+    LlamaResponse = apps.get_model("api", "LlamaResponse")
+    Through = LlamaChatWindow.responses.through
+
+    rows = (
+        Through.objects.order_by(
+            "llamachatwindow_id", "llamaresponse__created_at", "llamaresponse_id"
+        )
+        .values_list("llamachatwindow_id", "llamaresponse_id")
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+    counts = {}
+    assigned = set()
+    updates, copies = [], []
+
+    def flush():
+        LlamaResponse.objects.bulk_update(updates, ["chat_window", "seq"])
+        created = [copy.created_at for copy in copies]
+        LlamaResponse.objects.bulk_create(copies)
+        # bulk_create stamps auto_now_add fields; keep the originals' times
+        for copy, created_at in zip(copies, created):
+            copy.created_at = created_at
+        LlamaResponse.objects.bulk_update(copies, ["created_at"])
+        updates.clear()
+        copies.clear()
+
+    for window_id, response_id in rows:
+        seq = counts[window_id] = counts.get(window_id, 0) + 1
+        if response_id not in assigned:
+            assigned.add(response_id)
+            updates.append(
+                LlamaResponse(id=response_id, chat_window_id=window_id, seq=seq)
+            )
+        else:
+            # A message can only belong to one window now; any other window
+            # it was linked to gets its own copy
+            copy = LlamaResponse.objects.get(id=response_id)
+            copy.pk = None
+            copy.chat_window_id = window_id
+            copy.seq = seq
+            copies.append(copy)
+        if len(updates) + len(copies) >= BATCH_SIZE:
+            flush()
+    flush()
+
+    # message_count doubles as the newest seq from here on
+    LlamaChatWindow.objects.update(message_count=0)
+    LlamaChatWindow.objects.bulk_update(
+        [
+            LlamaChatWindow(id=window_id, message_count=c)
+            for window_id, c in counts.items()
+        ],
+        ["message_count"],
+        batch_size=BATCH_SIZE,
+    )
+
+
+def link_messages(apps, schema_editor):
+    LlamaChatWindow = apps.get_model("api", "LlamaChatWindow")
+    LlamaResponse = apps.get_model("api", "LlamaResponse")
+    Through = LlamaChatWindow.responses.through
+
+    messages = (
+        LlamaResponse.objects.filter(chat_window__isnull=False)
+        .values_list("chat_window_id", "id")
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+    batch = []
+    for window_id, response_id in messages:
+        batch.append(
+            Through(llamachatwindow_id=window_id, llamaresponse_id=response_id)
+        )
+        if len(batch) >= BATCH_SIZE:
+            Through.objects.bulk_create(batch)
+            batch = []
+    Through.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0006_response_search_vector"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="llamaresponse",
+            name="chat_window",
+            field=models.ForeignKey(
+                blank=True,
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="messages",
+                to="api.llamachatwindow",
+            ),
+        ),
+        migrations.AddField(
+            model_name="llamaresponse",
+            name="seq",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(number_messages, link_messages),
+        migrations.AddConstraint(
+            model_name="llamaresponse",
+            constraint=models.UniqueConstraint(
+                fields=("chat_window", "seq"), name="resp_window_seq_uniq"
+            ),
+        ),
+        migrations.RemoveField(
+            model_name="llamachatwindow",
+            name="responses",
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1 on 2026-10-18 20:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0007_chat_window_messages"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="llamachatwindow",
+            name="summary",
+            field=models.TextField(blank=True, default=""),
+        ),
+        migrations.AddField(
+            model_name="llamachatwindow",
+            name="summary_seq",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
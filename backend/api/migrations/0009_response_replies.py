@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-18 20:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0008_chat_window_rolling_summary"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="llamaresponse",
+            name="replies",
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1 on 2026-10-18 20:44
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0009_response_replies"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="llamaresponse",
+            name="resp_created_id_idx",
+        ),
+    ]
@@ -1,4 +1,14 @@
-from django.db import models
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
+from django.db.models import Window
+from django.db.models.functions import RowNumber
+
+from .context_codec import common_prefix_length, pack_tokens, unpack_tokens
 
 
 class WingmanUsers(models.Model):
@@ -23,11 +33,31 @@ class WingmanUsers(models.Model):
 
 
 class LlamaResponse(models.Model):
+    # Text search configuration the search_vector trigger is created with
+    SEARCH_CONFIG = "english"
+
     prompt = models.TextField()
     response = models.TextField()
     context = models.JSONField(default=list)
     user = models.ForeignKey(WingmanUsers, on_delete=models.CASCADE, null=True)
+    # Chat messages belong to their window and are numbered 1, 2, ... within
+    # it; one-off generations (Tinder replies etc.) have neither. The unique
+    # (chat_window, seq) index below doubles as the FK's index.
+    chat_window = models.ForeignKey(
+        "LlamaChatWindow",
+        related_name="messages",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        db_index=False,
+    )
+    seq = models.PositiveIntegerField(null=True, blank=True)
+    # The reply options parsed out of a tinder_replies response
+    replies = models.JSONField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Weighted tsvector of prompt (A) and response (B), kept up to date by a
+    # database trigger (see migration 0006) so bulk writes stay searchable
+    search_vector = SearchVectorField(null=True, editable=False)
 
     def __str__(self):
         return (
@@ -38,12 +68,34 @@ class LlamaResponse(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # Keyset pagination of get_responses
+            models.Index(
+                fields=["user", "created_at", "id"], name="resp_user_created_id_idx"
+            ),
+            GinIndex(fields=["search_vector"], name="resp_search_vector_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["chat_window", "seq"], name="resp_window_seq_uniq"
+            ),
+        ]
 
 
 class LlamaChatWindow(models.Model):
+    PREVIEW_LENGTH = 100
+
     user = models.ForeignKey(WingmanUsers, on_delete=models.CASCADE)
-    responses = models.ManyToManyField(LlamaResponse)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Denormalized summary so the chat list never has to scan message history.
+    # message_count is also the seq of the window's newest message.
+    message_count = models.PositiveIntegerField(default=0)
+    last_activity_at = models.DateTimeField(null=True, blank=True)
+    last_message_preview = models.TextField(blank=True, default="")
+    # Rolling summary of the turns up to summary_seq, sent in place of them
+    # once a chat outgrows CHAT_TOKEN_BUDGET (see api.conversation)
+    summary = models.TextField(blank=True, default="")
+    summary_seq = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return (
@@ -55,13 +107,73 @@ class LlamaChatWindow(models.Model):
     class Meta:
         ordering = ["-created_at"]
 
+    @classmethod
+    def _summary_update(cls, llama_responses):
+        latest = llama_responses[-1]
+        return {
+            "message_count": models.F("message_count") + len(llama_responses),
+            "last_activity_at": latest.created_at,
+            "last_message_preview": latest.prompt[: cls.PREVIEW_LENGTH],
+        }
+
+    @classmethod
+    def lock_for_append(cls, window_ids):
+        """Lock ``window_ids`` until the end of the transaction and return
+        the next free message seq of each, by window id."""
+        return {
+            window_id: message_count + 1
+            for window_id, message_count in cls.objects.select_for_update()
+            .filter(id__in=window_ids)
+            .values_list("id", "message_count")
+        }
+
+    @classmethod
+    def record_messages(cls, messages):
+        """Summary update for messages appended at once, given as window id ->
+        its new messages, oldest first; one query for all the windows."""
+        cls.objects.bulk_update(
+            [
+                cls(id=window_id, **cls._summary_update(llama_responses))
+                for window_id, llama_responses in messages.items()
+            ],
+            ["message_count", "last_activity_at", "last_message_preview"],
+        )
+
+
+# Pre-generated love calculator messages, served without touching Ollama
+class LoveMessageTemplate(models.Model):
+    score = models.PositiveSmallIntegerField(db_index=True)
+    template = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["score", "-created_at"]
+
+    def __str__(self):
+        return f"Love message for score {self.score}"
+
 
 # Add this new model to store Ollama context data
 class ChatContext(models.Model):
+    # Every Nth row per chat is stored in full so decoding stays bounded
+    KEYFRAME_INTERVAL = 16
+
     chat_window = models.ForeignKey(
         "LlamaChatWindow", related_name="contexts", on_delete=models.CASCADE
     )
-    context_data = models.JSONField(null=True, blank=True)
+    # Context tokens packed by api.context_codec. A row holds the first
+    # prefix_length tokens of its base row's context plus these tokens.
+    tokens = models.BinaryField()
+    prefix_length = models.PositiveIntegerField(default=0)
+    base = models.ForeignKey(
+        "self",
+        null=True,
+        blank=True,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="+",
+    )
+    chain_depth = models.PositiveSmallIntegerField(default=0)  # 0 for a keyframe
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -70,27 +182,179 @@ class ChatContext(models.Model):
     def __str__(self):
         return f"Context for chat {self.chat_window_id} at {self.created_at}"
 
+    @staticmethod
+    def _recent(chat_ids, count):
+        """The newest ``count`` rows of each chat in ``chat_ids``, newest first,
+        in a single query."""
+        return (
+            ChatContext.objects.filter(chat_window_id__in=chat_ids)
+            .alias(
+                position=Window(
+                    RowNumber(),
+                    partition_by=models.F("chat_window_id"),
+                    order_by=models.F("id").desc(),
+                )
+            )
+            .filter(position__lte=count)
+            .order_by("-id")
+        )
+
+    @staticmethod
+    def _recent_by_chat(chat_ids):
+        # Enough rows to cover each chat's whole delta chain back to its keyframe
+        recent = defaultdict(list)
+        for row in ChatContext._recent(chat_ids, ChatContext.KEYFRAME_INTERVAL).defer(
+            "created_at"
+        ):
+            recent[row.chat_window_id].append(row)
+        return recent
+
+    @staticmethod
+    def _latest_with_tokens(chat_id):
+        rows = ChatContext._recent_by_chat([chat_id])[chat_id]
+        if not rows:
+            return None, None
+        return rows[0], ChatContext._tokens(rows)
+
+    @staticmethod
+    def _tokens(rows):
+        """The context of the newest of a chat's ``rows`` (newest first)."""
+        by_id = {row.id: row for row in rows}
+
+        chain = [rows[0]]
+        while chain[-1].base_id is not None:
+            base = by_id.get(chain[-1].base_id)
+            if base is None:
+                base = ChatContext.objects.get(id=chain[-1].base_id)
+            chain.append(base)
+
+        tokens = []
+        for row in reversed(chain):
+            tokens = tokens[: row.prefix_length] + unpack_tokens(row.tokens)
+        return tokens
+
     # Helper methods to get and set context
     @staticmethod
     def get_latest_context(chat_id):
         try:
-            context_obj = (
-                ChatContext.objects.filter(chat_window_id=chat_id)
-                .order_by("-created_at")
-                .first()
-            )
-            return context_obj.context_data if context_obj else None
-        except Exception:
+            return ChatContext._latest_with_tokens(chat_id)[1]
+        except Exception as e:
+            print(f"Error retrieving context: {e}")
             return None
 
     @staticmethod
     def store_context(chat_id, context_data):
-        if not context_data or not chat_id:
-            return None
+        rows = ChatContext.store_contexts({chat_id: context_data})
+        return rows[0] if rows else None
+
+    @staticmethod
+    def store_contexts(contexts):
+        """Store the newest context of each chat, given as chat id -> tokens,
+        with the same few queries however many chats there are. Returns the
+        rows created."""
+        contexts = {
+            chat_id: context_data
+            for chat_id, context_data in contexts.items()
+            if chat_id and context_data
+        }
+        if not contexts:
+            return []
         try:
-            return ChatContext.objects.create(
-                chat_window_id=chat_id, context_data=context_data
-            )
+            # A savepoint, so a failure here doesn't abort the transaction
+            # the caller (write_batch) is writing the rest of its batch in
+            with transaction.atomic():
+                recent = ChatContext._recent_by_chat(list(contexts))
+                rows, restarted = [], []
+                for chat_id, context_data in contexts.items():
+                    latest = recent[chat_id][0] if recent[chat_id] else None
+                    prefix = (
+                        common_prefix_length(
+                            ChatContext._tokens(recent[chat_id]), context_data
+                        )
+                        if latest
+                        else 0
+                    )
+                    if (
+                        not prefix
+                        or latest.chain_depth + 1 >= ChatContext.KEYFRAME_INTERVAL
+                    ):
+                        restarted.append(chat_id)
+                        rows.append(
+                            ChatContext(
+                                chat_window_id=chat_id, tokens=pack_tokens(context_data)
+                            )
+                        )
+                    else:
+                        rows.append(
+                            ChatContext(
+                                chat_window_id=chat_id,
+                                tokens=pack_tokens(context_data[prefix:]),
+                                prefix_length=prefix,
+                                base=latest,
+                                chain_depth=latest.chain_depth + 1,
+                            )
+                        )
+                ChatContext.objects.bulk_create(rows)
+                # Older chains can only be dropped once a new one starts, so
+                # pruning here keeps each window to roughly retention plus
+                # one keyframe interval of rows.
+                if restarted:
+                    ChatContext.prune(restarted)
+                return rows
         except Exception as e:
             print(f"Error storing context: {e}")
+            return []
+
+    @staticmethod
+    def _prune_before(rows, keep):
+        """The id below which a chat's rows can go, given its newest ``(id,
+        base_id)`` rows, or None if nothing can."""
+        if len(rows) <= keep:
             return None
+
+        bases = dict(rows)
+        needed = set()
+        for pk, _ in rows[:keep]:
+            while pk is not None and pk not in needed:
+                if pk not in bases:
+                    # The chain reaches past what we loaded, leave it alone
+                    return None
+                needed.add(pk)
+                pk = bases[pk]
+        return min(needed)
+
+    @staticmethod
+    def prunable(chat_ids, keep=None):
+        """Rows of ``chat_ids`` that are not needed to decode each one's latest
+        ``keep`` contexts."""
+        keep = keep or settings.CHAT_CONTEXT_RETENTION
+        rows = defaultdict(list)
+        for chat_id, pk, base_id in ChatContext._recent(
+            chat_ids, keep + ChatContext.KEYFRAME_INTERVAL
+        ).values_list("chat_window_id", "id", "base_id"):
+            rows[chat_id].append((pk, base_id))
+
+        condition = models.Q()
+        for chat_id, chat_rows in rows.items():
+            cutoff = ChatContext._prune_before(chat_rows, keep)
+            if cutoff is not None:
+                condition |= models.Q(chat_window_id=chat_id, id__lt=cutoff)
+        if not condition:
+            return ChatContext.objects.none()
+        return ChatContext.objects.filter(condition)
+
+    @staticmethod
+    def prune(chat_ids, keep=None):
+        try:
+            return ChatContext.prunable(chat_ids, keep).delete()[0]
+        except Exception as e:
+            print(f"Error pruning contexts: {e}")
+            return 0
+
+    @staticmethod
+    async def aget_latest_context(chat_id):
+        return await sync_to_async(ChatContext.get_latest_context)(chat_id)
+
+    @staticmethod
+    async def astore_context(chat_id, context_data):
+        return await sync_to_async(ChatContext.store_context)(chat_id, context_data)
@@ -0,0 +1,354 @@
+import asyncio
+import json
+import time
+import weakref
+
+import httpx
+from django.conf import settings
+
+from . import codec, llm_cache, metrics, singleflight
+from .admission import get_admission_controller
+from .backends import get_backend_pool
+
+
+def _with_response(chunk):
+    # /api/chat puts the text under message.content; mirror it into
+    # "response" so callers handle both APIs alike
+    message = chunk.get("message")
+    if message is not None and "response" not in chunk:
+        chunk["response"] = message.get("content", "")
+    return chunk
+
+
+class OllamaClient:
+    """Pooled async client for the Ollama HTTP API.
+
+    One ``httpx.AsyncClient`` is kept per event loop, so keep-alive connections
+    are reused across requests instead of opening a new TCP connection for
+    every generation. Each generation is routed to a server from the
+    ``BackendPool``; one that can't be connected to is retried on the next.
+    """
+
+    def __init__(
+        self,
+        pool=None,
+        model=None,
+        timeout=None,
+        connect_timeout=None,
+        max_connections=None,
+        max_keepalive_connections=None,
+        retries=None,
+        keep_alive=None,
+    ):
+        self.pool = pool or get_backend_pool()
+        self.model = model or settings.OLLAMA_MODEL
+        self.timeout = timeout or settings.OLLAMA_TIMEOUT
+        self.connect_timeout = connect_timeout or settings.OLLAMA_CONNECT_TIMEOUT
+        self.max_connections = max_connections or settings.OLLAMA_MAX_CONNECTIONS
+        self.max_keepalive_connections = (
+            max_keepalive_connections or settings.OLLAMA_MAX_KEEPALIVE_CONNECTIONS
+        )
+        self.retries = settings.OLLAMA_RETRIES if retries is None else retries
+        self.keep_alive = keep_alive or settings.OLLAMA_KEEP_ALIVE
+        self._clients = weakref.WeakKeyDictionary()
+
+    def _client(self):
+        # httpx clients are bound to the loop they were first used on. Under
+        # uvicorn that is a single loop per process, but runserver spins up a
+        # fresh loop for every async view, so cache one client per loop.
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive_connections,
+                ),
+                # Retries only cover failed connection attempts, never a
+                # generation that has already started.
+                transport=httpx.AsyncHTTPTransport(retries=self.retries),
+            )
+            self._clients[loop] = client
+        return client
+
+    def _prepare(self, payload, stream):
+        payload = dict(payload)
+        payload.setdefault("model", self.model)
+        payload.setdefault("keep_alive", self.keep_alive)
+        payload["stream"] = stream
+        return payload
+
+    async def generate(
+        self,
+        payload,
+        cache=False,
+        coalesce=True,
+        endpoint=None,
+        user=None,
+        api="generate",
+        affinity=None,
+    ):
+        """Run a non-streaming ``/api/generate`` call and return the parsed body.
+
+        ``endpoint`` picks the priority class the call is scheduled in and
+        labels its metrics; ``user`` is the queue it takes turns from (see
+        ``admission``). ``api="chat"`` calls ``/api/chat`` instead (see
+        ``chat``). Calls with the same ``affinity`` key go to the same Ollama
+        server while it is up (see ``BackendPool``).
+
+        Identical calls already in flight are coalesced into one generation
+        unless ``coalesce=False``.
+        With ``cache=True`` an identical earlier generation is answered from
+        the response cache. Only use it for stateless calls (no ``context``).
+        """
+        key = llm_cache.payload_key(payload, self.model)
+        if cache:
+            cached = await llm_cache.get(key)
+            if cached is not None:
+                return {"response": cached, "done": True, "cached": True}
+
+        def start():
+            return self._generate(
+                payload, endpoint, user, api, affinity, cache_key=key if cache else None
+            )
+
+        if not coalesce:
+            return await start()
+        return await singleflight.call(key, start)
+
+    async def chat(self, payload, endpoint=None, user=None, affinity=None):
+        """Non-streaming ``/api/chat`` call for a ``messages`` payload.
+
+        The reply's text is also returned under ``response``, as
+        ``generate`` returns it.
+        """
+        return await self.generate(
+            payload, endpoint=endpoint, user=user, api="chat", affinity=affinity
+        )
+
+    def stream_chat(
+        self, payload, ticket=None, endpoint=None, user=None, affinity=None
+    ):
+        """Streaming ``/api/chat`` call; chunks carry their text under
+        ``response`` as well, so they work wherever ``stream_generate``'s do."""
+        return self.stream_generate(
+            payload,
+            ticket=ticket,
+            endpoint=endpoint,
+            user=user,
+            api="chat",
+            affinity=affinity,
+        )
+
+    async def stream_generate(
+        self,
+        payload,
+        cache=False,
+        ticket=None,
+        endpoint=None,
+        user=None,
+        api="generate",
+        affinity=None,
+    ):
+        """Run a streaming ``/api/generate`` call, yielding each parsed NDJSON chunk.
+
+        A non-2xx answer from Ollama raises ``httpx.HTTPStatusError`` with the
+        response body already read, so ``e.response.text`` is available.
+        While the generation waits for an admission slot it yields
+        ``{"queued": True, "position": n}`` chunks. Pass a ``ticket`` taken
+        with ``AdmissionController.enter()`` to hold the place in the queue
+        from before the stream starts; otherwise one is taken here for
+        ``endpoint`` and ``user``, and a full queue raises ``QueueFull``.
+        The generation takes the ticket over and holds the slot until it
+        ends, so releasing the ticket afterwards has no effect.
+
+        Identical streams already in flight are shared: a later caller gets
+        the chunks produced so far and then follows the same generation.
+        With ``cache=True`` a cached response is replayed as chunks, and a
+        completed live stream is added to the cache.
+        """
+        label = endpoint or "unknown"
+        requested_at = ticket.enqueued_at if ticket else time.monotonic()
+        first_token = True
+        async for chunk in self._stream_chunks(
+            payload, cache, ticket, endpoint, user, api, affinity
+        ):
+            if first_token and not chunk.get("queued"):
+                first_token = False
+                metrics.TIME_TO_FIRST_TOKEN.labels(label).observe(
+                    time.monotonic() - requested_at
+                )
+            if chunk.get("done"):
+                metrics.GENERATION_TIME.labels(label).observe(
+                    time.monotonic() - requested_at
+                )
+            yield chunk
+
+    async def _stream_chunks(
+        self, payload, cache, ticket, endpoint, user, api, affinity
+    ):
+        key = llm_cache.payload_key(payload, self.model)
+        if cache:
+            cached = await llm_cache.get(key)
+            if cached is not None:
+                if ticket:
+                    ticket.release()
+                async for chunk in llm_cache.replay(cached):
+                    yield chunk
+                return
+
+        started = False
+
+        def start():
+            nonlocal started
+            started = True
+            return self._stream_generate(
+                payload,
+                endpoint,
+                ticket,
+                user,
+                api,
+                affinity,
+                cache_key=key if cache else None,
+            )
+
+        try:
+            async for chunk in singleflight.stream(key, start):
+                if not started and ticket:
+                    # Following a generation already in flight, which holds
+                    # its own slot
+                    ticket.release()
+                yield chunk
+        finally:
+            if not started and ticket:
+                ticket.release()
+
+    def _failover(self, tried, e):
+        # Only a refused connection is safe to retry elsewhere: the request
+        # never reached Ollama, so nothing was generated
+        if len(tried) >= len(self.pool.backends):
+            raise e
+        print(f"Ollama backend {tried[-1].url} unreachable, trying another")
+
+    def _count_error(self, endpoint, e):
+        label = endpoint or "unknown"
+        if isinstance(e, httpx.TimeoutException):
+            metrics.OLLAMA_TIMEOUTS.labels(label).inc()
+        elif isinstance(e, httpx.HTTPStatusError):
+            metrics.OLLAMA_ERRORS.labels(label, e.response.status_code).inc()
+        elif isinstance(e, httpx.ConnectError):
+            metrics.OLLAMA_ERRORS.labels(label, "connect").inc()
+        else:
+            metrics.OLLAMA_ERRORS.labels(label, "other").inc()
+
+    async def _generate(self, payload, endpoint, user, api, affinity, cache_key=None):
+        requested_at = time.monotonic()
+        ticket = await get_admission_controller().acquire(endpoint, user)
+        tried = []
+        try:
+            while True:
+                try:
+                    async with self.pool.use(tried, affinity) as backend:
+                        tried.append(backend)
+                        response = await self._client().post(
+                            f"{backend.url}/api/{api}",
+                            json=self._prepare(payload, stream=False),
+                        )
+                        response.raise_for_status()
+                        data = _with_response(codec.loads(response.content))
+                    break
+                except httpx.ConnectError as e:
+                    self._failover(tried, e)
+        except httpx.HTTPError as e:
+            self._count_error(endpoint, e)
+            raise
+        finally:
+            ticket.release()
+
+        label = endpoint or "unknown"
+        metrics.GENERATION_TIME.labels(label).observe(time.monotonic() - requested_at)
+        metrics.observe_final_chunk(label, data)
+        if cache_key:
+            await llm_cache.store(cache_key, data.get("response", ""))
+        return data
+
+    async def _stream_generate(
+        self, payload, endpoint, ticket, user, api, affinity, cache_key=None
+    ):
+        # The generation holds its own slot until it ends, whichever of the
+        # requests following it leave early; the one that started it
+        # releasing its ticket no longer gives the slot back
+        if ticket is not None:
+            ticket = ticket.transfer()
+        else:
+            ticket = get_admission_controller().enter(endpoint, user)
+        try:
+            # While waiting for a slot, report the queue position as
+            # {"queued": True, "position": n} pseudo-chunks
+            while not ticket.admitted:
+                yield {"queued": True, "position": ticket.position}
+                await ticket.wait()
+
+            parts = []
+            tried = []
+            while True:
+                try:
+                    async with self.pool.use(tried, affinity) as backend:
+                        tried.append(backend)
+                        async with self._client().stream(
+                            "POST",
+                            f"{backend.url}/api/{api}",
+                            json=self._prepare(payload, stream=True),
+                        ) as r:
+                            if r.is_error:
+                                await r.aread()
+                                r.raise_for_status()
+
+                            # Lines stay bytes all the way into the parser
+                            async for line in codec.iter_lines(r.aiter_bytes()):
+                                if not line.strip():
+                                    continue
+                                try:
+                                    chunk = _with_response(codec.loads(line))
+                                except json.JSONDecodeError as e:
+                                    print(
+                                        f"Error decoding JSON: {str(e)} for line: {line.decode(errors='replace')}"
+                                    )
+                                    # Don't break the stream for a single error
+                                    continue
+
+                                parts.append(chunk.get("response", ""))
+                                if chunk.get("done", False):
+                                    metrics.observe_final_chunk(
+                                        endpoint or "unknown", chunk
+                                    )
+                                    if cache_key:
+                                        await llm_cache.store(cache_key, "".join(parts))
+                                yield chunk
+                    break
+                except httpx.ConnectError as e:
+                    if parts:
+                        raise
+                    self._failover(tried, e)
+        except httpx.HTTPError as e:
+            self._count_error(endpoint, e)
+            raise
+        finally:
+            ticket.release()
+
+    async def aclose(self):
+        for client in list(self._clients.values()):
+            await client.aclose()
+        self._clients.clear()
+
+
+_default_client = None
+
+
+def get_ollama_client():
+    """Return the process-wide OllamaClient built from settings."""
+    global _default_client
+    if _default_client is None:
+        _default_client = OllamaClient()
+    return _default_client
@@ -0,0 +1,139 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class PaginationError(ValueError):
+    pass
+
+
+def _encode(*parts):
+    raw = "|".join(str(part) for part in parts)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode(value, *types):
+    try:
+        padded = value + "=" * (-len(value) % 4)
+        parts = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        if len(parts) != len(types):
+            raise ValueError(value)
+        return tuple(to_type(part) for to_type, part in zip(types, parts))
+    except (ValueError, UnicodeError) as e:
+        raise PaginationError(f"Invalid cursor: {value}") from e
+
+
+def encode_cursor(obj):
+    """Encode the (created_at, id) position of a row as an opaque cursor string."""
+    return _encode(obj.created_at.isoformat(), obj.id)
+
+
+def decode_cursor(value):
+    return _decode(value, datetime.fromisoformat, int)
+
+
+def parse_limit(value):
+    if value in (None, ""):
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(value)
+    except (TypeError, ValueError) as e:
+        raise PaginationError(f"Invalid limit: {value}") from e
+    if limit < 1:
+        raise PaginationError(f"Invalid limit: {value}")
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def paginate_keyset(queryset, cursor=None, since=None, limit=DEFAULT_PAGE_SIZE):
+    """Page through ``queryset`` by its (created_at, id) keyset.
+
+    Without ``since`` rows come newest first and ``cursor`` continues with
+    older rows. With ``since`` only rows added after that position are
+    returned, oldest first, so a client can catch up incrementally.
+
+    Returns ``(rows, next_cursor, sync_cursor)``. ``next_cursor`` is set when
+    more rows follow in the same direction; ``sync_cursor`` marks the newest
+    row the client has now seen and is what it should send as ``since`` on
+    its next sync.
+    """
+    if since:
+        created_at, pk = decode_cursor(since)
+        queryset = queryset.filter(
+            Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+        ).order_by("created_at", "id")
+    else:
+        queryset = queryset.order_by("-created_at", "-id")
+        if cursor:
+            created_at, pk = decode_cursor(cursor)
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+            )
+
+    # Fetch one extra row to know whether another page follows
+    rows = list(queryset[: limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor = encode_cursor(rows[-1]) if has_more else None
+    if since:
+        sync_cursor = encode_cursor(rows[-1]) if rows else since
+    elif not cursor and rows:
+        sync_cursor = encode_cursor(rows[0])
+    else:
+        sync_cursor = None
+
+    return rows, next_cursor, sync_cursor
+
+
+def paginate_sequence(queryset, cursor=None, since=None, limit=DEFAULT_PAGE_SIZE):
+    """``paginate_keyset`` for a chat's messages, keyed on their ``seq``.
+
+    Same directions and return value; the cursors hold a seq, so each page
+    is a range scan of the (chat_window, seq) index.
+    """
+    if since:
+        (seq,) = _decode(since, int)
+        queryset = queryset.filter(seq__gt=seq).order_by("seq")
+    else:
+        queryset = queryset.order_by("-seq")
+        if cursor:
+            (seq,) = _decode(cursor, int)
+            queryset = queryset.filter(seq__lt=seq)
+
+    rows = list(queryset[: limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor = _encode(rows[-1].seq) if has_more else None
+    if since:
+        sync_cursor = _encode(rows[-1].seq) if rows else since
+    elif not cursor and rows:
+        sync_cursor = _encode(rows[0].seq)
+    else:
+        sync_cursor = None
+
+    return rows, next_cursor, sync_cursor
+
+
+def paginate_ranked(queryset, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """Page through ``queryset``, annotated with a ``rank``, best match first.
+
+    Keyset on (rank, id) like ``paginate_keyset``, so deep pages cost the
+    same as the first. ``rank`` has to be a double precision: the cursor
+    holds it as a Python float, which a float4 never compares equal to.
+    Returns ``(rows, next_cursor)``.
+    """
+    queryset = queryset.order_by("-rank", "-id")
+    if cursor:
+        rank, pk = _decode(cursor, float, int)
+        queryset = queryset.filter(Q(rank__lt=rank) | Q(rank=rank, id__lt=pk))
+
+    rows = list(queryset[: limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = _encode(repr(rows[-1].rank), rows[-1].id) if has_more else None
+    return rows, next_cursor
@@ -0,0 +1,177 @@
+import atexit
+import queue
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .models import ChatContext, LlamaChatWindow, LlamaResponse
+
+
+@dataclass
+class Generation:
+    """A finished generation waiting to be written."""
+
+    user_id: int
+    prompt: str
+    response: str
+    # Window the message is appended to, if any
+    chat_window_id: int = None
+    # Ollama context to store for the window, if context is active
+    context: list = None
+    # Parsed reply options, for tinder_replies
+    replies: list = None
+
+
+@transaction.atomic
+def write_batch(generations):
+    """Write ``generations`` (oldest first) with a handful of bulk queries."""
+    next_seq = LlamaChatWindow.lock_for_append(
+        {g.chat_window_id for g in generations if g.chat_window_id}
+    )
+    responses = []
+    by_window = defaultdict(list)
+    for g in generations:
+        if g.chat_window_id and g.chat_window_id not in next_seq:
+            continue  # the chat was deleted while this was queued
+        response = LlamaResponse(
+            prompt=g.prompt, response=g.response, user_id=g.user_id, replies=g.replies
+        )
+        if g.chat_window_id:
+            response.chat_window_id = g.chat_window_id
+            response.seq = next_seq[g.chat_window_id]
+            next_seq[g.chat_window_id] += 1
+            by_window[g.chat_window_id].append(response)
+        responses.append(response)
+
+    LlamaResponse.objects.bulk_create(responses)
+    LlamaChatWindow.record_messages(by_window)
+
+    # Only the newest context of each chat is ever read back
+    latest_contexts = {
+        g.chat_window_id: g.context
+        for g in generations
+        if g.chat_window_id in next_seq and g.context
+    }
+    ChatContext.store_contexts(latest_contexts)
+
+
+class WriteBehindQueue:
+    """Persist finished generations from a background thread.
+
+    Views hand over a ``Generation`` and move on, so a stream's final event
+    never waits on the database. The worker collects up to ``batch_size``
+    generations, or whatever arrived within ``flush_interval`` seconds, and
+    writes them in one transaction. Whatever is still queued when the process
+    shuts down gracefully is written before it exits.
+
+    Until a context is written, ``pending_context`` returns it, so the next
+    turn of a chat continues from the right state either way. Likewise
+    ``pending_messages`` returns a chat's messages that aren't written yet.
+    """
+
+    def __init__(self, batch_size, flush_interval):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._pending_contexts = {}  # chat id -> newest unwritten context
+        self._pending_messages = defaultdict(list)  # chat id -> unwritten messages
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, generation):
+        chat_id = generation.chat_window_id
+        if chat_id:
+            with self._lock:
+                self._pending_messages[chat_id].append(generation)
+                if generation.context:
+                    self._pending_contexts[chat_id] = generation.context
+        self._ensure_started()
+        self._queue.put(generation)
+
+    def pending_context(self, chat_id):
+        with self._lock:
+            return self._pending_contexts.get(chat_id)
+
+    def pending_messages(self, chat_id):
+        """A chat's submitted but unwritten generations, oldest first."""
+        with self._lock:
+            return list(self._pending_messages.get(chat_id, ()))
+
+    def flush(self):
+        """Block until everything submitted so far is written."""
+        self._queue.join()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="write-behind", daemon=True
+                )
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, batch):
+        close_old_connections()
+        try:
+            write_batch(batch)
+        except Exception as e:
+            # Don't let one bad record take the rest of the batch with it
+            print(f"Write-behind batch of {len(batch)} failed ({e}), retrying singly")
+            for generation in batch:
+                try:
+                    write_batch([generation])
+                except Exception as e:
+                    print(
+                        f"Dropping generation for user {generation.user_id}: {str(e)}"
+                    )
+        finally:
+            with self._lock:
+                for generation in batch:
+                    chat_id = generation.chat_window_id
+                    if chat_id in self._pending_messages:
+                        pending = self._pending_messages[chat_id]
+                        pending.remove(generation)
+                        if not pending:
+                            del self._pending_messages[chat_id]
+                    if (
+                        generation.context
+                        and self._pending_contexts.get(chat_id) is generation.context
+                    ):
+                        del self._pending_contexts[chat_id]
+
+
+_default_queue = None
+
+
+def get_write_behind_queue():
+    """Return the process-wide WriteBehindQueue built from settings."""
+    global _default_queue
+    if _default_queue is None:
+        _default_queue = WriteBehindQueue(
+            batch_size=settings.WRITE_BEHIND_BATCH_SIZE,
+            flush_interval=settings.WRITE_BEHIND_FLUSH_INTERVAL,
+        )
+    return _default_queue
@@ -0,0 +1,27 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import codec
+
+_encoder = JSONEncoder()
+
+
+class CodecJSONRenderer(JSONRenderer):
+    """DRF's JSONRenderer, serializing through ``api.codec``.
+
+    Output matches the stock renderer: compact, UTF-8, and with DRF's
+    encoder handling datetimes, decimals and the like.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = codec.dumps_bytes(data, default=_encoder.default)
+        # Like the stock renderer, escape the two code points that are valid
+        # JSON but not valid JavaScript
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+            b"\xe2\x80\xa9", b"\\u2029"
+        )
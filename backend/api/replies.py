@@ -0,0 +1,83 @@
+# Parse the numbered list tinder_replies asks the model for while it streams,
+# so each reply can be sent as soon as it is complete rather than after the
+# whole list.
+import re
+
+REPLY_COUNT = 5
+
+# "1. text", "2) text", "**3.** text"; not "4.5 hours"
+ITEM = re.compile(r"^\s*\**(\d+)[.)]\**(?!\d)\s*(.*)$")
+# The start of an item on a line still being streamed: a bare "4." may yet
+# turn out to be "4.5", so it only counts once something other than a digit
+# follows the marker
+ITEM_START = re.compile(r"^\s*\**\d+[.)]\**(?=[^\d])")
+
+
+class ReplyParser:
+    """Split a streamed numbered list into its replies.
+
+    ``feed`` takes the next piece of text and returns the replies it
+    completed: a reply is complete as soon as the next item's number shows
+    up followed by something other than a digit. ``close`` returns the ones
+    completed by the end of the text. Lines before the first item are
+    dropped, and a reply wrapped over several lines is joined back into one.
+    Without any numbered items the non-empty lines are the replies.
+    ``replies`` holds every reply so far, at most ``limit`` of them.
+    """
+
+    def __init__(self, limit=REPLY_COUNT):
+        self.limit = limit
+        self.replies = []
+        self._buffer = ""  # the line being streamed
+        self._current = None  # lines of the reply being read
+        self._unnumbered = []
+
+    def feed(self, text):
+        self._buffer += text
+        *lines, self._buffer = self._buffer.split("\n")
+        done = []
+        for line in lines:
+            done += self._line(line)
+        if self._current is not None and ITEM_START.match(self._buffer):
+            done += self._finish()
+        return done
+
+    def close(self):
+        done = self._line(self._buffer)
+        self._buffer = ""
+        done += self._finish()
+        if not self.replies:
+            self.replies = self._unnumbered[: self.limit]
+            done = list(self.replies)
+        return done
+
+    def _line(self, line):
+        match = ITEM.match(line)
+        if match:
+            done = self._finish()
+            self._current = [match.group(2)]
+            return done
+        if line.strip():
+            if self._current is not None:
+                self._current.append(line)
+            else:
+                self._unnumbered.append(line.strip())
+        return []
+
+    def _finish(self):
+        if self._current is None:
+            return []
+        text = " ".join(part.strip() for part in self._current if part.strip())
+        self._current = None
+        if not text or len(self.replies) >= self.limit:
+            return []
+        self.replies.append(text)
+        return [text]
+
+
+def parse(text, limit=REPLY_COUNT):
+    """The replies in a complete ``text``."""
+    parser = ReplyParser(limit)
+    parser.feed(text)
+    parser.close()
+    return parser.replies
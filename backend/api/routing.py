@@ -0,0 +1,32 @@
+# Which model each feature runs on. OLLAMA_MODEL_ROUTES maps an endpoint
+# label to a model and option overrides, layered over its "default" entry,
+# and a route's "modes" override it again for one chat mode. That way the
+# short, high-volume features can run on a small model while advice chat
+# keeps the big one.
+from django.conf import settings
+
+
+def route(endpoint, mode=None):
+    """The ``(model, options)`` that ``endpoint`` (in chat ``mode``) runs with."""
+    routes = settings.OLLAMA_MODEL_ROUTES
+    entry = routes.get(endpoint, {})
+    layers = [routes.get("default", {}), entry]
+    if mode is not None:
+        layers.append(entry.get("modes", {}).get(mode, {}))
+
+    model, options = settings.OLLAMA_MODEL, {}
+    for layer in layers:
+        model = layer.get("model", model)
+        options.update(layer.get("options", {}))
+    return model, options
+
+
+def apply(payload, endpoint, mode=None):
+    """``payload`` with the model and options of its route; the route's
+    options win over the payload's own."""
+    model, options = route(endpoint, mode)
+    payload = dict(payload)
+    payload["model"] = model
+    if options:
+        payload["options"] = {**payload.get("options", {}), **options}
+    return payload
@@ -0,0 +1,93 @@
+import asyncio
+import weakref
+
+# event loop -> {key: in-flight call or stream}
+_flights = weakref.WeakKeyDictionary()
+
+
+def _registry():
+    return _flights.setdefault(asyncio.get_running_loop(), {})
+
+
+def _forget(registry, key, flight):
+    if registry.get(key) is flight:
+        del registry[key]
+
+
+async def call(key, factory):
+    """Await ``factory()`` once for every concurrent caller using ``key``.
+
+    Later callers attach to the call already in flight and get its result (or
+    its exception). The call is shielded, so one caller going away does not
+    cancel it for the others.
+    """
+    registry = _registry()
+    task = registry.get(("call", key))
+    if task is None:
+        task = asyncio.ensure_future(factory())
+        registry[("call", key)] = task
+        task.add_done_callback(lambda t: _forget(registry, ("call", key), t))
+    return await asyncio.shield(task)
+
+
+class _StreamFlight:
+    def __init__(self, source):
+        self.chunks = []
+        self.finished = False
+        self.error = None
+        self.subscribers = 0
+        self.updated = asyncio.Event()
+        self.task = asyncio.ensure_future(self._run(source))
+
+    async def _run(self, source):
+        try:
+            async for chunk in source:
+                self.chunks.append(chunk)
+                self._notify()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.finished = True
+            self._notify()
+
+    def _notify(self):
+        # Wake everyone waiting on the current event, then start a fresh one
+        self.updated.set()
+        self.updated = asyncio.Event()
+
+
+async def stream(key, factory):
+    """Iterate the async iterator from ``factory()`` once for every concurrent
+    subscriber using ``key``.
+
+    A subscriber that joins late first gets the chunks produced so far, then
+    follows the live stream. The source is consumed by its own task, so it
+    outlives the subscriber that started it, and is cancelled once the last
+    subscriber leaves before it finishes.
+    """
+    registry = _registry()
+    flight = registry.get(("stream", key))
+    if flight is None:
+        flight = _StreamFlight(factory())
+        registry[("stream", key)] = flight
+        flight.task.add_done_callback(
+            lambda t: _forget(registry, ("stream", key), flight)
+        )
+
+    flight.subscribers += 1
+    position = 0
+    try:
+        while True:
+            if position < len(flight.chunks):
+                yield flight.chunks[position]
+                position += 1
+            elif flight.finished:
+                if flight.error is not None:
+                    raise flight.error
+                return
+            else:
+                await flight.updated.wait()
+    finally:
+        flight.subscribers -= 1
+        if flight.subscribers == 0 and not flight.finished:
+            flight.task.cancel()
@@ -0,0 +1,101 @@
+import asyncio
+import time
+
+from django.conf import settings
+
+from . import codec
+
+
+def frame(data, event=None):
+    """Encode one server-sent event, straight to bytes."""
+    prefix = b"event: " + event.encode() + b"\n" if event else b""
+    return prefix + b"data: " + codec.dumps_bytes(data) + b"\n\n"
+
+
+def coalesce_settings(endpoint):
+    """The ``window``/``max_bytes`` batching an endpoint's stream uses."""
+    config = dict(settings.SSE_COALESCE["default"])
+    config.update(settings.SSE_COALESCE.get(endpoint, {}))
+    return config
+
+
+async def coalesce(chunks, window, max_bytes):
+    """Merge consecutive Ollama token chunks so a stream sends fewer frames.
+
+    Tokens are buffered until ``window`` seconds have passed since the first
+    buffered one, or ``max_bytes`` of text has built up, and then go out as a
+    single ``{"response": ..., "done": False}`` chunk. The very first token
+    is passed straight through so time to first token doesn't suffer. The
+    ``done`` chunk carries any buffered text with it, and buffered text is
+    sent before an error is raised. Queued pseudo-chunks pass through as-is.
+    A ``window`` of 0 turns batching off.
+    """
+    if window <= 0:
+        async for chunk in chunks:
+            yield chunk
+        return
+
+    iterator = chunks.__aiter__()
+    parts = []
+    size = 0
+    deadline = None
+    sent_token = False
+    pending = None
+
+    def take():
+        nonlocal parts, size, deadline
+        text = "".join(parts)
+        parts, size, deadline = [], 0, None
+        return text
+
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+            if not done:
+                # The window closed before the next token arrived
+                yield {"response": take(), "done": False}
+                continue
+
+            task, pending = pending, None
+            try:
+                chunk = task.result()
+            except StopAsyncIteration:
+                break
+            except Exception:
+                if parts:
+                    yield {"response": take(), "done": False}
+                raise
+
+            if chunk.get("queued"):
+                yield chunk
+            elif chunk.get("done"):
+                if parts:
+                    chunk = dict(chunk, response=take() + chunk.get("response", ""))
+                yield chunk
+            elif not sent_token:
+                sent_token = True
+                yield chunk
+            else:
+                text = chunk.get("response", "")
+                parts.append(text)
+                size += len(text.encode())
+                if deadline is None:
+                    deadline = time.monotonic() + window
+                if size >= max_bytes:
+                    yield {"response": take(), "done": False}
+
+        if parts:
+            yield {"response": take(), "done": False}
+    finally:
+        if pending is not None:
+            # Let the cancelled read finish before closing the source under it
+            pending.cancel()
+            try:
+                await pending
+            except (asyncio.CancelledError, Exception):
+                pass
+        if hasattr(iterator, "aclose"):
+            await iterator.aclose()
@@ -1,3 +1,1374 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import time
+import unittest
+from unittest import mock
 
-# Create your tests here.
+import httpx
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import (
+    AsyncClient,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import (
+    conversation,
+    llm_cache,
+    loadtest,
+    love_messages,
+    metrics,
+    pagination,
+    replies,
+    routing,
+    singleflight,
+    warmup,
+)
+from .admission import AdmissionController, QueueFull
+from .backends import BackendPool, HealthMonitor
+from .context_codec import pack_tokens
+from .fake_ollama import FakeOllama
+from .models import (
+    ChatContext,
+    LlamaChatWindow,
+    LlamaResponse,
+    LoveMessageTemplate,
+    WingmanUsers,
+)
+from .ollama import OllamaClient
+from .persistence import Generation, get_write_behind_queue, write_batch
+
+# Wall-clock limits flake on a loaded machine, so they are only checked on
+# request: CHECK_TIMINGS=1 python manage.py test api
+CHECK_TIMINGS = os.environ.get("CHECK_TIMINGS") == "1"
+
+
+def django_stream(client):
+    """Open SSE streams through Django's test client, which, unlike httpx's
+    ASGI transport, hands over a streaming body as it is produced."""
+
+    async def open_stream(path, body):
+        response = await client.post(
+            path, json.dumps(body), content_type="application/json"
+        )
+        if response.status_code != 200:
+            return loadtest.StreamResult(error=f"HTTP {response.status_code}")
+
+        async def lines():
+            buffer = ""
+            async for part in response.streaming_content:
+                buffer += part.decode() if isinstance(part, bytes) else part
+                *complete, buffer = buffer.split("\n")
+                for line in complete:
+                    yield line
+
+        return await loadtest.consume_sse(lines())
+
+    return open_stream
+
+
+class FakeOllamaTests(SimpleTestCase):
+    def setUp(self):
+        self.fake = FakeOllama(token_rate=1000, latency=0, context_length=8, seed=1)
+        self.fake.start()
+        self.addCleanup(self.fake.stop)
+
+    def test_streams_tokens_and_final_stats(self):
+        with httpx.stream(
+            "POST",
+            f"{self.fake.url}/api/generate",
+            json={"prompt": "hi", "context": [1, 2, 3]},
+        ) as response:
+            chunks = [json.loads(line) for line in response.iter_lines() if line]
+
+        self.assertEqual("".join(c["response"] for c in chunks), self.fake.text)
+        final = chunks[-1]
+        self.assertTrue(final["done"])
+        self.assertEqual(final["context"][:3], [1, 2, 3])
+        self.assertEqual(len(final["context"]), 3 + 8)
+        self.assertEqual(final["eval_count"], len(chunks) - 1)
+        self.assertGreater(final["eval_duration"], 0)
+
+    def test_non_streaming(self):
+        data = httpx.post(
+            f"{self.fake.url}/api/generate", json={"prompt": "hi", "stream": False}
+        ).json()
+        self.assertEqual(data["response"], self.fake.text)
+        self.assertTrue(data["done"])
+        self.assertEqual(len(data["context"]), 8)
+
+    def test_error_rate(self):
+        self.fake.error_rate = 1.0
+        response = httpx.post(f"{self.fake.url}/api/generate", json={"prompt": "hi"})
+        self.assertEqual(response.status_code, 500)
+
+
+class PercentileTests(SimpleTestCase):
+    def test_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(loadtest.percentile(values, 50), 50)
+        self.assertEqual(loadtest.percentile(values, 95), 95)
+        self.assertEqual(loadtest.percentile(values, 99), 99)
+        self.assertEqual(loadtest.percentile([3.0], 99), 3.0)
+        self.assertIsNone(loadtest.percentile([], 50))
+
+
+class AdmissionTests(SimpleTestCase):
+    def controller(self):
+        return AdmissionController(
+            max_concurrency=4,
+            max_queue=8,
+            queue_timeout=60,
+            classes={
+                "interactive": {"weight": 4, "max_share": 1.0},
+                "batch": {"weight": 1, "max_share": 0.5},
+            },
+            max_queue_per_user=4,
+        )
+
+    async def test_capped_class_queue_is_bounded(self):
+        controller = self.controller()
+        with override_settings(OLLAMA_ENDPOINT_PRIORITY={"describe": "batch"}):
+            tickets = [controller.enter("describe", user=i) for i in range(10)]
+            # Half the slots are idle, but batch may only use two of them
+            self.assertEqual((controller.active, controller.waiting), (2, 8))
+            with self.assertRaises(QueueFull) as raised:
+                controller.enter("describe", user=10)
+            self.assertEqual(raised.exception.status, 503)
+
+            # Chat still starts in the slots batch can't use, then has to queue
+            chat = [controller.enter("chat", user=20) for _ in range(2)]
+            self.assertTrue(all(t.admitted for t in chat))
+            with self.assertRaises(QueueFull):
+                controller.enter("chat", user=21)
+
+            for ticket in tickets + chat:
+                ticket.release()
+        self.assertEqual((controller.active, controller.waiting), (0, 0))
+
+
+class SharedGenerationTests(SimpleTestCase):
+    def setUp(self):
+        self.fake = FakeOllama(token_rate=200, latency=0, seed=1).start()
+        self.addCleanup(self.fake.stop)
+        self.ollama = OllamaClient(pool=BackendPool([self.fake.url], 60, 1, 3))
+
+    async def test_slot_is_held_until_the_generation_ends(self):
+        controller = AdmissionController(
+            max_concurrency=1,
+            max_queue=4,
+            queue_timeout=60,
+            classes={"interactive": {"weight": 1, "max_share": 1.0}},
+            max_queue_per_user=4,
+        )
+        payload = {"prompt": "hi"}
+        first = controller.enter("generate_response", user=1)
+        started = self.ollama.stream_generate(
+            payload, ticket=first, endpoint="generate_response"
+        )
+        text = (await started.__anext__())["response"]
+        second = controller.enter("generate_response", user=2)
+        following = self.ollama.stream_generate(
+            payload, ticket=second, endpoint="generate_response"
+        )
+        self.assertEqual((await following.__anext__())["response"], text)
+
+        # The client that started the generation goes away, and its view
+        # releases its ticket
+        await started.aclose()
+        first.release()
+        self.assertEqual((controller.active, controller.waiting), (1, 0))
+
+        async for chunk in following:
+            text += chunk["response"]
+        self.assertEqual(text, self.fake.text)
+        self.assertEqual((controller.active, controller.waiting), (0, 0))
+        self.assertEqual(len(self.fake.requests), 1)
+
+
+class _Source:
+    """An async iterator for single-flight tests, fed through ``queue``: a
+    chunk is yielded, an exception raised and None ends it."""
+
+    def __init__(self):
+        self.queue = asyncio.Queue()
+        self.started = 0
+        self.closed = False
+
+    def __call__(self):
+        self.started += 1
+        return self._run()
+
+    async def _run(self):
+        try:
+            while True:
+                item = await self.queue.get()
+                if item is None:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            self.closed = True
+
+    def put(self, *items):
+        for item in items:
+            self.queue.put_nowait(item)
+
+
+class SingleFlightTests(SimpleTestCase):
+    async def test_late_subscriber_replays_earlier_chunks(self):
+        source = _Source()
+        first = singleflight.stream("key", source)
+        source.put(1, 2)
+        self.assertEqual([await first.__anext__(), await first.__anext__()], [1, 2])
+
+        late = singleflight.stream("key", source)
+        source.put(3, None)
+        self.assertEqual([chunk async for chunk in late], [1, 2, 3])
+        self.assertEqual([chunk async for chunk in first], [3])
+        self.assertEqual(source.started, 1)
+
+        # Once finished (and forgotten, a loop step later), the next caller
+        # starts a new one
+        await asyncio.sleep(0)
+        again = singleflight.stream("key", source)
+        source.put(4, None)
+        self.assertEqual([chunk async for chunk in again], [4])
+        self.assertEqual(source.started, 2)
+
+    async def test_error_reaches_every_subscriber(self):
+        source = _Source()
+        subscribers = [singleflight.stream("key", source) for _ in range(2)]
+        source.put(1, ValueError("boom"))
+        for subscriber in subscribers:
+            self.assertEqual(await subscriber.__anext__(), 1)
+            with self.assertRaisesMessage(ValueError, "boom"):
+                await subscriber.__anext__()
+        self.assertEqual(source.started, 1)
+
+    async def test_cancelled_once_the_last_subscriber_leaves(self):
+        source = _Source()
+        first, second = [singleflight.stream("key", source) for _ in range(2)]
+        source.put(1)
+        await first.__anext__()
+        await second.__anext__()
+
+        await first.aclose()
+        await asyncio.sleep(0)
+        self.assertFalse(source.closed)
+        source.put(2)
+        self.assertEqual(await second.__anext__(), 2)
+
+        await second.aclose()
+        for _ in range(3):
+            await asyncio.sleep(0)
+        self.assertTrue(source.closed)
+
+    async def test_call_runs_once_for_concurrent_callers(self):
+        calls = []
+
+        async def factory():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return len(calls)
+
+        results = await asyncio.gather(
+            *(singleflight.call("key", factory) for _ in range(3))
+        )
+        self.assertEqual(results, [1, 1, 1])
+
+
+class LLMCacheTests(TestCase):
+    def setUp(self):
+        self.fake = FakeOllama(token_rate=1000, latency=0, seed=1).start()
+        self.addCleanup(self.fake.stop)
+        self.ollama = OllamaClient(pool=BackendPool([self.fake.url], 60, 1, 3))
+        caches[settings.LLM_CACHE_ALIAS].clear()
+        self.addCleanup(caches[settings.LLM_CACHE_ALIAS].clear)
+
+    async def stream(self, payload):
+        return [
+            chunk
+            async for chunk in self.ollama.stream_generate(
+                payload, cache=True, endpoint="test"
+            )
+        ]
+
+    async def test_hit_is_replayed_as_chunks(self):
+        live = await self.stream({"prompt": "hi"})
+        # Whitespace in the prompt doesn't make it a different generation
+        cached = await self.stream({"prompt": "  hi "})
+        self.assertEqual(len(self.fake.requests), 1)
+        self.assertEqual("".join(c["response"] for c in cached), self.fake.text)
+        self.assertTrue(cached[-1]["done"] and cached[-1]["cached"])
+        self.assertNotIn("cached", live[-1])
+        self.assertTrue(
+            all(
+                len(c["response"].split()) <= llm_cache.REPLAY_CHUNK_WORDS
+                for c in cached
+            )
+        )
+
+        data = await self.ollama.generate({"prompt": "hi"}, cache=True)
+        self.assertEqual(data["response"], self.fake.text)
+        self.assertEqual(len(self.fake.requests), 1)
+
+    async def test_large_responses_are_not_cached(self):
+        with override_settings(LLM_CACHE_MAX_ENTRY_BYTES=len(self.fake.text) - 1):
+            await self.stream({"prompt": "hi"})
+            await self.stream({"prompt": "hi"})
+        self.assertEqual(len(self.fake.requests), 2)
+
+    def test_sse_replay(self):
+        user = WingmanUsers.objects.create(
+            name="Cache", email="cache@example.com", sex="m", age=30
+        )
+        with mock.patch("api.ollama._default_client", self.ollama), mock.patch(
+            "api.views.get_write_behind_queue", _DiscardQueue
+        ):
+            bodies = [
+                async_to_sync(self._post)(
+                    "/api/tinder_replies/", {"message": "Coffee?", "user_id": user.id}
+                )
+                for _ in range(2)
+            ]
+        self.assertEqual(len(self.fake.requests), 1)
+        live, cached = [
+            [
+                json.loads(line[6:])
+                for line in body.split("\n")
+                if line.startswith("data: ")
+            ]
+            for body in bodies
+        ]
+        self.assertEqual(
+            "".join(e.get("chunk", "") for e in cached),
+            "".join(e.get("chunk", "") for e in live),
+        )
+        self.assertEqual(cached[-1]["replies"], live[-1]["replies"])
+        self.assertEqual(len(cached[-1]["replies"]), replies.REPLY_COUNT)
+
+    async def _post(self, path, body):
+        response = await self.async_client.post(
+            path, json.dumps(body), content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200)
+        return b"".join([part async for part in response.streaming_content]).decode()
+
+
+class MetricsTests(SimpleTestCase):
+    def test_exposition(self):
+        metrics.GENERATED_TOKENS.labels("test").inc(3)
+        text = metrics.render().decode()
+        self.assertIn('wingman_llm_generated_tokens_total{endpoint="test"}', text)
+        self.assertIn("wingman_db_seconds_per_request", text)
+
+    async def test_stream_closes_once_however_it_ends(self):
+        async def events():
+            for i in range(3):
+                yield i
+
+        closed = []
+        stream = metrics.track_stream(
+            "test", events(), on_close=lambda: closed.append(1)
+        )
+        self.assertEqual([e async for e in stream], [0, 1, 2])
+        self.assertEqual(closed, [1])
+
+        # The client goes away after the first event
+        stream = metrics.track_stream(
+            "test", events(), on_close=lambda: closed.append(2)
+        )
+        self.assertEqual(await stream.__anext__(), 0)
+        await stream.aclose()
+        self.assertEqual(closed, [1, 2])
+
+
+class WarmupTests(SimpleTestCase):
+    def setUp(self):
+        self.fake = FakeOllama(latency=0, seed=1).start()
+        self.addCleanup(self.fake.stop)
+        self.pool = BackendPool([self.fake.url], 60, 1, 3)
+
+    def test_ready_once_preloaded(self):
+        report = async_to_sync(warmup.readiness)(self.pool, ["gemma3"])
+        self.assertFalse(report["ready"])
+        self.assertEqual(report["backends"][0]["missing"], ["gemma3:latest"])
+
+        failures = async_to_sync(warmup.warm)(self.pool, ["gemma3"], keep_alive="1h")
+        self.assertEqual(failures, {})
+        self.assertEqual(
+            self.fake.requests,
+            [("/api/generate", {"model": "gemma3", "keep_alive": "1h"})],
+        )
+        # The fake reports the name as given; Ollama would add the tag
+        self.fake.loaded = {"gemma3:latest"}
+        report = async_to_sync(warmup.readiness)(self.pool, ["gemma3"])
+        self.assertTrue(report["ready"])
+
+    def test_unreachable_backend_is_not_ready(self):
+        pool = BackendPool(["http://127.0.0.1:1"], 60, 1, 3)
+        report = async_to_sync(warmup.readiness)(pool, ["gemma3"])
+        self.assertFalse(report["ready"])
+        self.assertIn("error", report["backends"][0])
+
+    def test_requests_carry_keep_alive(self):
+        client = OllamaClient(pool=self.pool, keep_alive="5m")
+        async_to_sync(client.generate)({"prompt": "hi"})
+        self.assertEqual(self.fake.requests[-1][1]["keep_alive"], "5m")
+
+
+class BackendPoolTests(SimpleTestCase):
+    def setUp(self):
+        self.fakes = [FakeOllama(latency=0.2, token_rate=5000, seed=i) for i in (1, 2)]
+        for fake in self.fakes:
+            fake.start()
+            self.addCleanup(fake.stop)
+        self.pool = BackendPool([f.url for f in self.fakes], 60, 1, 1)
+
+    def test_least_outstanding(self):
+        client = OllamaClient(pool=self.pool)
+
+        async def generate_all():
+            await asyncio.gather(
+                *(
+                    client.generate({"prompt": f"hi {i}"}, coalesce=False)
+                    for i in range(4)
+                )
+            )
+            await client.aclose()
+
+        async_to_sync(generate_all)()
+        self.assertEqual([len(f.requests) for f in self.fakes], [2, 2])
+
+    def wait_for(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition():
+            self.assertLess(time.monotonic(), deadline, "timed out")
+            time.sleep(0.02)
+
+    def test_eject_and_readmit_without_traffic(self):
+        down = self.pool.backends[1]
+        port = self.fakes[1]._server.server_address[1]
+        monitor = HealthMonitor(self.pool, 0.05).start()
+
+        self.fakes[1].stop()
+        self.wait_for(lambda: not down.healthy)
+        self.assertIs(self.pool.pick(), self.pool.backends[0])
+        # Even with every request counted against the healthy one
+        self.pool.backends[0].outstanding = 10
+        self.assertIs(self.pool.pick(), self.pool.backends[0])
+
+        restarted = FakeOllama(port=port).start()
+        self.addCleanup(restarted.stop)
+        # Cleanups run last-in first-out: stop probing before the servers go
+        self.addCleanup(monitor.stop)
+        self.wait_for(lambda: down.healthy)
+        self.assertIs(self.pool.pick(), down)
+
+
+class BackendAffinityTests(SimpleTestCase):
+    def setUp(self):
+        self.pool = BackendPool([f"http://ollama{i}:11434" for i in range(4)], 60, 1, 1)
+        self.keys = [f"chat:{i}" for i in range(400)]
+
+    def routes(self, exclude=()):
+        return {key: self.pool.pick(exclude, key) for key in self.keys}
+
+    def test_sticky_and_spread(self):
+        before = self.routes()
+        # Load doesn't move a chat, only health does
+        self.pool.backends[0].outstanding = 50
+        self.assertEqual(self.routes(), before)
+        counts = [list(before.values()).count(b) for b in self.pool.backends]
+        self.assertTrue(all(60 < c < 140 for c in counts), counts)
+
+    def test_failover_only_moves_the_failed_nodes_chats(self):
+        before = self.routes()
+        down = self.pool.backends[1]
+        self.pool.record_failure(down, "test")
+        after = self.routes()
+        for key in self.keys:
+            if before[key] is down:
+                self.assertIsNot(after[key], down)
+                # Retrying elsewhere picks the same stand-in
+                self.assertIs(self.pool.pick((down,), key), after[key])
+            else:
+                self.assertIs(after[key], before[key])
+
+        # Once it is back, its chats return to it
+        self.pool.record_success(down)
+        self.assertEqual(self.routes(), before)
+
+
+class ConversationTests(SimpleTestCase):
+    def test_newest_turns_within_budget(self):
+        # Each turn costs 2 * (40 // 4 + 1) = 22 estimated tokens
+        turns = [conversation.Turn(f"{i:<40}", "r" * 40, seq=i) for i in range(1, 101)]
+        messages, kept = conversation.build_messages(
+            "system", "earlier stuff", turns, "now?", budget=110
+        )
+        self.assertEqual(kept, 4)
+        self.assertIn("earlier stuff", messages[0]["content"])
+        self.assertEqual([m["role"] for m in messages[1:3]], ["user", "assistant"])
+        self.assertEqual(messages[1]["content"], turns[-4].prompt)
+        self.assertEqual(messages[-1], {"role": "user", "content": "now?"})
+
+        # However long the chat, the request stays the same size
+        more, _ = conversation.build_messages(
+            "system", "earlier stuff", turns * 10, "now?", budget=110
+        )
+        self.assertEqual(len(more), len(messages))
+
+    def test_chats_are_not_coalesced_across_conversations(self):
+        first, _ = conversation.build_messages("s", "", [], "hi")
+        second, _ = conversation.build_messages("s", "", [], "hello")
+        self.assertNotEqual(
+            llm_cache.payload_key({"messages": first}, "m"),
+            llm_cache.payload_key({"messages": second}, "m"),
+        )
+
+    def test_nothing_fits(self):
+        turns = [conversation.Turn("x" * 4000, "y", seq=1)]
+        messages, kept = conversation.build_messages("s", "", turns, "hi", budget=50)
+        self.assertEqual(kept, 0)
+        self.assertEqual(len(messages), 2)
+
+
+@override_settings(
+    OLLAMA_MODEL="big",
+    OLLAMA_MODEL_ROUTES={
+        "default": {"model": "big", "options": {"num_gpu": 1}},
+        "tinder_replies": {"model": "small"},
+        "generate_response": {
+            "options": {"temperature": 0.8},
+            "modes": {"expert": {"model": "expert", "options": {"temperature": 0.5}}},
+        },
+    },
+)
+class RoutingTests(SimpleTestCase):
+    def test_layers(self):
+        self.assertEqual(routing.route("tinder_replies"), ("small", {"num_gpu": 1}))
+        self.assertEqual(routing.route("unknown"), ("big", {"num_gpu": 1}))
+        self.assertEqual(
+            routing.route("generate_response", "basic"),
+            ("big", {"num_gpu": 1, "temperature": 0.8}),
+        )
+        self.assertEqual(
+            routing.route("generate_response", "expert"),
+            ("expert", {"num_gpu": 1, "temperature": 0.5}),
+        )
+
+    def test_apply(self):
+        payload = {"prompt": "hi", "options": {"temperature": 0.9, "low_vram": True}}
+        routed = routing.apply(payload, "generate_response", "expert")
+        self.assertEqual(routed["model"], "expert")
+        self.assertEqual(
+            routed["options"], {"temperature": 0.5, "low_vram": True, "num_gpu": 1}
+        )
+        # Cached and coalesced per model
+        self.assertNotEqual(
+            llm_cache.payload_key(routed, "big"),
+            llm_cache.payload_key(routing.apply(payload, "tinder_replies"), "big"),
+        )
+        self.assertNotIn("model", payload)
+
+
+class ReplyParserTests(SimpleTestCase):
+    TEXT = (
+        "Here are your options:\n\n"
+        "1. Coffee sounds great, when works for you?\n"
+        "2) Only if you're buying\n"
+        "the pastries too.\n"
+        "**3.** I know just the place.\n"
+        "4. It takes me 4.5 minutes to get ready.\n"
+        "5. Sure!\n"
+        "6. One too many"
+    )
+
+    def test_each_reply_as_soon_as_the_next_starts(self):
+        parser = replies.ReplyParser()
+        seen = []
+        for i, char in enumerate(self.TEXT):
+            for reply in parser.feed(char):
+                seen.append((reply, self.TEXT[: i + 1].rsplit("\n", 1)[-1]))
+        self.assertEqual(parser.close(), [])
+        self.assertEqual(
+            parser.replies,
+            [
+                "Coffee sounds great, when works for you?",
+                "Only if you're buying the pastries too.",
+                "I know just the place.",
+                "It takes me 4.5 minutes to get ready.",
+                "Sure!",
+            ],
+        )
+        # Sent the moment the next number showed up
+        self.assertEqual(
+            [line for _, line in seen], ["2) ", "**3.*", "4. ", "5. ", "6. "]
+        )
+        # The last reply is only complete at the end of the text
+        parser = replies.ReplyParser()
+        parser.feed("1. Hi\n2. Hey")
+        self.assertEqual(parser.close(), ["Hey"])
+
+    def test_decimal_continuation(self):
+        # "4." alone looks like the next item until the "5" arrives
+        text = "1. Want to grab a drink? My place is only\n4.5 miles away?\n2. Sure"
+        parser = replies.ReplyParser()
+        streamed = []
+        for char in text:
+            streamed += parser.feed(char)
+        streamed += parser.close()
+        self.assertEqual(streamed, replies.parse(text))
+        self.assertEqual(
+            streamed,
+            ["Want to grab a drink? My place is only 4.5 miles away?", "Sure"],
+        )
+
+    def test_unnumbered(self):
+        self.assertEqual(
+            replies.parse("Hi there\n\nHow about Friday?"),
+            ["Hi there", "How about Friday?"],
+        )
+        self.assertEqual(replies.parse(""), [])
+
+
+class LoveTemplateTests(TestCase):
+    def setUp(self):
+        self.client_mock = mock.Mock()
+        patcher = mock.patch(
+            "api.love_messages.get_ollama_client", lambda: self.client_mock
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        love_messages._pool.clear()
+        self.addCleanup(love_messages._pool.clear)
+
+    def respond(self, *texts):
+        self.client_mock.generate = mock.AsyncMock(
+            side_effect=[{"response": text} for text in texts]
+        )
+
+    async def test_markers_are_required(self):
+        self.respond("You two are great!", "Go for it Nameone, nametwo is the one.")
+        template = await love_messages.generate_template(70)
+        self.assertEqual(template.template, "Go for it NAMEONE, NAMETWO is the one.")
+        self.assertEqual(self.client_mock.generate.await_count, 2)
+
+        self.respond(*["Only NAMEONE here."] * love_messages.MAX_ATTEMPTS)
+        self.assertIsNone(await love_messages.generate_template(70))
+        self.assertEqual(await LoveMessageTemplate.objects.acount(), 1)
+
+    async def test_empty_bucket_is_filled_once(self):
+        async def generate(*args, **kwargs):
+            await asyncio.sleep(0.05)
+            return {"response": "NAMEONE and NAMETWO, go for it."}
+
+        self.client_mock.generate = mock.AsyncMock(side_effect=generate)
+        messages = await asyncio.gather(
+            *(love_messages.get_message(42, "Romeo", f"Juliet{i}") for i in range(5))
+        )
+        self.assertEqual(messages[3], "Romeo and Juliet3, go for it.")
+        self.assertEqual(self.client_mock.generate.await_count, 1)
+        self.assertEqual(await LoveMessageTemplate.objects.acount(), 1)
+
+    async def test_live_message_when_no_template_comes_back(self):
+        self.respond("You two are great!", "Romeo, Juliet is the one.")
+        message = await love_messages.get_message(42, "Romeo", "Juliet")
+        self.assertEqual(message, "Romeo, Juliet is the one.")
+        live = self.client_mock.generate.await_args_list[-1].args[0]
+        self.assertIn("Romeo", live["system"])
+        self.assertEqual(self.client_mock.generate.await_count, 2)
+        self.assertEqual(await LoveMessageTemplate.objects.acount(), 0)
+
+
+class LoadTests(TransactionTestCase):
+    """Many concurrent SSE clients against the real views and a fake Ollama.
+
+    The fake answers in a fixed time, so anything on top of that is the
+    Django layer: these catch it serializing streams, dropping them, or
+    adding latency as concurrency grows.
+    """
+
+    STREAMS = 24
+    CONCURRENCY = 12
+
+    def setUp(self):
+        self.fake = FakeOllama(token_rate=400, latency=0.02, seed=1)
+        self.fake.start()
+        self.addCleanup(self.fake.stop)
+        pool = BackendPool([self.fake.url], 60, 1, 3)
+        patcher = mock.patch("api.ollama._default_client", OllamaClient(pool=pool))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user_ids = [
+            WingmanUsers.objects.create(
+                name=f"load{i}", email=f"load{i}@example.com", sex="m", age=30
+            ).id
+            for i in range(6)
+        ]
+
+    async def _load(self, endpoint):
+        path, body = loadtest.ENDPOINTS[endpoint]
+        bodies = [
+            body(i, self.user_ids[i % len(self.user_ids)]) for i in range(self.STREAMS)
+        ]
+        report = await loadtest.run_load(
+            django_stream(AsyncClient()), path, bodies, self.CONCURRENCY
+        )
+        await sync_to_async(get_write_behind_queue().flush)()
+        return report
+
+    def _assert_healthy(self, report):
+        summary = report.summary()
+        self.assertEqual(summary["errors"], 0, [r.error for r in report.errors])
+        self.assertEqual(summary["requests"], self.STREAMS)
+        tokens = len(self.fake.tokens())
+        for result in report.results:
+            self.assertEqual(result.text, self.fake.text)
+            # Tokens are batched into frames, but never into fewer than two:
+            # the first token goes out on its own
+            self.assertGreaterEqual(result.chunks, 2)
+            self.assertLessEqual(result.chunks, tokens + 1)
+
+        # One generation takes ~0.1s at 400 tokens/s. With 4 admission slots
+        # and 24 streams that is six waves, so p50 TTFT should stay well
+        # under a second; several seconds means streams are being serialized.
+        if CHECK_TIMINGS:
+            self.assertLess(summary["ttft_p50"], 1.0, summary)
+            self.assertLess(summary["elapsed"], 5.0, summary)
+
+    async def test_generate_response_streams(self):
+        report = await self._load("generate_response")
+        self._assert_healthy(report)
+        self.assertEqual(await LlamaResponse.objects.acount(), self.STREAMS)
+        self.assertEqual(len(self.fake.requests), self.STREAMS)
+
+    async def test_tinder_replies_streams(self):
+        report = await self._load("tinder_replies")
+        self._assert_healthy(report)
+        self.assertEqual(await LlamaResponse.objects.acount(), self.STREAMS)
+
+
+class PruneChatContextsTests(TestCase):
+    def test_keeps_what_the_latest_contexts_need(self):
+        user = WingmanUsers.objects.create(
+            name="Prune", email="prune@example.com", sex="m", age=30
+        )
+        chat, other = [LlamaChatWindow.objects.create(user=user) for _ in range(2)]
+
+        def legacy(window, count):
+            # Migrated JSON rows, each a keyframe of its own
+            return [
+                ChatContext.objects.create(
+                    chat_window=window, tokens=pack_tokens([i, i + 1])
+                )
+                for i in range(count)
+            ]
+
+        legacy(chat, 5)
+        keyframe = ChatContext.objects.create(
+            chat_window=chat, tokens=pack_tokens([1, 2, 3])
+        )
+        first = ChatContext.objects.create(
+            chat_window=chat,
+            tokens=pack_tokens([4]),
+            prefix_length=3,
+            base=keyframe,
+            chain_depth=1,
+        )
+        second = ChatContext.objects.create(
+            chat_window=chat,
+            tokens=pack_tokens([5]),
+            prefix_length=4,
+            base=first,
+            chain_depth=2,
+        )
+        kept = legacy(other, 3)[1:]
+
+        out = io.StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command("prune_chat_contexts", keep=2, batch_size=2, stdout=out)
+
+        self.assertIn("Deleted 6 contexts across 2 chat windows", out.getvalue())
+        # Decoding the latest two takes the whole chain back to its keyframe
+        self.assertEqual(
+            set(chat.contexts.values_list("id", flat=True)),
+            {keyframe.id, first.id, second.id},
+        )
+        self.assertEqual(ChatContext.get_latest_context(chat.id), [1, 2, 3, 4, 5])
+        self.assertEqual(list(other.contexts.order_by("id")), kept)
+        # Five legacy rows two at a time, then the other window's one
+        deletes = [q for q in queries.captured_queries if q["sql"].startswith("DELETE")]
+        self.assertEqual(len(deletes), 4)
+
+
+class PaginationTests(TestCase):
+    def setUp(self):
+        self.user = WingmanUsers.objects.create(
+            name="Pages", email="pages@example.com", sex="m", age=30
+        )
+
+    def add(self, count, created_at=None):
+        rows = LlamaResponse.objects.bulk_create(
+            LlamaResponse(user=self.user, prompt=f"prompt {i}", response="ok")
+            for i in range(count)
+        )
+        if created_at:
+            LlamaResponse.objects.filter(id__in=[r.id for r in rows]).update(
+                created_at=created_at
+            )
+        return [r.id for r in rows]
+
+    def page(self, path, **params):
+        response = self.client.get(path, {"user_id": self.user.id, **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def walk(self, path, key, **params):
+        """Every page from the first on, following next_cursor."""
+        pages = [self.page(path, **params)]
+        while pages[-1]["next_cursor"]:
+            pages.append(self.page(path, **{**params, key: pages[-1]["next_cursor"]}))
+        return pages
+
+    def test_cursor_walks_back_through_equal_timestamps(self):
+        self.add(3)
+        # Written in the same instant, so only the id tells them apart
+        self.add(4, created_at=timezone.now())
+        newest_first = list(
+            LlamaResponse.objects.order_by("-created_at", "-id").values_list(
+                "id", flat=True
+            )
+        )
+
+        pages = self.walk("/api/responses/", "cursor", limit=3)
+        self.assertEqual([len(p["results"]) for p in pages], [3, 3, 1])
+        self.assertEqual(
+            [row["id"] for p in pages for row in p["results"]], newest_first
+        )
+        # Only the first page says where to sync from
+        self.assertIsNotNone(pages[0]["sync_cursor"])
+        self.assertEqual([p["sync_cursor"] for p in pages[1:]], [None, None])
+
+    def test_since_returns_only_newer_rows_oldest_first(self):
+        self.add(2)
+        sync = self.page("/api/responses/")["sync_cursor"]
+        added = self.add(3, created_at=timezone.now())
+
+        pages = self.walk("/api/responses/", "since", since=sync, limit=2)
+        self.assertEqual([row["id"] for p in pages for row in p["results"]], added)
+        # Each page's sync_cursor is where the next sync starts
+        self.assertEqual(
+            [p["sync_cursor"] for p in pages[:-1]],
+            [p["next_cursor"] for p in pages[:-1]],
+        )
+        caught_up = self.page("/api/responses/", since=pages[-1]["sync_cursor"])
+        self.assertEqual(caught_up["results"], [])
+        self.assertEqual(caught_up["sync_cursor"], pages[-1]["sync_cursor"])
+
+    def test_chat_history_pages_by_seq(self):
+        chat = LlamaChatWindow.objects.create(user=self.user)
+        write_batch(
+            [Generation(self.user.id, f"prompt {i}", "ok", chat.id) for i in range(5)]
+        )
+        history = "/api/chat_history/"
+
+        pages = self.walk(history, "cursor", chat_id=chat.id, limit=2)
+        self.assertEqual(
+            [row["seq"] for p in pages for row in p["results"]], [5, 4, 3, 2, 1]
+        )
+
+        write_batch([Generation(self.user.id, "later", "ok", chat.id)])
+        newer = self.page(history, chat_id=chat.id, since=pages[0]["sync_cursor"])
+        self.assertEqual([row["seq"] for row in newer["results"]], [6])
+        newer = self.page(history, chat_id=chat.id, since=newer["sync_cursor"])
+        self.assertEqual(newer["results"], [])
+
+    def test_invalid_cursor_or_limit(self):
+        chat = LlamaChatWindow.objects.create(user=self.user)
+        for path, params in [
+            ("/api/responses/", {"cursor": "not-a-cursor"}),
+            ("/api/responses/", {"since": "bm9wZQ"}),
+            ("/api/responses/", {"limit": "ten"}),
+            ("/api/responses/", {"limit": "0"}),
+            ("/api/chat_history/", {"chat_id": chat.id, "cursor": "bm9wZQ"}),
+        ]:
+            response = self.client.get(path, {"user_id": self.user.id, **params})
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn("error", response.json())
+
+    def test_limit_is_clamped(self):
+        self.add(pagination.MAX_PAGE_SIZE + 1)
+        self.assertEqual(
+            len(self.page("/api/responses/")["results"]),
+            pagination.DEFAULT_PAGE_SIZE,
+        )
+        page = self.page("/api/responses/", limit=1000)
+        self.assertEqual(len(page["results"]), pagination.MAX_PAGE_SIZE)
+        self.assertIsNotNone(page["next_cursor"])
+
+
+class WriteBatchTests(TestCase):
+    def test_context_error_keeps_the_batch(self):
+        user = WingmanUsers.objects.create(
+            name="Batch", email="batch@example.com", sex="m", age=30
+        )
+        chat = LlamaChatWindow.objects.create(user=user)
+
+        def broken_prune(chat_ids):
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT * FROM no_such_table")
+
+        with mock.patch.object(ChatContext, "prune", broken_prune):
+            with CaptureQueriesContext(connection) as queries:
+                write_batch(
+                    [
+                        Generation(user.id, "hi", "hello", chat.id, [1, 2, 3]),
+                        Generation(user.id, "again", "sure", chat.id, [1, 2, 3, 4]),
+                    ]
+                )
+        # Only the context is rolled back, to its savepoint
+        self.assertTrue(
+            any("ROLLBACK TO SAVEPOINT" in q["sql"] for q in queries.captured_queries)
+        )
+        self.assertEqual(chat.messages.count(), 2)
+        self.assertFalse(ChatContext.objects.filter(chat_window=chat).exists())
+
+    @override_settings(CHAT_CONTEXT_RETENTION=1)
+    def test_contexts_of_several_chats(self):
+        user = WingmanUsers.objects.create(
+            name="Batch", email="batch@example.com", sex="m", age=30
+        )
+        chats = [LlamaChatWindow.objects.create(user=user) for _ in range(2)]
+        context = []
+        for turn in range(ChatContext.KEYFRAME_INTERVAL + 1):
+            context = context + [turn, turn + 1]
+            rows = ChatContext.store_contexts(
+                {chat.id: context + [chat.id] for chat in chats}
+            )
+            self.assertEqual(len(rows), len(chats))
+            for chat in chats:
+                self.assertEqual(
+                    ChatContext.get_latest_context(chat.id), context + [chat.id]
+                )
+        # The last turn started a new chain in both, so the old ones are gone
+        for chat in chats:
+            self.assertEqual(ChatContext.objects.filter(chat_window=chat).count(), 1)
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "needs PostgreSQL")
+class SearchTests(TestCase):
+    def test_pages_through_tied_ranks(self):
+        user = WingmanUsers.objects.create(
+            name="Search", email="search@example.com", sex="m", age=30
+        )
+        best = LlamaResponse.objects.create(
+            user=user, prompt="coffee, coffee and more coffee", response="yes"
+        )
+        tied = LlamaResponse.objects.bulk_create(
+            LlamaResponse(user=user, prompt=f"coffee on day {i}?", response="sure")
+            for i in range(5)
+        )
+
+        seen, ranks, cursor = [], set(), None
+        while True:
+            params = {"user_id": user.id, "q": "coffee", "limit": 2}
+            if cursor:
+                params["cursor"] = cursor
+            response = self.client.get("/api/search/", params)
+            self.assertEqual(response.status_code, 200)
+            page = response.json()
+            seen += [row["id"] for row in page["results"]]
+            ranks |= {row["rank"] for row in page["results"][1:]}
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+
+        self.assertEqual(seen, [best.id] + sorted((r.id for r in tied), reverse=True))
+        self.assertEqual(len(ranks), 1)
+
+
+class _DiscardQueue:
+    """Stands in for the write-behind queue, so only a request's own queries
+    are counted; write_batch has its own budget below."""
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, generation):
+        self.submitted.append(generation)
+
+    def pending_context(self, chat_id):
+        return None
+
+    def pending_messages(self, chat_id):
+        return []
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class QueryBudgetTests(TestCase):
+    """SQL query budgets for every endpoint in backend/urls.py.
+
+    Each endpoint is called once against a small dataset and once more after
+    the data has grown tenfold. The query count has to be the same both
+    times, so a loop that queries per row (an N+1) fails here as soon as it
+    is introduced, and has to stay within the endpoint's budget. With
+    CHECK_TIMINGS each view also has to answer within VIEW_TIME_BUDGET; Ollama
+    is a local fake, so that time is the Django layer's.
+    """
+
+    SMALL = 3
+    LARGE = 30
+    # Generous: the fake Ollama answers in a few milliseconds
+    VIEW_TIME_BUDGET = 1.0
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.fake = FakeOllama(token_rate=5000, latency=0, context_length=8, seed=1)
+        cls.fake.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.fake.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.pool = BackendPool([self.fake.url], 60, 1, 3)
+        for target, value in [
+            ("api.ollama._default_client", OllamaClient(pool=self.pool)),
+            ("api.views.get_write_behind_queue", _DiscardQueue),
+            ("api.warmup.get_backend_pool", lambda: self.pool),
+        ]:
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        love_messages._pool.clear()
+        self.addCleanup(love_messages._pool.clear)
+
+        self.user = WingmanUsers.objects.create(
+            name="Budget", email="budget@example.com", sex="m", age=30
+        )
+        self.other = WingmanUsers.objects.create(
+            name="Other", email="other@example.com", sex="f", age=28
+        )
+        self.chat = LlamaChatWindow.objects.create(user=self.user)
+        self.seeded = 0
+
+    def _grow(self, size):
+        """Grow every table an endpoint reads to ``size`` rows per owner."""
+        count = size - self.seeded
+        for user in (self.user, self.other):
+            windows = [LlamaChatWindow.objects.create(user=user) for _ in range(count)]
+            generations = [
+                Generation(
+                    user_id=user.id,
+                    prompt=f"prompt {i} about coffee",
+                    response=f"response {i}",
+                    chat_window_id=window.id,
+                    context=list(range(i, i + 16)),
+                )
+                for window in windows + [self.chat]
+                for i in range(count)
+            ]
+            write_batch(generations)
+        LoveMessageTemplate.objects.bulk_create(
+            LoveMessageTemplate(
+                score=score,
+                template=f"{love_messages.NAME1_MARKER} and "
+                f"{love_messages.NAME2_MARKER} {i}",
+            )
+            for score in range(101)
+            for i in range(count)
+        )
+        self.seeded = size
+
+    def _request(self, method, path, data=None):
+        if method == "get":
+            response = self.client.get(path, data)
+        else:
+            response = getattr(self.client, method)(
+                path, json.dumps(data), content_type="application/json"
+            )
+        if response.streaming:
+            # The views stream from async generators, which the sync test
+            # client hands back as they are
+            response.body = async_to_sync(self._collect)(response)
+        return response
+
+    @staticmethod
+    async def _collect(response):
+        return b"".join([part async for part in response.streaming_content])
+
+    def _measure(self, method, path, data=None, status=200):
+        love_messages._pool.clear()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = self._request(method, path, data)
+            elapsed = time.perf_counter() - started
+        self.assertEqual(response.status_code, status, getattr(response, "body", ""))
+        if response.streaming:
+            self.assertNotIn(b'"error"', response.body)
+        return response, len(queries), elapsed
+
+    def assertBudget(self, name, budget, method, path, data=None, status=200):
+        """Call the endpoint at both data sizes; ``path`` and ``data`` may be
+        callables, evaluated after the data has grown."""
+        counts = []
+        elapsed = 0
+        for size in (self.SMALL, self.LARGE):
+            self._grow(size)
+            response, count, elapsed = self._measure(
+                method,
+                path() if callable(path) else path,
+                data() if callable(data) else data,
+                status,
+            )
+            counts.append(count)
+
+        small, large = counts
+        self.assertEqual(
+            small, large, f"{name}: queries grow with data size ({small} -> {large})"
+        )
+        self.assertLessEqual(large, budget, f"{name}: {large} queries")
+        if CHECK_TIMINGS:
+            self.assertLess(elapsed, self.VIEW_TIME_BUDGET, name)
+        return response
+
+    def test_generate_response(self):
+        body = {"prompt": "hi", "user_id": self.user.id, "chat_id": self.chat.id}
+        self.assertBudget(
+            "generate_response",
+            3,
+            "post",
+            "/api/generate/",
+            {**body, "isContextActive": True},
+        )
+        self.assertBudget(
+            "generate_response (no stream)",
+            3,
+            "post",
+            "/api/generate/",
+            {**body, "isContextActive": True, "stream": False},
+        )
+        self.assertBudget(
+            "generate_response (context)",
+            3,
+            "post",
+            "/api/generate/",
+            {**body, "isContextActive": True, "history": "context"},
+        )
+        self.assertEqual(
+            [path for path, _ in self.fake.requests],
+            ["/api/chat"] * 4 + ["/api/generate"] * 2,
+        )
+        self.assertBudget(
+            "generate_response (no chat)",
+            2,
+            "post",
+            "/api/generate/",
+            {"prompt": "hi", "user_id": self.user.id, "stream": False},
+        )
+
+    def test_get_responses(self):
+        self.assertBudget(
+            "get_responses", 2, "get", "/api/responses/", {"user_id": self.user.id}
+        )
+
+    def test_create_user(self):
+        self.assertBudget(
+            "create_user",
+            2,
+            "post",
+            "/api/create_user/",
+            lambda: {
+                "name": "New",
+                "email": f"new{self.seeded}@example.com",
+                "sex": "f",
+                "age": 25,
+                "password": "secret",
+            },
+            status=201,
+        )
+
+    def test_get_user(self):
+        self.assertBudget(
+            "get_user", 1, "get", "/api/get_user/", {"user_id": self.user.id}
+        )
+
+    def test_login_user(self):
+        self.user.password = make_password("secret")
+        self.user.save()
+        self.assertBudget(
+            "login_user",
+            1,
+            "post",
+            "/api/login_user/",
+            {"email": self.user.email, "password": "secret"},
+        )
+
+    def test_update_user(self):
+        self.assertBudget(
+            "update_user",
+            2,
+            "put",
+            "/api/update_user/",
+            {
+                "user_id": self.user.id,
+                "name": "Renamed",
+                "email": self.user.email,
+                "sex": "m",
+                "age": 31,
+            },
+        )
+
+    def test_love_calculator(self):
+        self.assertBudget(
+            "love_calculator",
+            1,
+            "post",
+            "/api/love_calculator/",
+            {"name1": "Romeo", "name2": "Juliet"},
+        )
+
+    def test_chat_history(self):
+        self.assertBudget(
+            "chat_history",
+            3,
+            "get",
+            "/api/chat_history/",
+            {"user_id": self.user.id, "chat_id": self.chat.id},
+        )
+
+    @unittest.skipUnless(connection.vendor == "postgresql", "needs PostgreSQL")
+    def test_search(self):
+        self.assertBudget(
+            "search_responses",
+            1,
+            "get",
+            "/api/search/",
+            {"user_id": self.user.id, "q": "coffee"},
+        )
+
+    def test_chat_windows(self):
+        response = self.assertBudget(
+            "get_all_chat_windows",
+            2,
+            "get",
+            "/api/chat_windows/",
+            {"user_id": self.user.id},
+        )
+        self.assertEqual(len(response.json()), self.LARGE + 1)
+
+    def test_create_chat_window(self):
+        self.assertBudget(
+            "create_chat_window",
+            2,
+            "post",
+            "/api/chat_windows/create/",
+            {"user_id": self.user.id},
+            status=201,
+        )
+
+    def test_delete_chat_window(self):
+        # Each call deletes the most recently seeded window and its messages
+        self.assertBudget(
+            "delete_chat_window",
+            5,
+            "delete",
+            lambda: (
+                f"/api/chat_windows/"
+                f"{LlamaChatWindow.objects.filter(user=self.user).latest('id').id}"
+                f"/delete/?user_id={self.user.id}"
+            ),
+        )
+
+    def test_tinder_replies(self):
+        body = {"message": "Coffee?", "user_id": self.user.id}
+        response = self.assertBudget(
+            "tinder_replies", 1, "post", "/api/tinder_replies/", body
+        )
+        self.assertIn(b'"replies":', response.body)
+        response = self.assertBudget(
+            "tinder_replies (no stream)",
+            1,
+            "post",
+            "/api/tinder_replies/",
+            {**body, "message": "Drinks?", "stream": False},
+        )
+        self.assertEqual(
+            response.json()["replies"], replies.parse(response.json()["response"])
+        )
+
+    def test_tinder_description(self):
+        self.assertBudget(
+            "tinder_description",
+            1,
+            "post",
+            "/api/tinder_description/",
+            {"user_id": self.user.id, "user_basics": {"age": 30, "occupation": "chef"}},
+        )
+
+    def test_metrics(self):
+        self.assertBudget("metrics", 0, "get", "/api/metrics/")
+
+    def test_readiness(self):
+        async_to_sync(warmup.warm)()
+        self.assertBudget("readiness", 0, "get", "/api/ready/")
+
+    def test_write_batch(self):
+        # What the write-behind worker costs per batch, however many messages
+        # and windows it holds
+        def batch_queries(count):
+            windows = LlamaChatWindow.objects.bulk_create(
+                LlamaChatWindow(user=self.user) for _ in range(count)
+            )
+            generations = [
+                Generation(
+                    user_id=self.user.id,
+                    prompt=f"prompt {i}",
+                    response=f"response {i}",
+                    chat_window_id=self.chat.id,
+                    context=list(range(i, i + 16)),
+                )
+                for i in range(count)
+            ] + [
+                Generation(self.user.id, "hi", "hello", window.id, list(range(16)))
+                for window in windows
+            ]
+            with CaptureQueriesContext(connection) as queries:
+                write_batch(generations)
+            return len(queries)
+
+        batch_queries(1)  # the window's first context is stored in full
+        small, large = batch_queries(self.SMALL), batch_queries(self.LARGE)
+        self.assertEqual(small, large)
+        # Storing a context takes a savepoint (two of these queries)
+        self.assertLessEqual(large, 11)
+
+        # Messages are numbered 1, 2, ... in the order they were written
+        seqs = list(self.chat.messages.order_by("id").values_list("seq", flat=True))
+        self.assertEqual(seqs, list(range(1, 1 + self.SMALL + self.LARGE + 1)))
+        self.chat.refresh_from_db()
+        self.assertEqual(self.chat.message_count, len(seqs))
+        # Every other window got its message and its context
+        others = LlamaChatWindow.objects.exclude(id=self.chat.id)
+        self.assertEqual(others.count(), 1 + self.SMALL + self.LARGE)
+        self.assertFalse(others.exclude(message_count=1).exists())
+        self.assertEqual(
+            ChatContext.objects.filter(chat_window__in=others).count(), others.count()
+        )
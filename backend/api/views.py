@@ -1,11 +1,37 @@
-import requests
+import httpx
 import json
 import unicodedata
 from rest_framework.response import Response
 from rest_framework.decorators import api_view
-from django.http import StreamingHttpResponse
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_http_methods, require_POST
 from .models import *
+from . import (
+    codec,
+    conversation,
+    love_messages,
+    metrics,
+    replies,
+    routing,
+    sse,
+    warmup,
+)
+from .admission import QueueFull, get_admission_controller
+from .ollama import get_ollama_client
+from .persistence import Generation, get_write_behind_queue
+from .pagination import (
+    PaginationError,
+    paginate_keyset,
+    paginate_ranked,
+    paginate_sequence,
+    parse_limit,
+)
 from django.contrib.auth.hashers import make_password, check_password
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
 
 modes = {
     "basic": """You are a friendly dating advisor who provides balanced, thoughtful advice. 
@@ -34,44 +60,68 @@ orientations = {
 }
 
 
-@api_view(["POST"])
-def generate_response(request):
-    prompt = request.data.get("prompt", "")
-    user_id = request.data.get("user_id")
-    chat_id = request.data.get("chat_id")  # Get chat_id from request
-    mode = request.data.get("mode", "none")
-    orientation_choice = request.data.get("orientation", "hetero")
+def _parse_json_body(request):
+    """Parse the JSON body of a plain (non-DRF) async view, None if invalid."""
+    try:
+        data = codec.loads(request.body or b"{}")
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _busy_response(exc):
+    """503 (or 429 for a user over their share) with Retry-After for a
+    generation the admission queue turned away."""
+    response = JsonResponse(
+        {"error": str(exc), "retry_after": exc.retry_after}, status=exc.status
+    )
+    response["Retry-After"] = str(exc.retry_after)
+    return response
+
+
+@csrf_exempt
+@require_POST
+async def generate_response(request):
+    data = _parse_json_body(request)
+    if data is None:
+        return JsonResponse({"error": "Invalid JSON body"}, status=400)
+
+    prompt = data.get("prompt", "")
+    user_id = data.get("user_id")
+    chat_id = data.get("chat_id")  # Get chat_id from request
+    mode = data.get("mode", "none")
+    orientation_choice = data.get("orientation", "hetero")
     # Get the isContextActive parameter with default False
-    is_context_active = request.data.get("isContextActive", False)
+    is_context_active = data.get("isContextActive", False)
 
     if not prompt:
-        return Response({"error": "Prompt is required"}, status=400)
+        return JsonResponse({"error": "Prompt is required"}, status=400)
     if not user_id:
-        return Response({"error": "User ID is required"}, status=400)
+        return JsonResponse({"error": "User ID is required"}, status=400)
 
     try:
-        user = WingmanUsers.objects.get(id=user_id)
+        user = await WingmanUsers.objects.aget(id=user_id)
     except WingmanUsers.DoesNotExist:
-        return Response({"error": "User not found"}, status=404)
+        return JsonResponse({"error": "User not found"}, status=404)
 
     # Get or create chat window for this user
     try:
         # If chat_id is provided, use that specific chat window
         if chat_id:
-            chat_window = LlamaChatWindow.objects.get(id=chat_id, user=user)
+            chat_window = await LlamaChatWindow.objects.aget(id=chat_id, user=user)
         else:
             # If no chat_id provided, get the most recent chat window or create a new one
             chat_window = (
-                LlamaChatWindow.objects.filter(user=user)
+                await LlamaChatWindow.objects.filter(user=user)
                 .order_by("-created_at")
-                .first()
+                .afirst()
             )
             if not chat_window:
-                chat_window = LlamaChatWindow.objects.create(user=user)
+                chat_window = await LlamaChatWindow.objects.acreate(user=user)
     except LlamaChatWindow.DoesNotExist:
-        return Response({"error": "Chat window not found"}, status=404)
+        return JsonResponse({"error": "Chat window not found"}, status=404)
 
-    stream_response = request.data.get("stream", True)
+    stream_response = data.get("stream", True)
 
     system = modes["none"]
     match mode:
@@ -101,159 +151,199 @@ def generate_response(request):
         case _:
             orientation = orientations["hetero"]
 
-    # According to Ollama API docs, context is an array of numbers returned from a previous
-    # request that encodes the model's state. We need to store this and retrieve it.
-    context = None
+    options = {"temperature": 0.9, "num_gpu": 1, "low_vram": True}
+    # Chats with context active are either rebuilt from their messages for
+    # /api/chat, within a token budget, or continued from Ollama's context
+    use_messages = (
+        is_context_active
+        and chat_id
+        and data.get("history", settings.CHAT_HISTORY_MODE) == "messages"
+    )
 
-    # If context is active and chat_id is provided, try to find the last context for this chat
-    if is_context_active and chat_id:
-        try:
-            # Try to get the most recent saved context for this chat window
-            latest_context = (
-                ChatContext.objects.filter(chat_window_id=chat_id)
-                .order_by("-created_at")
-                .first()
-            )
+    if use_messages:
+        # The previous turn may not be written yet
+        turns = await conversation.load_turns(
+            chat_window, get_write_behind_queue().pending_messages(chat_window.id)
+        )
+        messages, kept = conversation.build_messages(
+            system + orientation, chat_window.summary, turns, prompt
+        )
+        payload = {
+            "messages": messages,
+            "options": {**options, "num_ctx": settings.CHAT_NUM_CTX},
+        }
+    else:
+        # According to Ollama API docs, context is an array of numbers returned from a previous
+        # request that encodes the model's state. We need to store this and retrieve it.
+        context = None
+
+        # If context is active and chat_id is provided, try to find the last context for this chat
+        # (continues without context if it can't be loaded)
+        if is_context_active and chat_id:
+            # A context from the previous turn may not be written yet
+            context = get_write_behind_queue().pending_context(
+                chat_window.id
+            ) or await ChatContext.aget_latest_context(chat_window.id)
+
+        # Ollama expects different format depending on the model
+        payload = {
+            "prompt": prompt,
+            "system": system + orientation,
+            "options": options,
+        }
 
-            if latest_context:
-                # Load the stored context
-                context = latest_context.context_data
-        except Exception as e:
-            print(f"Error retrieving context: {str(e)}")
-            # Continue without context if there's an error
+        # Only add context if we have one
+        if context:
+            payload["context"] = context
 
-    # Ollama expects different format depending on the model
-    payload = {
-        "model": "gemma3:4b-it-q4_K_M",
-        "prompt": prompt,
-        "system": system + orientation,
-        "stream": stream_response,
-        "options": {"temperature": 0.9, "num_gpu": 1, "low_vram": True},
-    }
+    # The model and options can be set per mode (see api.routing)
+    payload = routing.apply(payload, "generate_response", mode)
+
+    # Only context mode keeps Ollama's context for the next turn
+    keep_context = is_context_active and chat_id and not use_messages
 
-    # Only add context if we have one
-    if context:
-        payload["context"] = context
+    ollama = get_ollama_client()
+    # Every turn of a chat goes to the same Ollama server while it is up, so
+    # the server can reuse what it still holds of the conversation
+    affinity = f"chat:{chat_window.id}"
 
     try:
         if not stream_response:
             # Non-streaming request
-            response = requests.post(
-                "http://localhost:11434/api/generate",
-                json=payload,
-                timeout=100,
+            generate = ollama.chat if use_messages else ollama.generate
+            data = await generate(
+                payload, endpoint="generate_response", user=user.id, affinity=affinity
             )
-            response.raise_for_status()
-
-            data = response.json()
             response_text = data.get("response", "")
 
             # Get the new context returned by Ollama
             new_context = data.get("context")
 
-            # Create the LlamaResponse and add it to the chat window
-            llama_response = LlamaResponse.objects.create(
-                prompt=prompt, response=response_text, user=user
-            )
-            chat_window.responses.add(llama_response)
-
-            # If we got a context back and context is active, store it
-            if is_context_active and new_context and chat_id:
-                ChatContext.objects.create(
-                    chat_window_id=chat_id, context_data=new_context
+            # Queue the LlamaResponse for the chat window, along with the
+            # context if we got one back and context is active
+            get_write_behind_queue().submit(
+                Generation(
+                    user_id=user.id,
+                    prompt=prompt,
+                    response=response_text,
+                    chat_window_id=chat_window.id,
+                    context=new_context if keep_context else None,
                 )
+            )
+            if use_messages:
+                conversation.schedule_summary(chat_window, turns, kept)
 
-            return Response({"response": response_text, "user_id": user.id})
+            return JsonResponse({"response": response_text, "user_id": user.id})
         else:
-            # Streaming request
-            def event_stream():
-                full_response = ""
+            # Streaming request, served from an async generator so that an
+            # open stream holds no worker thread while waiting on Ollama
+            async def event_stream():
+                response_parts = []
                 final_context = None
 
                 try:
-                    with requests.post(
-                        "http://localhost:11434/api/generate",
-                        json=payload,
-                        stream=True,
-                        timeout=100,
-                    ) as r:
-                        if not r.ok:
-                            error_text = r.text
-                            print(
-                                f"Ollama error: Status {r.status_code}, Response: {error_text}"
+                    stream = (
+                        ollama.stream_chat if use_messages else ollama.stream_generate
+                    )
+                    async for chunk in sse.coalesce(
+                        stream(
+                            payload,
+                            ticket=ticket,
+                            endpoint="generate_response",
+                            affinity=affinity,
+                        ),
+                        **sse.coalesce_settings("generate_response"),
+                    ):
+                        if chunk.get("queued"):
+                            # Still waiting for a generation slot
+                            yield sse.frame(
+                                {"queued": True, "position": chunk["position"]},
+                                event="queued",
                             )
-                            yield f"data: {json.dumps({'error': f'Ollama error: {r.status_code} - {error_text}', 'done': True})}\n\n"
-                            return
-
-                        r.raise_for_status()
-                        for line in r.iter_lines():
-                            if line:
-                                try:
-                                    chunk = json.loads(line)
-                                    response_chunk = chunk.get("response", "")
-                                    full_response += response_chunk
-
-                                    # Check if this chunk includes context
-                                    if chunk.get("context"):
-                                        final_context = chunk.get("context")
-
-                                    yield f"data: {json.dumps({'chunk': response_chunk, 'done': chunk.get('done', False)})}\n\n"
-
-                                    if chunk.get("done", False):
-                                        # Create the LlamaResponse and add it to the chat window
-                                        llama_response = LlamaResponse.objects.create(
-                                            prompt=prompt,
-                                            response=full_response,
-                                            user=user,
-                                        )
-                                        chat_window.responses.add(llama_response)
-
-                                        # If we got a context back and context is active, store it
-                                        if (
-                                            is_context_active
-                                            and final_context
-                                            and chat_id
-                                        ):
-                                            ChatContext.objects.create(
-                                                chat_window_id=chat_id,
-                                                context_data=final_context,
-                                            )
-                                except json.JSONDecodeError as e:
-                                    print(
-                                        f"Error decoding JSON: {str(e)} for line: {line}"
-                                    )
-                                    # Don't break the stream for a single error
-                                    continue
+                            continue
+
+                        response_chunk = chunk.get("response", "")
+                        response_parts.append(response_chunk)
+
+                        # Check if this chunk includes context
+                        if chunk.get("context"):
+                            final_context = chunk.get("context")
+
+                        yield sse.frame(
+                            {"chunk": response_chunk, "done": chunk.get("done", False)}
+                        )
+
+                        if chunk.get("done", False):
+                            # Queue the LlamaResponse for the chat window (and
+                            # the context) without holding up the stream
+                            get_write_behind_queue().submit(
+                                Generation(
+                                    user_id=user.id,
+                                    prompt=prompt,
+                                    response="".join(response_parts),
+                                    chat_window_id=chat_window.id,
+                                    context=final_context if keep_context else None,
+                                )
+                            )
+                            if use_messages:
+                                conversation.schedule_summary(chat_window, turns, kept)
+                except QueueFull as e:
+                    yield sse.frame(
+                        {"error": str(e), "retry_after": e.retry_after, "done": True}
+                    )
+                except httpx.HTTPStatusError as e:
+                    error_text = e.response.text
+                    print(
+                        f"Ollama error: Status {e.response.status_code}, Response: {error_text}"
+                    )
+                    yield sse.frame(
+                        {
+                            "error": f"Ollama error: {e.response.status_code} - {error_text}",
+                            "done": True,
+                        }
+                    )
                 except Exception as e:
                     error_msg = str(e)
                     print(f"Stream error: {error_msg}")
-                    yield f"data: {json.dumps({'error': error_msg, 'done': True})}\n\n"
+                    yield sse.frame({"error": error_msg, "done": True})
+
+            # Take a place in the admission queue now, while a 503 can
+            # still be sent instead of an event stream
+            ticket = get_admission_controller().enter("generate_response", user.id)
 
             response = StreamingHttpResponse(
-                event_stream(), content_type="text/event-stream"
+                # The slot is given back however the stream ends
+                metrics.track_stream(
+                    "generate_response", event_stream(), on_close=ticket.release
+                ),
+                content_type="text/event-stream",
             )
             response["Cache-Control"] = "no-cache"
             response["X-Accel-Buffering"] = "no"
             return response
 
-    except requests.exceptions.HTTPError as e:
-        return Response(
+    except QueueFull as e:
+        return _busy_response(e)
+    except httpx.HTTPStatusError as e:
+        return JsonResponse(
             {"error": f"HTTP error: {str(e)} - {e.response.text}"},
             status=e.response.status_code,
         )
-    except requests.exceptions.ConnectionError:
-        return Response(
+    except httpx.ConnectError:
+        return JsonResponse(
             {"error": "Could not connect to Ollama server. Is it running?"}, status=503
         )
-    except requests.exceptions.Timeout:
-        return Response(
+    except httpx.TimeoutException:
+        return JsonResponse(
             {"error": "Request to Ollama timed out. Try again or increase timeout."},
             status=504,
         )
-    except requests.exceptions.RequestException as e:
-        return Response({"error": f"Failed to connect to Ollama: {str(e)}"}, status=500)
+    except httpx.HTTPError as e:
+        return JsonResponse(
+            {"error": f"Failed to connect to Ollama: {str(e)}"}, status=500
+        )
     except Exception as e:
-        return Response({"error": f"Unexpected error: {str(e)}"}, status=500)
+        return JsonResponse({"error": f"Unexpected error: {str(e)}"}, status=500)
 
 
 @api_view(["GET"])
@@ -268,7 +358,18 @@ def get_responses(request):
     except WingmanUsers.DoesNotExist:
         return Response({"error": "User not found"}, status=404)
 
-    responses = LlamaResponse.objects.filter(user=user).order_by("-created_at")
+    responses = LlamaResponse.objects.filter(user=user).only(
+        "id", "prompt", "response", "created_at", "user_id"
+    )
+    try:
+        responses, next_cursor, sync_cursor = paginate_keyset(
+            responses,
+            cursor=request.query_params.get("cursor"),
+            since=request.query_params.get("since"),
+            limit=parse_limit(request.query_params.get("limit")),
+        )
+    except PaginationError as e:
+        return Response({"error": str(e)}, status=400)
 
     data = [
         {
@@ -276,11 +377,13 @@ def get_responses(request):
             "prompt": response.prompt,
             "response": response.response,
             "created_at": response.created_at,
-            "user_id": response.user.id,
+            "user_id": response.user_id,
         }
         for response in responses
     ]
-    return Response(data)
+    return Response(
+        {"results": data, "next_cursor": next_cursor, "sync_cursor": sync_cursor}
+    )
 
 
 @api_view(["POST"])
@@ -385,13 +488,18 @@ def login_user(request):
         return Response({"error": str(e)}, status=500)
 
 
-@api_view(["POST"])
-def love_calculator(request):
-    name1 = request.data.get("name1", "")
-    name2 = request.data.get("name2", "")
+@csrf_exempt
+@require_POST
+async def love_calculator(request):
+    data = _parse_json_body(request)
+    if data is None:
+        return JsonResponse({"error": "Invalid JSON body"}, status=400)
+
+    name1 = data.get("name1", "")
+    name2 = data.get("name2", "")
 
     if not all([name1, name2]):
-        return Response({"error": "Both names are required"}, status=400)
+        return JsonResponse({"error": "Both names are required"}, status=400)
 
     try:
         # Better love calculator algorithm that supports Unicode characters
@@ -419,7 +527,7 @@ def love_calculator(request):
         for name in [name1, name2]:
             # Check if name contains only letter characters
             if not all(is_letter(c) or c.isspace() for c in name):
-                return Response(
+                return JsonResponse(
                     {"error": "Names must contain only letters and spaces"}, status=400
                 )
 
@@ -431,42 +539,16 @@ def love_calculator(request):
         # Ensure score is between 0-100
         love_score = (love_score * 7) % 101  # More random distribution
 
-        # Generate a message based on the score from ollama
-        payload = {
-            "model": "gemma3:4b-it-q4_K_M",
-            "prompt": f"Generate a message about their relationship based on the love score {love_score}.",
-            "system": """
-                    You are a love calculator. 
-                    Assume the score is between 0 and 100.
-                    The mesage should be based on the score.
-                    Don't use any boilerplate text, just the message.
-                    Don't use any emojis.
-                    Don't use any special characters.
-                    Use jock-like slang.
-                    Tell the user if he should go for it or not.
-                    If their score is low, tell them to move on and not waste their time.
-                    If their score is high, tell them to go for it.
-                    The message should be around 80 words.
-                 """
-            + f"The Name of the user is {name1} and the name of the love interest is {name2}."
-            + f"Use the score {love_score}% in the message.",
-            "temperature": 0.9,
-            "stream": False,
-            "context": [],
-        }
-        response = requests.post(
-            "http://localhost:11434/api/generate",
-            json=payload,
-            timeout=100,
-        )
-        response.raise_for_status()
-        data = response.json()
-        message = data.get("response", "")
+        # Serve a pre-generated message for this score; Ollama is only
+        # called when the pool for the score is still empty
+        message = await love_messages.get_message(love_score, name1, name2)
 
+    except QueueFull as e:
+        return _busy_response(e)
     except Exception as e:
-        return Response({"error": f"An error occurred: {str(e)}"}, status=500)
+        return JsonResponse({"error": f"An error occurred: {str(e)}"}, status=500)
 
-    return Response({"love_score": love_score, "message": message})
+    return JsonResponse({"love_score": love_score, "message": message})
 
 
 @api_view(["GET"])
@@ -496,17 +578,29 @@ def get_chat_history(request):
         if not chat:
             return Response({"error": "No chat history found"}, status=404)
 
-        responses = chat.responses.all().order_by("-created_at")
+        responses, next_cursor, sync_cursor = paginate_sequence(
+            chat.messages.only(
+                "id", "chat_window", "seq", "prompt", "response", "created_at"
+            ),
+            cursor=request.query_params.get("cursor"),
+            since=request.query_params.get("since"),
+            limit=parse_limit(request.query_params.get("limit")),
+        )
         data = [
             {
                 "id": response.id,
+                "seq": response.seq,
                 "prompt": response.prompt,
                 "response": response.response,
                 "created_at": response.created_at,
             }
             for response in responses
         ]
-        return Response(data)
+        return Response(
+            {"results": data, "next_cursor": next_cursor, "sync_cursor": sync_cursor}
+        )
+    except PaginationError as e:
+        return Response({"error": str(e)}, status=400)
     except WingmanUsers.DoesNotExist:
         return Response({"error": "User not found"}, status=404)
     except Exception as e:
@@ -515,6 +609,57 @@ def get_chat_history(request):
         )
 
 
+@api_view(["GET"])
+def search_responses(request):
+    """Full-text search over a user's prompts and responses, best match first"""
+    user_id = request.query_params.get("user_id")
+    chat_id = request.query_params.get("chat_id")  # Optionally one chat window
+    text = request.query_params.get("q", "").strip()
+    if not user_id:
+        return Response({"error": "User ID is required"}, status=400)
+    if not text:
+        return Response({"error": "Search query is required"}, status=400)
+
+    try:
+        user = WingmanUsers.objects.get(id=user_id)
+    except WingmanUsers.DoesNotExist:
+        return Response({"error": "User not found"}, status=404)
+
+    # websearch syntax: quoted phrases, "or" and -exclusions, never a syntax error
+    query = SearchQuery(
+        text, config=LlamaResponse.SEARCH_CONFIG, search_type="websearch"
+    )
+    responses = LlamaResponse.objects.filter(user=user, search_vector=query)
+    if chat_id:
+        responses = responses.filter(chat_window_id=chat_id)
+    # ts_rank is a float4; as a double it round-trips through the cursor's
+    # repr() exactly, so rows tied on rank still page by id
+    responses = responses.annotate(
+        rank=Cast(SearchRank(F("search_vector"), query), FloatField())
+    ).only("id", "prompt", "response", "created_at")
+
+    try:
+        responses, next_cursor = paginate_ranked(
+            responses,
+            cursor=request.query_params.get("cursor"),
+            limit=parse_limit(request.query_params.get("limit")),
+        )
+    except PaginationError as e:
+        return Response({"error": str(e)}, status=400)
+
+    data = [
+        {
+            "id": response.id,
+            "prompt": response.prompt,
+            "response": response.response,
+            "created_at": response.created_at,
+            "rank": response.rank,
+        }
+        for response in responses
+    ]
+    return Response({"results": data, "next_cursor": next_cursor})
+
+
 @api_view(["POST"])
 def create_chat_window(request):
     user_id = request.data.get("user_id")
@@ -574,28 +719,28 @@ def get_all_chat_windows(request):
 
     try:
         user = WingmanUsers.objects.get(id=user_id)
-        chat_windows = LlamaChatWindow.objects.filter(user=user).order_by("-created_at")
-
-        result = []
-        for chat in chat_windows:
-            latest_responses = chat.responses.all().order_by("-created_at")[
-                :5
-            ]  # Get last 5 responses
-            result.append(
-                {
-                    "id": chat.id,
-                    "created_at": chat.created_at,
-                    "responses": [
-                        {
-                            "id": response.id,
-                            "prompt": response.prompt,
-                            "response": response.response,
-                            "created_at": response.created_at,
-                        }
-                        for response in latest_responses
-                    ],
-                }
+        chat_windows = (
+            LlamaChatWindow.objects.filter(user=user)
+            .order_by("-created_at")
+            .only(
+                "id",
+                "created_at",
+                "message_count",
+                "last_activity_at",
+                "last_message_preview",
             )
+        )
+
+        result = [
+            {
+                "id": chat.id,
+                "created_at": chat.created_at,
+                "message_count": chat.message_count,
+                "last_activity_at": chat.last_activity_at,
+                "last_message_preview": chat.last_message_preview,
+            }
+            for chat in chat_windows
+        ]
 
         return Response(result)
     except WingmanUsers.DoesNotExist:
@@ -606,25 +751,30 @@ def get_all_chat_windows(request):
         )
 
 
-@api_view(["POST"])
-def tinder_replies(request):
+@csrf_exempt
+@require_POST
+async def tinder_replies(request):
     """Generate multiple reply options for a Tinder message"""
-    message = request.data.get("message", "")
-    intention = request.data.get("intention", "date")
-    style = request.data.get("style", "flirty")
-    user_id = request.data.get("user_id")
+    data = _parse_json_body(request)
+    if data is None:
+        return JsonResponse({"error": "Invalid JSON body"}, status=400)
+
+    message = data.get("message", "")
+    intention = data.get("intention", "date")
+    style = data.get("style", "flirty")
+    user_id = data.get("user_id")
 
     if not message:
-        return Response({"error": "Message is required"}, status=400)
+        return JsonResponse({"error": "Message is required"}, status=400)
     if not user_id:
-        return Response({"error": "User ID is required"}, status=400)
+        return JsonResponse({"error": "User ID is required"}, status=400)
 
     try:
-        user = WingmanUsers.objects.get(id=user_id)
+        user = await WingmanUsers.objects.aget(id=user_id)
     except WingmanUsers.DoesNotExist:
-        return Response({"error": "User not found"}, status=404)
+        return JsonResponse({"error": "User not found"}, status=404)
 
-    stream_response = request.data.get("stream", True)
+    stream_response = data.get("stream", True)
 
     # Create the system prompt based on intention and style
     system_prompt = f"""
@@ -655,111 +805,155 @@ def tinder_replies(request):
     """
 
     payload = {
-        "model": "gemma3:4b-it-q4_K_M",
         "prompt": f'This is the message I received on Tinder: "{message}"\n\nPlease generate 5 reply options following the format instructions.',
         "system": system_prompt,
-        "stream": stream_response,
         "options": {"temperature": 0.9, "num_gpu": 1, "low_vram": True},
     }
+    payload = routing.apply(payload, "tinder_replies")
+
+    ollama = get_ollama_client()
 
     try:
         if not stream_response:
             # Non-streaming request
-            response = requests.post(
-                "http://localhost:11434/api/generate",
-                json=payload,
-                timeout=100,
+            data = await ollama.generate(
+                payload, cache=True, endpoint="tinder_replies", user=user.id
             )
-            response.raise_for_status()
-
-            data = response.json()
             response_text = data.get("response", "")
+            reply_list = replies.parse(response_text)
 
             # Log this interaction
-            LlamaResponse.objects.create(
-                prompt=f"Tinder Reply: {message}", response=response_text, user=user
+            get_write_behind_queue().submit(
+                Generation(
+                    user_id=user.id,
+                    prompt=f"Tinder Reply: {message}",
+                    response=response_text,
+                    replies=reply_list,
+                )
             )
 
-            return Response({"response": response_text})
+            return JsonResponse({"response": response_text, "replies": reply_list})
         else:
             # Streaming request
-            def event_stream():
-                full_response = ""
+            async def event_stream():
+                response_parts = []
+                # Each reply goes out as a "reply" event as soon as the
+                # model has finished writing it
+                parser = replies.ReplyParser()
 
                 try:
-                    with requests.post(
-                        "http://localhost:11434/api/generate",
-                        json=payload,
-                        stream=True,
-                        timeout=100,
-                    ) as r:
-                        if not r.ok:
-                            error_text = r.text
-                            print(
-                                f"Ollama error: Status {r.status_code}, Response: {error_text}"
+                    async for chunk in sse.coalesce(
+                        ollama.stream_generate(
+                            payload,
+                            cache=True,
+                            ticket=ticket,
+                            endpoint="tinder_replies",
+                        ),
+                        **sse.coalesce_settings("tinder_replies"),
+                    ):
+                        if chunk.get("queued"):
+                            # Still waiting for a generation slot
+                            yield sse.frame(
+                                {"queued": True, "position": chunk["position"]},
+                                event="queued",
+                            )
+                            continue
+
+                        response_chunk = chunk.get("response", "")
+                        response_parts.append(response_chunk)
+                        is_done = chunk.get("done", False)
+
+                        completed = parser.feed(response_chunk)
+                        if is_done:
+                            completed += parser.close()
+                        first = len(parser.replies) - len(completed)
+                        for index, reply in enumerate(completed, start=first):
+                            yield sse.frame(
+                                {"index": index, "reply": reply}, event="reply"
                             )
-                            yield f"data: {json.dumps({'error': f'Ollama error: {r.status_code} - {error_text}', 'done': True})}\n\n"
-                            return
-
-                        r.raise_for_status()
-                        for line in r.iter_lines():
-                            if line:
-                                try:
-                                    chunk = json.loads(line)
-                                    response_chunk = chunk.get("response", "")
-                                    full_response += response_chunk
-
-                                    yield f"data: {json.dumps({'chunk': response_chunk, 'done': chunk.get('done', False)})}\n\n"
-
-                                    if chunk.get("done", False):
-                                        # Process the full response to ensure proper formatting if needed
-                                        processed_response = full_response
-
-                                        # Log this interaction once complete
-                                        LlamaResponse.objects.create(
-                                            prompt=f"Tinder Reply: {message}",
-                                            response=processed_response,
-                                            user=user,
-                                        )
-                                except json.JSONDecodeError as e:
-                                    print(
-                                        f"Error decoding JSON: {str(e)} for line: {line}"
-                                    )
-                                    continue
+
+                        frame = {"chunk": response_chunk, "done": is_done}
+                        if is_done:
+                            frame["replies"] = parser.replies
+                        yield sse.frame(frame)
+
+                        if is_done:
+                            # Process the full response to ensure proper formatting if needed
+                            processed_response = "".join(response_parts)
+
+                            # Log this interaction once complete
+                            get_write_behind_queue().submit(
+                                Generation(
+                                    user_id=user.id,
+                                    prompt=f"Tinder Reply: {message}",
+                                    response=processed_response,
+                                    replies=parser.replies,
+                                )
+                            )
+                except QueueFull as e:
+                    yield sse.frame(
+                        {"error": str(e), "retry_after": e.retry_after, "done": True}
+                    )
+                except httpx.HTTPStatusError as e:
+                    error_text = e.response.text
+                    print(
+                        f"Ollama error: Status {e.response.status_code}, Response: {error_text}"
+                    )
+                    yield sse.frame(
+                        {
+                            "error": f"Ollama error: {e.response.status_code} - {error_text}",
+                            "done": True,
+                        }
+                    )
                 except Exception as e:
                     error_msg = str(e)
                     print(f"Stream error: {error_msg}")
-                    yield f"data: {json.dumps({'error': error_msg, 'done': True})}\n\n"
+                    yield sse.frame({"error": error_msg, "done": True})
+
+            # Take a place in the admission queue now, while a 503 can
+            # still be sent instead of an event stream
+            ticket = get_admission_controller().enter("tinder_replies", user.id)
 
             response = StreamingHttpResponse(
-                event_stream(), content_type="text/event-stream"
+                # The slot is given back however the stream ends
+                metrics.track_stream(
+                    "tinder_replies", event_stream(), on_close=ticket.release
+                ),
+                content_type="text/event-stream",
             )
             response["Cache-Control"] = "no-cache"
             response["X-Accel-Buffering"] = "no"
             return response
 
+    except QueueFull as e:
+        return _busy_response(e)
     except Exception as e:
-        return Response({"error": f"An error occurred: {str(e)}"}, status=500)
+        return JsonResponse({"error": f"An error occurred: {str(e)}"}, status=500)
 
 
-@api_view(["POST", "PUT"])
-def tinder_description(request):
+@csrf_exempt
+@require_http_methods(["POST", "PUT"])
+async def tinder_description(request):
     """Generate or update a Tinder profile description"""
-    user_id = request.data.get("user_id")
-    user_basics = request.data.get("user_basics", {})
-    options = request.data.get("options", {})
-    current_description = request.data.get("current_description", "")
-    adjustments = request.data.get("adjustments", "")  # Get adjustments from request
+    data = _parse_json_body(request)
+    if data is None:
+        return JsonResponse({"error": "Invalid JSON body"}, status=400)
+
+    user_id = data.get("user_id")
+    user_basics = data.get("user_basics", {})
+    options = data.get("options", {})
+    current_description = data.get("current_description", "")
+    adjustments = data.get("adjustments", "")  # Get adjustments from request
 
     if not user_id:
-        return Response({"error": "User ID is required"}, status=400)
+        return JsonResponse({"error": "User ID is required"}, status=400)
     if not user_basics.get("age") or not user_basics.get("occupation"):
-        return Response({"error": "Age and occupation are required"}, status=400)
+        return JsonResponse({"error": "Age and occupation are required"}, status=400)
 
     try:
-        user = WingmanUsers.objects.get(id=user_id)
+        user = await WingmanUsers.objects.aget(id=user_id)
     except WingmanUsers.DoesNotExist:
-        return Response({"error": "User not found"}, status=404)
+        return JsonResponse({"error": "User not found"}, status=404)
 
     # Extract user basics
     age = user_basics.get("age", "")
@@ -845,22 +1039,16 @@ def tinder_description(request):
 
     # Prepare the payload
     payload = {
-        "model": "gemma3:4b-it-q4_K_M",
         "prompt": prompt,
         "system": system_prompt,
-        "stream": False,
         "options": {"temperature": 0.7, "num_gpu": 1, "low_vram": True},
     }
+    payload = routing.apply(payload, "tinder_description")
 
     try:
-        response = requests.post(
-            "http://localhost:11434/api/generate",
-            json=payload,
-            timeout=100,
+        data = await get_ollama_client().generate(
+            payload, cache=True, endpoint="tinder_description", user=user.id
         )
-        response.raise_for_status()
-
-        data = response.json()
         description = data.get("response", "")
 
         # Store this as a specialized response type
@@ -875,15 +1063,19 @@ def tinder_description(request):
         if adjustments.strip():
             prompt_with_adjustments += f" [Adjustments: {adjustments}]"
 
-        LlamaResponse.objects.create(
-            prompt=f"{description_type}: {prompt_with_adjustments}",
-            response=description,
-            user=user,
+        get_write_behind_queue().submit(
+            Generation(
+                user_id=user.id,
+                prompt=f"{description_type}: {prompt_with_adjustments}",
+                response=description,
+            )
         )
 
-        return Response({"description": description})
+        return JsonResponse({"description": description})
+    except QueueFull as e:
+        return _busy_response(e)
     except Exception as e:
-        return Response({"error": f"An error occurred: {str(e)}"}, status=500)
+        return JsonResponse({"error": f"An error occurred: {str(e)}"}, status=500)
 
 
 @api_view(["PUT"])
@@ -931,3 +1123,17 @@ def update_user(request):
         return Response({"error": "User not found"}, status=404)
     except Exception as e:
         return Response({"error": str(e)}, status=500)
+
+
+@require_GET
+def metrics_view(request):
+    """Prometheus scrape endpoint for this process's LLM and request metrics."""
+    return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE_LATEST)
+
+
+@require_GET
+async def readiness_view(request):
+    """Readiness probe: 200 once a healthy Ollama backend has every configured
+    model loaded, 503 (with what is missing where) until then."""
+    report = await warmup.readiness()
+    return JsonResponse(report, status=200 if report["ready"] else 503)
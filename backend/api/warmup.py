@@ -0,0 +1,147 @@
+# Keep the configured models loaded on every Ollama backend. Ollama unloads a
+# model keep_alive after its last request, and the next request then pays the
+# whole load time. Preloading at startup and refreshing on a timer avoids
+# that, and readiness() reports whether the models really are resident.
+import asyncio
+import threading
+
+import httpx
+from django.conf import settings
+
+from . import codec
+from .backends import get_backend_pool
+
+
+def canonical_model(name):
+    # Ollama reports "gemma3" as "gemma3:latest"
+    return name if ":" in name else f"{name}:latest"
+
+
+async def preload(client, backend, model, keep_alive):
+    """Load ``model`` on ``backend``, or push back its unload, without
+    generating anything."""
+    response = await client.post(
+        f"{backend.url}/api/generate", json={"model": model, "keep_alive": keep_alive}
+    )
+    response.raise_for_status()
+
+
+async def warm(pool=None, models=None, keep_alive=None):
+    """Preload ``models`` on every backend of ``pool`` at once.
+
+    Returns the failures as ``{(url, model): exception}``.
+    """
+    pool = pool or get_backend_pool()
+    models = models or settings.OLLAMA_PRELOAD_MODELS
+    keep_alive = settings.OLLAMA_KEEP_ALIVE if keep_alive is None else keep_alive
+
+    pairs = [(backend, model) for backend in pool.backends for model in models]
+    # A cold load can take as long as a generation
+    timeout = httpx.Timeout(
+        settings.OLLAMA_TIMEOUT, connect=settings.OLLAMA_CONNECT_TIMEOUT
+    )
+    async with httpx.AsyncClient(timeout=timeout) as client:
+        results = await asyncio.gather(
+            *(preload(client, b, m, keep_alive) for b, m in pairs),
+            return_exceptions=True,
+        )
+
+    failures = {}
+    for (backend, model), result in zip(pairs, results):
+        if isinstance(result, Exception):
+            print(f"Could not preload {model} on {backend.url}: {result!r}")
+            failures[(backend.url, model)] = result
+    return failures
+
+
+async def resident_models(client, backend):
+    """Names of the models ``backend`` has in memory right now."""
+    response = await client.get(f"{backend.url}/api/ps")
+    response.raise_for_status()
+    return {
+        canonical_model(m.get("name") or m.get("model", ""))
+        for m in codec.loads(response.content).get("models", [])
+    }
+
+
+async def readiness(pool=None, models=None):
+    """Report which of ``models`` each backend has loaded.
+
+    Ready means at least one healthy backend has all of them, so a request
+    can be served without waiting for a model load.
+    """
+    pool = pool or get_backend_pool()
+    models = [canonical_model(m) for m in models or settings.OLLAMA_PRELOAD_MODELS]
+
+    async with httpx.AsyncClient(timeout=pool.health_timeout) as client:
+        results = await asyncio.gather(
+            *(resident_models(client, backend) for backend in pool.backends),
+            return_exceptions=True,
+        )
+
+    backends = []
+    for backend, result in zip(pool.backends, results):
+        if isinstance(result, Exception):
+            backends.append(
+                {
+                    "url": backend.url,
+                    "ready": False,
+                    "missing": models,
+                    "error": repr(result),
+                }
+            )
+            continue
+        missing = [m for m in models if m not in result]
+        backends.append(
+            {
+                "url": backend.url,
+                "ready": backend.healthy and not missing,
+                "resident": sorted(result),
+                "missing": missing,
+            }
+        )
+    return {
+        "ready": any(b["ready"] for b in backends),
+        "models": models,
+        "backends": backends,
+    }
+
+
+class KeepWarm:
+    """Preload the models now and again every ``interval`` seconds.
+
+    Runs on its own thread and event loop rather than piggybacking on
+    traffic, because the point is to cover the quiet periods.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="keep-warm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                asyncio.run(warm())
+            except Exception as e:
+                print(f"Keep-warm round failed: {str(e)}")
+            self._stop.wait(self.interval)
+
+
+_keep_warm = None
+
+
+def start_keep_warm():
+    """Start the process-wide KeepWarm thread, unless disabled in settings."""
+    global _keep_warm
+    if _keep_warm is None and settings.OLLAMA_KEEP_WARM_INTERVAL > 0:
+        _keep_warm = KeepWarm(settings.OLLAMA_KEEP_WARM_INTERVAL).start()
+    return _keep_warm
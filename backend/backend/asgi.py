@@ -2,6 +2,8 @@
 ASGI config for backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with ``uvicorn backend.asgi:application`` so the async streaming views
+in ``api.views`` run natively on the event loop.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
@@ -14,3 +16,13 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
 
 application = get_asgi_application()
+
+# Load the models before the first request needs them, and keep them loaded
+from api.warmup import start_keep_warm  # noqa: E402
+
+start_keep_warm()
+
+# Probe the Ollama servers on a timer, not only when requests come in
+from api.backends import start_health_checks  # noqa: E402
+
+start_health_checks()
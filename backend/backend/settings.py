@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +42,14 @@ INSTALLED_APPS = [
     "api",  # Add this if missing
 ]
 
+REST_FRAMEWORK = {
+    # Same output as DRF's JSONRenderer, encoded with orjson when installed
+    "DEFAULT_RENDERER_CLASSES": [
+        "api.renderers.CodecJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+}
+
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
@@ -50,6 +59,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "api.metrics.MetricsMiddleware",
 ]
 
 CORS_ALLOW_ALL_ORIGINS = True
@@ -134,6 +144,192 @@ USE_I18N = True
 USE_TZ = True
 
 
+# Ollama
+# Every generation goes through api.ollama.OllamaClient, which pools
+# keep-alive connections and balances them across OLLAMA_BACKENDS, a
+# comma-separated list of servers (defaults to just OLLAMA_BASE_URL). The
+# turns of a chat stick to one server for as long as it stays healthy.
+
+OLLAMA_BASE_URL = os.environ.get("OLLAMA_BASE_URL", "http://localhost:11434")
+OLLAMA_BACKENDS = [
+    url.strip()
+    for url in os.environ.get("OLLAMA_BACKENDS", OLLAMA_BASE_URL).split(",")
+    if url.strip()
+]
+# Health checks: probe every backend this often (from a background thread
+# under ASGI), and eject one after this many consecutive failures until a
+# probe succeeds again
+OLLAMA_HEALTH_INTERVAL = float(os.environ.get("OLLAMA_HEALTH_INTERVAL", 10))
+OLLAMA_HEALTH_TIMEOUT = float(os.environ.get("OLLAMA_HEALTH_TIMEOUT", 2))
+OLLAMA_MAX_FAILURES = int(os.environ.get("OLLAMA_MAX_FAILURES", 3))
+OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "gemma3:4b-it-q4_K_M")
+OLLAMA_TIMEOUT = float(os.environ.get("OLLAMA_TIMEOUT", 100))  # seconds
+OLLAMA_CONNECT_TIMEOUT = float(os.environ.get("OLLAMA_CONNECT_TIMEOUT", 5))
+OLLAMA_MAX_CONNECTIONS = int(os.environ.get("OLLAMA_MAX_CONNECTIONS", 100))
+OLLAMA_MAX_KEEPALIVE_CONNECTIONS = int(
+    os.environ.get("OLLAMA_MAX_KEEPALIVE_CONNECTIONS", 20)
+)
+OLLAMA_RETRIES = int(os.environ.get("OLLAMA_RETRIES", 2))  # connect retries
+
+# Admission control: generations running at once per process, how many more
+# may wait for a slot, and how long they may wait before giving up. Requests
+# beyond the queue get an immediate 503 with Retry-After.
+OLLAMA_MAX_CONCURRENCY = int(os.environ.get("OLLAMA_MAX_CONCURRENCY", 4))
+OLLAMA_MAX_QUEUE = int(os.environ.get("OLLAMA_MAX_QUEUE", 32))
+OLLAMA_QUEUE_TIMEOUT = float(os.environ.get("OLLAMA_QUEUE_TIMEOUT", 60))  # seconds
+OLLAMA_MAX_QUEUE_PER_USER = int(os.environ.get("OLLAMA_MAX_QUEUE_PER_USER", 4))
+
+# Priority scheduling: free slots are shared between classes in proportion to
+# their weight, and a class never holds more than max_share of the slots, so
+# batch-style generations can't starve interactive chat.
+OLLAMA_PRIORITY_CLASSES = {
+    "interactive": {
+        "weight": int(os.environ.get("OLLAMA_INTERACTIVE_WEIGHT", 4)),
+        "max_share": 1.0,
+    },
+    "batch": {
+        "weight": int(os.environ.get("OLLAMA_BATCH_WEIGHT", 1)),
+        "max_share": float(os.environ.get("OLLAMA_BATCH_MAX_SHARE", 0.5)),
+    },
+}
+OLLAMA_DEFAULT_PRIORITY = "interactive"
+OLLAMA_ENDPOINT_PRIORITY = {
+    "generate_response": "interactive",
+    "tinder_replies": "interactive",
+    "tinder_description": "batch",
+    "love_calculator": "batch",
+    "chat_summary": "batch",
+}
+
+
+# Model routing
+# The model and option overrides each endpoint runs with (see api.routing),
+# layered over "default"; "modes" override a route again per chat mode, e.g.
+# "generate_response": {"modes": {"expert": {"options": {"temperature": 0.6}}}}.
+# The short love calculator messages, Tinder replies and chat summaries run on
+# OLLAMA_LIGHT_MODEL. A mode that changes the model only carries a chat's
+# history over with CHAT_HISTORY_MODE "messages"; a context from one model
+# means nothing to another.
+
+OLLAMA_LIGHT_MODEL = os.environ.get("OLLAMA_LIGHT_MODEL", "gemma3:1b")
+OLLAMA_MODEL_ROUTES = {
+    "default": {"model": OLLAMA_MODEL},
+    "generate_response": {"modes": {}},
+    "tinder_replies": {"model": OLLAMA_LIGHT_MODEL},
+    "love_calculator": {"model": OLLAMA_LIGHT_MODEL},
+    "chat_summary": {"model": OLLAMA_LIGHT_MODEL},
+}
+OLLAMA_ROUTED_MODELS = list(
+    dict.fromkeys(
+        layer["model"]
+        for route in OLLAMA_MODEL_ROUTES.values()
+        for layer in [route, *route.get("modes", {}).values()]
+        if "model" in layer
+    )
+)
+
+
+# Model warm-up
+# Ollama unloads a model OLLAMA_KEEP_ALIVE after its last request (sent with
+# every call; "-1" keeps it loaded for good). The ASGI app preloads
+# OLLAMA_PRELOAD_MODELS (every routed model unless set) on every backend at
+# startup and again every OLLAMA_KEEP_WARM_INTERVAL seconds (0 turns this
+# off), and /api/ready/ is 200 only once a healthy backend has all of them
+# loaded.
+
+OLLAMA_KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_PRELOAD_MODELS = [
+    model.strip()
+    for model in os.environ.get(
+        "OLLAMA_PRELOAD_MODELS", ",".join(OLLAMA_ROUTED_MODELS)
+    ).split(",")
+    if model.strip()
+]
+OLLAMA_KEEP_WARM_INTERVAL = float(os.environ.get("OLLAMA_KEEP_WARM_INTERVAL", 600))
+
+
+# Caches
+# The "llm" cache holds finished generations of the stateless endpoints
+# (tinder_replies, tinder_description), keyed on the normalized Ollama
+# payload. LocMemCache evicts least recently used entries past MAX_ENTRIES.
+
+LLM_CACHE_ALIAS = "llm"
+LLM_CACHE_MAX_ENTRY_BYTES = int(os.environ.get("LLM_CACHE_MAX_ENTRY_BYTES", 16384))
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    LLM_CACHE_ALIAS: {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "llm-responses",
+        "TIMEOUT": int(os.environ.get("LLM_CACHE_TTL", 3600)),  # seconds
+        "OPTIONS": {
+            "MAX_ENTRIES": int(os.environ.get("LLM_CACHE_MAX_ENTRIES", 2000)),
+        },
+    },
+}
+
+
+# Chat contexts
+# Only the latest context of a chat window is ever sent back to Ollama.
+# ChatContext keeps this many per window (plus the rows needed to decode
+# them); older ones are pruned as new keyframes are written.
+
+CHAT_CONTEXT_RETENTION = int(os.environ.get("CHAT_CONTEXT_RETENTION", 1))
+
+
+# Chat history
+# With context active, "messages" sends a chat to Ollama's /api/chat as its
+# rolling summary plus the newest turns that fit in CHAT_TOKEN_BUDGET tokens,
+# so a turn costs the same however long the chat is; turns that no longer fit
+# are folded into the summary in the background. "context" sends the token
+# array of the previous turn to /api/generate instead, which grows forever.
+
+CHAT_HISTORY_MODE = os.environ.get("CHAT_HISTORY_MODE", "messages")
+CHAT_TOKEN_BUDGET = int(os.environ.get("CHAT_TOKEN_BUDGET", 3072))
+CHAT_NUM_CTX = int(os.environ.get("CHAT_NUM_CTX", 4096))  # model window per turn
+CHAT_MAX_TURNS = int(os.environ.get("CHAT_MAX_TURNS", 40))  # turns read per request
+CHAT_SUMMARY_TOKENS = int(os.environ.get("CHAT_SUMMARY_TOKENS", 256))
+
+
+# Love calculator
+# Messages come from a pool filled by `manage.py generate_love_messages`.
+# Each process caches a score's pool for this many seconds.
+
+LOVE_MESSAGE_POOL_TTL = int(os.environ.get("LOVE_MESSAGE_POOL_TTL", 300))
+
+
+# JSON codec
+# "auto" uses orjson when it is installed and the stdlib json module otherwise;
+# "orjson" or "stdlib" force one.
+
+JSON_CODEC = os.environ.get("JSON_CODEC", "auto")
+
+
+# SSE streams
+# Tokens are batched into one frame per `window` seconds or `max_bytes` of
+# text, whichever comes first (the first token and `done` go out at once).
+# A window of 0 sends every token as its own frame.
+
+SSE_COALESCE = {
+    "default": {
+        "window": float(os.environ.get("SSE_COALESCE_WINDOW", 0.03)),  # seconds
+        "max_bytes": int(os.environ.get("SSE_COALESCE_MAX_BYTES", 256)),
+    },
+    # Replies are read as a list, so they can be batched a little harder
+    "tinder_replies": {"window": 0.05, "max_bytes": 512},
+}
+
+
+# Write-behind persistence
+# Finished generations are written from a background thread in batches of up
+# to WRITE_BEHIND_BATCH_SIZE, at least every WRITE_BEHIND_FLUSH_INTERVAL seconds.
+
+WRITE_BEHIND_BATCH_SIZE = int(os.environ.get("WRITE_BEHIND_BATCH_SIZE", 100))
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.environ.get("WRITE_BEHIND_FLUSH_INTERVAL", 0.2))
+
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.1/howto/static-files/
 
@@ -26,10 +26,13 @@ urlpatterns = [
     path("api/login_user/", login_user),
     path("api/love_calculator/", love_calculator),
     path("api/chat_history/", get_chat_history),
+    path("api/search/", search_responses),
     path("api/chat_windows/", get_all_chat_windows),
     path("api/chat_windows/create/", create_chat_window),
     path("api/chat_windows/<int:chat_id>/delete/", delete_chat_window),
     path("api/tinder_replies/", tinder_replies),
     path("api/tinder_description/", tinder_description),  # Add new endpoint
     path("api/update_user/", update_user),
+    path("api/metrics/", metrics_view),
+    path("api/ready/", readiness_view),
 ]
@@ -302,8 +302,8 @@ export default function Home() {
                     <div className="h-full bg-white dark:bg-zinc-900 shadow-md overflow-hidden flex flex-col">
                         <div className="flex justify-between items-center p-4 border-b border-zinc-200 dark:border-zinc-800">
                             <h1 className="text-xl font-bold text-zinc-800 dark:text-zinc-100">
-                                {activeChatData && activeChatData.responses && activeChatData.responses.length > 0
-                                    ? `Chat: ${activeChatData.responses[0].prompt.substring(0, 40)}...`
+                                {activeChatData && activeChatData.last_message_preview
+                                    ? `Chat: ${activeChatData.last_message_preview.substring(0, 40)}...`
                                     : "New Chat"}
                             </h1>
 
@@ -1,7 +1,7 @@
 "use client";
 
 import { useState, useRef, useEffect } from "react";
-import { streamGenerateResponse, getChatHistory, getAllChatWindows } from "@/services/api";
+import { streamGenerateResponse, getChatHistory, getAllChatWindows, ResponseData } from "@/services/api";
 import { SendIcon } from "lucide-react";
 import ReactMarkdown from "react-markdown";
 import rehypeSanitize from "rehype-sanitize";
@@ -13,6 +13,8 @@ interface Message {
     role: "user" | "assistant";
     content: string;
     timestamp: Date;
+    // Position in the chat once the message is stored; unset for one just sent
+    seq?: number;
 }
 
 // Update props interface - can keep onChatModeSelect for future use if needed
@@ -44,12 +46,46 @@ export default function ReplyHelp({
     const currentChatIdRef = useRef<number | null | undefined>(chatId);
     // Track if we've loaded history for this chat
     const hasLoadedHistoryRef = useRef<boolean>(false);
+    // Cursors for the page of history before the loaded one, and for
+    // fetching only the messages added since the last load
+    const nextCursorRef = useRef<string | null>(null);
+    const syncCursorRef = useRef<string | null>(null);
+    const [hasOlderMessages, setHasOlderMessages] = useState(false);
+    const [isLoadingOlder, setIsLoadingOlder] = useState(false);
+    // Earlier messages are added above the visible ones, so don't scroll down
+    const keepScrollRef = useRef<boolean>(false);
 
     // Simple function to check if a chat ID is valid
     const isValidChatId = (id: any): boolean => {
         return id !== null && id !== undefined && typeof id === "number" && !isNaN(id);
     };
 
+    // Turn stored responses into chat messages, oldest first
+    const toMessages = (history: ResponseData[]): Message[] => {
+        const formattedMessages: Message[] = [];
+
+        for (const msg of [...history].sort((a, b) => (a.seq ?? 0) - (b.seq ?? 0))) {
+            if (msg && msg.prompt && msg.created_at) {
+                formattedMessages.push({
+                    role: "user",
+                    content: msg.prompt,
+                    timestamp: new Date(msg.created_at),
+                    seq: msg.seq,
+                });
+
+                if (msg.response) {
+                    formattedMessages.push({
+                        role: "assistant",
+                        content: msg.response,
+                        timestamp: new Date(msg.created_at),
+                        seq: msg.seq,
+                    });
+                }
+            }
+        }
+        return formattedMessages;
+    };
+
     // Function to load chat history - extracted outside useEffect
     const loadChatHistory = async (id: number) => {
         // Skip if already loading or invalid ID
@@ -65,36 +101,17 @@ export default function ReplyHelp({
             // Clear messages to show loading state
             setMessages([]);
 
-            const history = await getChatHistory(userId, id);
+            // The newest page; older pages are loaded on request
+            const page = await getChatHistory(userId, id);
 
             // Component might have unmounted or chat changed during the async call
             // Only proceed if we're still on the same chat
             if (currentChatIdRef.current !== id) return;
 
-            if (history && Array.isArray(history)) {
-                const formattedMessages: Message[] = [];
-
-                for (const msg of history) {
-                    if (msg && msg.prompt && msg.created_at) {
-                        formattedMessages.push({
-                            role: "user",
-                            content: msg.prompt,
-                            timestamp: new Date(msg.created_at),
-                        });
-
-                        if (msg.response) {
-                            formattedMessages.push({
-                                role: "assistant",
-                                content: msg.response,
-                                timestamp: new Date(msg.created_at),
-                            });
-                        }
-                    }
-                }
-
-                formattedMessages.sort((a, b) => a.timestamp.getTime() - b.timestamp.getTime());
-                setMessages(formattedMessages);
-            }
+            nextCursorRef.current = page.next_cursor;
+            syncCursorRef.current = page.sync_cursor;
+            setHasOlderMessages(Boolean(page.next_cursor));
+            setMessages(toMessages(page.results));
 
             // Mark as loaded for this chat ID
             hasLoadedHistoryRef.current = true;
@@ -107,6 +124,80 @@ export default function ReplyHelp({
         }
     };
 
+    // Load the page of history before the oldest loaded message
+    const loadOlderMessages = async () => {
+        const id = currentChatIdRef.current;
+        const cursor = nextCursorRef.current;
+        const userId = localStorage.getItem("wingmanUserId");
+        if (isLoadingOlder || !cursor || !userId || !isValidChatId(id)) return;
+
+        try {
+            setIsLoadingOlder(true);
+            const page = await getChatHistory(userId, id, null, cursor);
+            if (currentChatIdRef.current !== id) return;
+
+            nextCursorRef.current = page.next_cursor;
+            setHasOlderMessages(Boolean(page.next_cursor));
+            keepScrollRef.current = true;
+            setMessages((prev) => [...toMessages(page.results), ...prev]);
+        } catch (error) {
+            console.error(`Failed to load earlier messages for chat ID ${id}:`, error);
+        } finally {
+            setIsLoadingOlder(false);
+        }
+    };
+
+    // Fetch the messages stored since the last load, e.g. sent from another tab
+    const syncChatHistory = async (id: number) => {
+        const userId = localStorage.getItem("wingmanUserId");
+        if (!userId || !hasLoadedHistoryRef.current) return;
+
+        try {
+            const fresh: ResponseData[] = [];
+            if (!syncCursorRef.current) {
+                // Nothing was stored when the chat was loaded: start from its newest page
+                const page = await getChatHistory(userId, id);
+                if (currentChatIdRef.current !== id) return;
+                fresh.push(...page.results);
+                nextCursorRef.current = page.next_cursor;
+                syncCursorRef.current = page.sync_cursor;
+                setHasOlderMessages(Boolean(page.next_cursor));
+            } else {
+                let page;
+                do {
+                    page = await getChatHistory(userId, id, syncCursorRef.current);
+                    if (currentChatIdRef.current !== id) return;
+                    fresh.push(...page.results);
+                    syncCursorRef.current = page.sync_cursor ?? syncCursorRef.current;
+                } while (page.next_cursor);
+            }
+
+            if (fresh.length === 0) return;
+            setMessages((prev) => {
+                const known = new Set(prev.filter((m) => m.seq !== undefined).map((m) => m.seq));
+                const added = toMessages(fresh.filter((r) => !known.has(r.seq)));
+                // Messages sent from here are shown before they are stored; drop those copies
+                const stored = new Set(added.map((m) => `${m.role}:${m.content}`));
+                const kept = prev.filter((m) => m.seq !== undefined || !stored.has(`${m.role}:${m.content}`));
+                return [...kept, ...added];
+            });
+        } catch (error) {
+            console.error(`Failed to sync chat history for chat ID ${id}:`, error);
+        }
+    };
+
+    // Pick up new messages whenever the window comes back into focus
+    useEffect(() => {
+        const onFocus = () => {
+            const id = currentChatIdRef.current;
+            if (isValidChatId(id) && !isGenerating) {
+                syncChatHistory(id as number);
+            }
+        };
+        window.addEventListener("focus", onFocus);
+        return () => window.removeEventListener("focus", onFocus);
+    }, [isGenerating]);
+
     // Handle chat ID changes without infinite loops
     useEffect(() => {
         // Update the ref with current chat ID
@@ -116,6 +207,9 @@ export default function ReplyHelp({
         // If chat ID changed, reset loaded state
         if (prevChatId !== chatId) {
             hasLoadedHistoryRef.current = false;
+            nextCursorRef.current = null;
+            syncCursorRef.current = null;
+            setHasOlderMessages(false);
             // Clear messages if there's no valid chat ID
             if (!isValidChatId(chatId)) {
                 setMessages([]);
@@ -148,6 +242,10 @@ export default function ReplyHelp({
 
     // Scroll to bottom whenever messages change
     useEffect(() => {
+        if (keepScrollRef.current) {
+            keepScrollRef.current = false;
+            return;
+        }
         messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
     }, [messages, currentResponse]);
 
@@ -258,6 +356,19 @@ export default function ReplyHelp({
 
             {/* Chat messages area */}
             <div ref={chatContainerRef} className="flex-1 overflow-y-auto p-4 space-y-4">
+                {/* Longer chats are loaded a page at a time, newest first */}
+                {chatId && !isLoadingHistory && hasOlderMessages && (
+                    <div className="text-center">
+                        <button
+                            type="button"
+                            onClick={loadOlderMessages}
+                            disabled={isLoadingOlder}
+                            className="text-sm text-blue-500 hover:underline disabled:opacity-50"
+                        >
+                            {isLoadingOlder ? "Loading earlier messages..." : "Load earlier messages"}
+                        </button>
+                    </div>
+                )}
                 {!chatId ? (
                     <div className="text-center text-zinc-500 dark:text-zinc-400 my-8">
                         <p className="mb-2">No active chat selected.</p>
@@ -304,54 +304,19 @@ export function Sidebar({
                             let chatTitle = `Chat ${index + 1}`;
                             let latestTime = null;
 
-                            if (chat && chat.responses && Array.isArray(chat.responses) && chat.responses.length > 0) {
-                                try {
-                                    // Create a shallow copy of the responses array to avoid mutation issues
-                                    const responsesCopy = chat.responses.slice();
-
-                                    // Sort responses by date (newest first) with additional error checks
-                                    const sortedResponses = responsesCopy.sort(
-                                        (
-                                            a: { created_at: string | number | Date },
-                                            b: { created_at: string | number | Date }
-                                        ) => {
-                                            try {
-                                                const dateA = a && a.created_at ? new Date(a.created_at).getTime() : 0;
-                                                const dateB = b && b.created_at ? new Date(b.created_at).getTime() : 0;
-                                                return dateB - dateA;
-                                            } catch (err) {
-                                                // If date parsing fails, maintain original order
-                                                return 0;
-                                            }
-                                        }
-                                    );
-
-                                    // Use the latest prompt as the title with additional null checks
-                                    const latestResponse = sortedResponses[0];
-                                    if (latestResponse && typeof latestResponse === "object" && latestResponse.prompt) {
-                                        chatTitle =
-                                            typeof latestResponse.prompt === "string"
-                                                ? latestResponse.prompt.length > 25
-                                                    ? latestResponse.prompt.substring(0, 25) + "..."
-                                                    : latestResponse.prompt
-                                                : `Chat ${index + 1}`;
-
-                                        // Only create Date object if created_at is valid
-                                        if (latestResponse.created_at) {
-                                            try {
-                                                latestTime = new Date(latestResponse.created_at);
-                                                // Verify the date is valid
-                                                if (isNaN(latestTime.getTime())) {
-                                                    latestTime = null;
-                                                }
-                                            } catch (e) {
-                                                latestTime = null;
-                                            }
-                                        }
-                                    }
-                                } catch (error) {
-                                    console.error("Error processing chat responses:", error);
-                                    // Fallback to default title if there's an error
+                            // The backend keeps a summary of the latest message on each window
+                            if (chat && chat.last_message_preview) {
+                                chatTitle =
+                                    chat.last_message_preview.length > 25
+                                        ? chat.last_message_preview.substring(0, 25) + "..."
+                                        : chat.last_message_preview;
+                            }
+
+                            if (chat && chat.last_activity_at) {
+                                latestTime = new Date(chat.last_activity_at);
+                                // Verify the date is valid
+                                if (isNaN(latestTime.getTime())) {
+                                    latestTime = null;
                                 }
                             }
 
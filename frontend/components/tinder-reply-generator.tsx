@@ -86,18 +86,18 @@ export default function TinderReplyGenerator() {
                     const progress = Math.min(Math.floor((accumulatedText.length / 500) * 100), 99);
                     setGenerationProgress(progress);
                 },
-                () => {
-                    // When streaming is complete, parse the replies from the accumulated text
+                (replies) => {
+                    // When streaming is complete, use the replies the server parsed
                     setCurrentStreamingText("");
                     setGenerationProgress(100);
 
-                    // Try to extract numbered replies from the text
-                    const replyList: string[] = [];
+                    const replyList: string[] = replies ? [...replies] : [];
+                    const parsedByServer = replyList.length > 0;
 
-                    // First try to match numbered patterns like "1. Reply" or "1) Reply"
+                    // Otherwise try to match numbered patterns like "1. Reply" or "1) Reply"
                     const numberedPattern = /(\d+[\.\)]\s*)([^\d\.\)].+?)(?=\s*\d+[\.\)]|$)/g;
                     let match;
-                    while ((match = numberedPattern.exec(accumulatedText)) !== null) {
+                    while (!parsedByServer && (match = numberedPattern.exec(accumulatedText)) !== null) {
                         if (match[2] && match[2].trim()) {
                             replyList.push(match[2].trim());
                         }
@@ -141,6 +141,12 @@ export default function TinderReplyGenerator() {
                     );
 
                     setIsGenerating(false);
+                },
+                (index, reply) => {
+                    // Show each reply as soon as the server has it
+                    setReplyOptions((options) =>
+                        options.map((option, i) => (i === index ? { content: reply, copied: false } : option))
+                    );
                 }
             );
         } catch (error) {
@@ -300,7 +306,7 @@ export default function TinderReplyGenerator() {
                     </div>
                 )}
 
-                {replyOptions.length > 0 && !replyOptions[0].isPlaceholder && (
+                {replyOptions.some((option) => !option.isPlaceholder) && (
                     <div className="bg-white dark:bg-zinc-800 rounded-lg p-6 shadow">
                         <div className="flex justify-between items-center mb-4">
                             <h2 className="text-lg font-semibold text-zinc-800 dark:text-zinc-200">Reply Options</h2>
@@ -308,22 +314,31 @@ export default function TinderReplyGenerator() {
                         </div>
 
                         <div className="space-y-3">
-                            {replyOptions.map((option, index) => (
-                                <div
-                                    key={index}
-                                    className="bg-zinc-50 dark:bg-zinc-900 rounded-md p-4 border border-zinc-200 dark:border-zinc-700 relative group hover:border-purple-300 dark:hover:border-purple-700 transition-colors cursor-pointer"
-                                    onClick={() => copyToClipboard(index)}
-                                >
-                                    <div className="pr-8 text-zinc-800 dark:text-zinc-200">{option.content}</div>
-                                    <div className="absolute top-4 right-4 text-zinc-400 group-hover:text-purple-500 dark:text-zinc-500 dark:group-hover:text-purple-400">
-                                        {option.copied ? (
-                                            <Check className="h-5 w-5 text-green-500" />
-                                        ) : (
-                                            <Copy className="h-5 w-5" />
-                                        )}
+                            {replyOptions.map((option, index) =>
+                                option.isPlaceholder ? (
+                                    <div
+                                        key={index}
+                                        className="bg-zinc-50 dark:bg-zinc-900 rounded-md p-4 border border-zinc-200 dark:border-zinc-700 animate-pulse"
+                                    >
+                                        <div className="h-6 bg-zinc-200 dark:bg-zinc-700 rounded w-3/4"></div>
                                     </div>
-                                </div>
-                            ))}
+                                ) : (
+                                    <div
+                                        key={index}
+                                        className="bg-zinc-50 dark:bg-zinc-900 rounded-md p-4 border border-zinc-200 dark:border-zinc-700 relative group hover:border-purple-300 dark:hover:border-purple-700 transition-colors cursor-pointer"
+                                        onClick={() => copyToClipboard(index)}
+                                    >
+                                        <div className="pr-8 text-zinc-800 dark:text-zinc-200">{option.content}</div>
+                                        <div className="absolute top-4 right-4 text-zinc-400 group-hover:text-purple-500 dark:text-zinc-500 dark:group-hover:text-purple-400">
+                                            {option.copied ? (
+                                                <Check className="h-5 w-5 text-green-500" />
+                                            ) : (
+                                                <Copy className="h-5 w-5" />
+                                            )}
+                                        </div>
+                                    </div>
+                                )
+                            )}
                         </div>
 
                         <div className="mt-4 text-sm text-zinc-500 dark:text-zinc-400">
@@ -335,7 +350,7 @@ export default function TinderReplyGenerator() {
                     </div>
                 )}
 
-                {replyOptions.length > 0 && replyOptions[0].isPlaceholder && (
+                {replyOptions.length > 0 && replyOptions.every((option) => option.isPlaceholder) && (
                     <div className="bg-white dark:bg-zinc-800 rounded-lg p-6 shadow">
                         <h2 className="text-lg font-semibold mb-4 text-zinc-800 dark:text-zinc-200">
                             Generating Replies...
@@ -15,9 +15,10 @@ export function useAIAssistant() {
     const loadResponses = useCallback(async () => {
         setFetchingHistory(true);
         try {
-            const data = await fetchResponses();
-            setPreviousResponses(data);
-            return data;
+            // The sidebar only lists the newest page
+            const { results } = await fetchResponses();
+            setPreviousResponses(results);
+            return results;
         } catch (err) {
             console.error("Failed to fetch previous responses:", err);
             return [];
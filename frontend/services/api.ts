@@ -5,6 +5,14 @@ export interface ResponseData {
     prompt: string;
     response: string;
     created_at: string;
+    // Position within its chat window; chat history only
+    seq?: number;
+}
+
+export interface Page<T> {
+    results: T[];
+    next_cursor: string | null;
+    sync_cursor: string | null;
 }
 
 export interface UserData {
@@ -48,14 +56,23 @@ interface UpdateUserData {
 
 const API_URL = "http://localhost:8000/api";
 
-export async function fetchResponses(): Promise<ResponseData[]> {
+// One page of responses, newest first; pass the page's next_cursor to get the
+// one before it, or its sync_cursor as `since` to get only what was added after
+export async function fetchResponses(cursor?: string | null, since?: string | null): Promise<Page<ResponseData>> {
     // get userId from local storage
     const userId = localStorage.getItem("wingmanUserId");
     if (!userId) {
         throw new Error("User ID not found. Please log in.");
     }
     const parsedUserId = parseInt(userId, 10);
-    const res = await axios.get(`${API_URL}/responses/?user_id=${parsedUserId}`);
+    let url = `${API_URL}/responses/?user_id=${parsedUserId}`;
+    if (cursor) {
+        url += `&cursor=${encodeURIComponent(cursor)}`;
+    }
+    if (since) {
+        url += `&since=${encodeURIComponent(since)}`;
+    }
+    const res = await axios.get<Page<ResponseData>>(url);
     return res.data;
 }
 
@@ -166,7 +183,8 @@ export async function streamTinderReplies(
     style: string,
     user_id: number,
     onChunk: (chunk: string) => void,
-    onDone: () => void
+    onDone: (replies?: string[]) => void,
+    onReply?: (index: number, reply: string) => void
 ): Promise<void> {
     const requestBody = {
         message,
@@ -209,9 +227,16 @@ export async function streamTinderReplies(
             // Process any complete SSE messages in the buffer
             let boundary = buffer.indexOf("\n\n");
             while (boundary > -1) {
-                const line = buffer.substring(0, boundary);
+                let line = buffer.substring(0, boundary);
                 buffer = buffer.substring(boundary + 2);
 
+                // Each reply is also sent on its own as soon as it is complete
+                if (line.startsWith("event: reply\n")) {
+                    const reply = JSON.parse(line.substring(line.indexOf("\n") + 7));
+                    onReply?.(reply.index, reply.reply);
+                    line = "";
+                }
+
                 if (line.startsWith("data: ")) {
                     try {
                         const eventData = JSON.parse(line.substring(6));
@@ -226,7 +251,7 @@ export async function streamTinderReplies(
                             onChunk(eventData.chunk);
                         }
                         if (eventData.done) {
-                            onDone();
+                            onDone(eventData.replies);
                             break;
                         }
                     } catch (e) {
@@ -267,7 +292,14 @@ export async function calculateLoveScore(
 
 // Add or update this function in your API service
 
-export const getChatHistory = async (userId: string, chatId?: number | null) => {
+// One page of a chat's messages, newest first, with the cursors to page back
+// (next_cursor) and to fetch only newer messages later (sync_cursor as `since`)
+export const getChatHistory = async (
+    userId: string,
+    chatId?: number | null,
+    since?: string | null,
+    cursor?: string | null
+): Promise<Page<ResponseData>> => {
     try {
         // Use axios for consistency and ensure API_URL is used
         let url = `${API_URL}/chat_history/?user_id=${userId}`;
@@ -277,7 +309,17 @@ export const getChatHistory = async (userId: string, chatId?: number | null) =>
             url += `&chat_id=${chatId}`;
         }
 
-        const response = await axios.get(url);
+        // Only fetch messages added after the last sync
+        if (since) {
+            url += `&since=${encodeURIComponent(since)}`;
+        }
+
+        // Or the page before the one that returned this cursor
+        if (cursor) {
+            url += `&cursor=${encodeURIComponent(cursor)}`;
+        }
+
+        const response = await axios.get<Page<ResponseData>>(url);
         return response.data;
     } catch (error) {
         console.error("Error fetching chat history:", error);
@@ -285,6 +327,30 @@ export const getChatHistory = async (userId: string, chatId?: number | null) =>
     }
 };
 
+export interface SearchResult extends ResponseData {
+    rank: number;
+}
+
+// Full-text search over past prompts and responses, best matches first
+export const searchResponses = async (userId: string, query: string, chatId?: number | null, cursor?: string | null) => {
+    try {
+        let url = `${API_URL}/search/?user_id=${userId}&q=${encodeURIComponent(query)}`;
+
+        if (chatId) {
+            url += `&chat_id=${chatId}`;
+        }
+        if (cursor) {
+            url += `&cursor=${encodeURIComponent(cursor)}`;
+        }
+
+        const response = await axios.get<Omit<Page<SearchResult>, "sync_cursor">>(url);
+        return response.data;
+    } catch (error) {
+        console.error("Error searching responses:", error);
+        throw error;
+    }
+};
+
 // Get all chat windows for a user
 export const getAllChatWindows = async (userId: string) => {
     try {